@@ -1,5 +1,7 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from primary_trading_client import PrimaryTradingClient
+from rate_limiter import parse_limits
+import metrics
 from dotenv import load_dotenv
 import os
 
@@ -7,6 +9,7 @@ load_dotenv()
 
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
+BASE_URL = os.getenv('BASE_URL', 'https://api.demo.matrizoms.com.ar')
 
 '''Garantiza que las credenciales son un string'''
 if not CLIENT_ID or not CLIENT_SECRET:
@@ -17,13 +20,27 @@ app = Flask(__name__)
 # Initialize the client
 client = PrimaryTradingClient(
     client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET
+    client_secret=CLIENT_SECRET,
+    base_url=BASE_URL,
+    token_cache_path=os.getenv('TOKEN_CACHE_PATH'),
+    # e.g. RATE_LIMITS=marketdata=20,instruments=5
+    rate_limits=parse_limits(os.getenv('RATE_LIMITS'))
 )
+# Keep the instrument catalog behind get_instruments_by_symbol fresh
+client.catalog.start()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(client.cache_stats())
+
 @app.route('/market_data')
 def market_data():
     return render_template('market_data.html')
@@ -31,6 +48,12 @@ def market_data():
 @app.route('/get_instrument_detail', methods=['POST'])
 def get_instrument_detail():
     try:
+        # Multi-symbol form: symbols=A&symbols=B or symbols=A,B
+        symbols = [s.strip() for value in request.form.getlist('symbols') for s in value.split(',') if s.strip()]
+        if symbols:
+            results = client.get_instrument_details(symbols)
+            return jsonify({'results': results})
+
         symbol = request.form.get('symbol')
         if not symbol:
             return jsonify({'error': 'Symbol is required'}), 400
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import random
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+import aiohttp
+
+from decoders import Decoder, get_decoder, is_market_data, peek_symbol
+from order_book import ALL_ENTRIES
+import metrics
+
+class AsyncMarketDataClient:
+    def __init__(self, access_token: str, ws_url: str = "wss://api.demo.matrizoms.com.ar",
+                 token_provider: Optional[Callable[[], Awaitable[str]]] = None, entries: Optional[List[str]] = None,
+                 decoder: Union[str, Decoder] = "json", session: Optional[aiohttp.ClientSession] = None,
+                 max_reconnect_delay: float = 30.0):
+        """
+        asyncio Market Data WebSocket client.
+
+        One event loop can run many of these; there are no threads per socket.
+
+        Args:
+            access_token: The access token for authentication
+            ws_url: The WebSocket URL (defaults to production URL)
+            token_provider: Optional coroutine function returning a fresh token, used on every (re)connect
+            entries: Default market data entries to subscribe to
+            decoder: JSON backend name or a Decoder
+            session: Optional aiohttp session to share with other clients
+            max_reconnect_delay: Upper bound of the reconnect backoff in seconds
+        """
+        self.ws_url = ws_url.rstrip('/') + '/'
+        self.access_token = access_token
+        self.token_provider = token_provider
+        self.entries = list(entries) if entries else ["OF"]
+        self.decoder = get_decoder(decoder) if isinstance(decoder, str) else decoder
+        self.max_reconnect_delay = max_reconnect_delay
+        self.subscriptions: Dict[str, int] = {}
+        self.subscription_entries: Dict[str, tuple] = {}
+        self.connected = asyncio.Event()
+        self.dropped_frames = 0
+        self.ws = None
+        self._session = session
+        self._owns_session = session is None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self._closing = False
+        # symbol -> queues of the streams watching it
+        self._streams: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def __aenter__(self) -> "AsyncMarketDataClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """Open the WebSocket and start the reader task."""
+        async with self._connect_lock:
+            if self._reader_task is None:
+                if self._session is None:
+                    self._session = aiohttp.ClientSession()
+                self._closing = False
+                await self._open()
+                self._reader_task = asyncio.create_task(self._read_loop())
+        await self.connected.wait()
+
+    async def _open(self) -> None:
+        if self.token_provider:
+            self.access_token = await self.token_provider()
+        self.ws = await self._session.ws_connect(self.ws_url, headers={'X-Auth-Token': self.access_token},
+                                                 heartbeat=30)
+        self.connected.set()
+
+    async def _send_smd(self, symbols: List[str], depth: int, entries: List[str]) -> None:
+        await self.ws.send_str(json.dumps({
+            "type": "smd",
+            "level": 1,
+            "entries": entries,
+            "products": [{"symbol": symbol, "marketId": "ROFX"} for symbol in symbols],
+            "depth": depth
+        }))
+
+    async def subscribe(self, symbols: List[str], depth: int = 1, entries: Optional[List[str]] = None) -> None:
+        """
+        Subscribe to real-time market data for specified symbols.
+
+        Args:
+            symbols: List of symbols to subscribe to
+            depth: Order book depth (default: 1)
+            entries: Market data entries to request (defaults to the client's entries)
+        """
+        entries = list(entries) if entries else self.entries
+        unknown = [entry for entry in entries if entry not in ALL_ENTRIES]
+        if unknown:
+            raise ValueError(f"Unknown market data entries: {unknown}")
+
+        await self.connect()
+        await self._send_smd(symbols, depth, entries)
+        for symbol in symbols:
+            self.subscriptions[symbol] = depth
+            self.subscription_entries[symbol] = tuple(entries)
+
+    async def unsubscribe(self, symbols: List[str]) -> None:
+        """
+        Unsubscribe from market data for specified symbols.
+
+        Args:
+            symbols: List of symbols to unsubscribe from
+        """
+        for symbol in symbols:
+            self.subscriptions.pop(symbol, None)
+            self.subscription_entries.pop(symbol, None)
+        if self.ws is None or self.ws.closed:
+            return
+        await self._send_smd(symbols, 0, self.entries)
+
+    async def stream(self, symbols: List[str], depth: int = 1, max_queue: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate over market data updates for symbols.
+
+        The reader waits when this stream's queue is full, so a slow consumer
+        slows the socket down instead of buffering without limit. Wrap the
+        iterator in contextlib.aclosing() to release its subscriptions as soon
+        as the loop is left early.
+
+        Args:
+            symbols: Symbols to stream
+            depth: Order book depth requested for symbols not yet subscribed
+            max_queue: Updates buffered for this stream
+
+        Yields:
+            Decoded Md messages
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        new = []
+        for symbol in symbols:
+            watchers = self._streams.setdefault(symbol, set())
+            if not watchers and symbol not in self.subscriptions:
+                new.append(symbol)
+            watchers.add(queue)
+        try:
+            if new:
+                await self.subscribe(new, depth=depth)
+            while True:
+                yield await queue.get()
+        finally:
+            unused = []
+            for symbol in symbols:
+                watchers = self._streams.get(symbol)
+                if watchers is not None:
+                    watchers.discard(queue)
+                    if not watchers:
+                        del self._streams[symbol]
+                        unused.append(symbol)
+            if unused and not self._closing:
+                await self.unsubscribe(unused)
+
+    async def _read_loop(self) -> None:
+        delay = 1.0
+        while not self._closing:
+            if self.ws is not None:
+                try:
+                    async for msg in self.ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            await self._on_message(msg.data)
+                        elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                            break
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+
+            self.connected.clear()
+            if self._closing:
+                break
+
+            # Reconnect with jittered exponential backoff and replay subscriptions
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.max_reconnect_delay)
+            try:
+                await self._open()
+                await self._resubscribe()
+            except Exception:
+                # Includes token refresh failures; keep retrying with a longer delay
+                metrics.errors_total.inc("reconnect")
+                await self._discard_socket()
+                continue
+            delay = 1.0
+
+    async def _resubscribe(self) -> None:
+        """Replay every stored subscription with its own depth and entries."""
+        groups: Dict[tuple, List[str]] = {}
+        for symbol, depth in list(self.subscriptions.items()):
+            entries = self.subscription_entries.get(symbol, tuple(self.entries))
+            groups.setdefault((depth, entries), []).append(symbol)
+        for (depth, entries), symbols in groups.items():
+            await self._send_smd(symbols, depth, list(entries))
+
+    async def _discard_socket(self) -> None:
+        ws, self.ws = self.ws, None
+        self.connected.clear()
+        if ws is not None and not ws.closed:
+            await ws.close()
+
+    async def _on_message(self, message: str) -> None:
+        if not is_market_data(message):
+            return
+        symbol = peek_symbol(message)
+        if symbol is not None and symbol not in self._streams:
+            return
+        data = self.decoder.decode(message)
+        if data is None:
+            self.dropped_frames += 1
+            metrics.errors_total.inc("md_decode")
+            return
+        if data.get("type") != "Md":
+            return
+        try:
+            symbol = data["instrumentId"]["symbol"]
+        except (KeyError, TypeError):
+            return
+        for queue in list(self._streams.get(symbol, ())):
+            await queue.put(data)
+
+    async def close(self) -> None:
+        """Close the WebSocket connection and stop the reader task."""
+        self._closing = True
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.ws = None
+        self.connected.clear()
+
+# Example usage:
+if __name__ == "__main__":
+    async def main():
+        async with AsyncMarketDataClient(access_token="your_access_token") as client:
+            async for update in client.stream(["DLR/DIC23", "SOJ.ROS/MAY23"], depth=2):
+                print(f"Received market data update: {update}")
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nClosing connection...")
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from async_market_data_client import AsyncMarketDataClient
+from primary_trading_client import APIError, RateLimitError, _retry_after
+from token_manager import TokenManager
+import metrics
+
+class AsyncPrimaryTradingClient:
+    def __init__(self, client_id: str, client_secret: str, base_url: str = "https://api.demo.matrizoms.com.ar",
+                 pool_size: int = 10, timeout: float = 30.0, max_concurrency: int = 8,
+                 token_ttl: float = 8 * 3600, token_cache_path: Optional[str] = None):
+        """
+        asyncio counterpart of PrimaryTradingClient.
+
+        Args:
+            client_id: Your Primary API client ID
+            client_secret: Your Primary API client secret
+            base_url: The base URL for the API (defaults to production URL)
+            pool_size: Maximum number of keep-alive connections kept open to the API
+            timeout: Total request timeout in seconds
+            max_concurrency: Maximum number of concurrent requests used by the batch methods
+            token_ttl: Seconds an access token is considered valid
+            token_cache_path: Optional file where the token is cached between restarts
+        """
+        self.base_url = base_url.rstrip('/')
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        # Token state and disk cache are shared with the sync client; refreshes are serialized with an asyncio lock
+        self.token_manager = TokenManager(
+            None,
+            ttl=token_ttl,
+            cache_path=token_cache_path,
+            cache_key=f"{self.base_url}|{self.client_id}"
+        )
+        self._token_lock = asyncio.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncPrimaryTradingClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def _fetch_token(self) -> str:
+        """Log in with /auth/getToken and return the X-Auth-Token header."""
+        async with self.session.post(f"{self.base_url}/auth/getToken",
+                                     headers={"X-Username": self.client_id, "X-Password": self.client_secret}) as response:
+            token = response.headers.get("X-Auth-Token")
+            if response.status >= 400 or not token:
+                raise Exception(f"Authentication failed: {response.status} {await response.text()}")
+            return token
+
+    async def _get_access_token(self) -> str:
+        """
+        Get a valid access token, refreshing if necessary.
+
+        Returns:
+            str: The access token
+        """
+        if self.token_manager.is_fresh():
+            return self.token_manager.token
+        async with self._token_lock:
+            if self.token_manager.is_fresh():
+                return self.token_manager.token
+            return self.token_manager.set_token(await self._fetch_token())
+
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """
+        Make an authenticated request to the API.
+
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            endpoint: API endpoint
+            **kwargs: Additional arguments to pass to aiohttp
+
+        Returns:
+            Dict containing the API response
+        """
+        extra_headers = kwargs.pop("headers", {})
+        url = f"{self.base_url}{endpoint}"
+
+        # A 401 means the token was revoked or expired early: re-authenticate once and retry
+        for attempt in range(2):
+            token = await self._get_access_token()
+            headers = {"X-Auth-Token": token}
+            # JSON bodies get their Content-Type from aiohttp
+            if "json" not in kwargs:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers.update(extra_headers)
+
+            started = time.perf_counter()
+            async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                if metrics.enabled:
+                    label = metrics.endpoint_label(endpoint)
+                    metrics.rest_request_seconds.observe(time.perf_counter() - started, label)
+                    metrics.rest_responses_total.inc(label, str(response.status))
+                if response.status == 401 and attempt == 0:
+                    self.token_manager.invalidate(token)
+                    continue
+                if response.status == 429:
+                    raise RateLimitError(_retry_after(response))
+                elif response.status >= 400:
+                    raise APIError(f"API Error: {await response.text()}", response.status)
+                return await response.json(content_type=None)
+
+    async def get_market_data(self, symbol: str) -> Dict[str, Any]:
+        """Get market data for a specific symbol."""
+        return await self._make_request("GET", f"/rest/marketdata/{symbol}")
+
+    async def get_instruments(self) -> Dict[str, Any]:
+        """Get all instruments."""
+        return await self._make_request("GET", "/rest/instruments/details")
+
+    async def get_instrument_detail(self, symbol: str, market_id: str = "ROFX") -> Dict[str, Any]:
+        """Get instrument detail by symbol."""
+        return await self._make_request("GET", "/rest/instruments/detail", params={"marketId": market_id, "symbol": symbol})
+
+    async def _run_batch(self, func: Callable[[str], Awaitable[Dict[str, Any]]], symbols: List[str]) -> List[Dict[str, Any]]:
+        """
+        Run func for every symbol with at most max_concurrency requests in flight.
+
+        Returns:
+            One entry per symbol, in input order, with either "data" or "error" set
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def call(symbol: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return {"symbol": symbol, "data": await func(symbol), "error": None}
+                except Exception as e:
+                    return {"symbol": symbol, "data": None, "error": str(e)}
+
+        if not symbols:
+            return []
+        await self._get_access_token()
+        return list(await asyncio.gather(*(call(symbol) for symbol in symbols)))
+
+    async def get_instrument_details(self, symbols: List[str], market_id: str = "ROFX") -> List[Dict[str, Any]]:
+        """Get instrument details for several symbols concurrently."""
+        return await self._run_batch(lambda symbol: self.get_instrument_detail(symbol, market_id=market_id), symbols)
+
+    async def get_market_data_many(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """Get market data for several symbols concurrently."""
+        return await self._run_batch(self.get_market_data, symbols)
+
+    def create_market_data_client(self, **kwargs) -> AsyncMarketDataClient:
+        """
+        Create an AsyncMarketDataClient that shares this client's token.
+
+        Args:
+            **kwargs: Additional arguments for AsyncMarketDataClient
+        """
+        ws_url = self.base_url.replace("https://", "wss://").rstrip('/') + '/'
+        return AsyncMarketDataClient(access_token=self.token_manager.token or "", ws_url=ws_url,
+                                     token_provider=self._get_access_token, **kwargs)
+
+    async def close(self) -> None:
+        """Close the pooled HTTP connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,235 @@
+import re
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_INTERVAL = re.compile(r"^(\d+)([smhd]?)$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_interval(value: str) -> int:
+    """'1s', '1m', '5m', '1h' or plain seconds -> seconds."""
+    match = _INTERVAL.match(str(value).strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid interval: {value}")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+def format_interval(seconds: int) -> str:
+    for unit in ("d", "h", "m"):
+        if seconds % _UNITS[unit] == 0:
+            return f"{seconds // _UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+class BarSeries:
+    """Fixed-capacity ring of OHLCV bars of one interval, one preallocated array per column."""
+
+    __slots__ = ("interval", "capacity", "starts", "opens", "highs", "lows", "closes", "volumes", "trades",
+                 "head", "count")
+
+    def __init__(self, interval: int, capacity: int):
+        self.interval = interval
+        self.capacity = capacity
+        self.starts = array("d", [0.0]) * capacity
+        self.opens = array("d", [0.0]) * capacity
+        self.highs = array("d", [0.0]) * capacity
+        self.lows = array("d", [0.0]) * capacity
+        self.closes = array("d", [0.0]) * capacity
+        self.volumes = array("d", [0.0]) * capacity
+        self.trades = array("q", [0]) * capacity
+        self.head = 0   # next slot to write
+        self.count = 0
+
+    def _slot(self, i: int) -> int:
+        """Physical slot of the i-th oldest bar."""
+        return (self.head - self.count + i) % self.capacity
+
+    def add_trade(self, ts: float, price: Optional[float], volume: float) -> bool:
+        """
+        Fold a trade into the bar containing ts, opening a new bar if needed.
+
+        A trade without a price only adds volume to the current bar. Trades
+        older than the current bar are rejected.
+
+        Returns:
+            False if the trade was too late to be applied
+        """
+        start = ts - ts % self.interval
+        last = (self.head - 1) % self.capacity
+        if self.count and start < self.starts[last]:
+            return False
+        if not self.count or start > self.starts[last]:
+            if price is None:
+                return True
+            last = self.head
+            self.starts[last] = start
+            self.opens[last] = self.highs[last] = self.lows[last] = self.closes[last] = price
+            self.volumes[last] = volume
+            self.trades[last] = 1
+            self.head = (last + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            return True
+
+        if price is not None:
+            if price > self.highs[last]:
+                self.highs[last] = price
+            if price < self.lows[last]:
+                self.lows[last] = price
+            self.closes[last] = price
+            self.trades[last] += 1
+        self.volumes[last] += volume
+        return True
+
+    def _first_at_or_after(self, since: float) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.starts[self._slot(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _ranges(self, first: int, n: int) -> List[Tuple[int, int]]:
+        """Physical [start, end) ranges holding logical bars first..first+n, at most two when wrapped."""
+        if n <= 0:
+            return []
+        begin = self._slot(first)
+        end = begin + n
+        if end <= self.capacity:
+            return [(begin, end)]
+        return [(begin, self.capacity), (0, end - self.capacity)]
+
+    def slice(self, since: Optional[float] = None, limit: int = 500) -> Dict[str, List[float]]:
+        """
+        Bars starting at or after since (the latest limit bars if since is None), oldest first.
+
+        Only the selected range of each column is copied.
+        """
+        if since is None:
+            first = max(0, self.count - limit)
+        else:
+            first = self._first_at_or_after(since)
+        ranges = self._ranges(first, min(limit, self.count - first))
+        columns = (("t", self.starts), ("open", self.opens), ("high", self.highs), ("low", self.lows),
+                   ("close", self.closes), ("volume", self.volumes), ("trades", self.trades))
+        result = {}
+        for name, column in columns:
+            values: List[float] = []
+            for begin, end in ranges:
+                values.extend(column[begin:end])
+            result[name] = values
+        return result
+
+
+class BarAggregator:
+    def __init__(self, intervals: Iterable[int] = (1, 60), capacity: int = 3600):
+        """
+        Incrementally build OHLCV bars from Md updates.
+
+        Prices come from LA (last trade). Volume is the increase of TV (the
+        day's traded volume) when the feed sends it, otherwise the LA size of
+        each new trade. Md messages repeat the last trade until the next one,
+        so an LA is only counted when its date, price or size changes. Bars
+        are only created for intervals that saw trades.
+
+        Args:
+            intervals: Bar lengths in seconds
+            capacity: Bars kept per symbol and interval; older ones are overwritten
+        """
+        self.intervals = tuple(sorted(set(intervals)))
+        self.capacity = capacity
+        self.series: Dict[str, Dict[int, BarSeries]] = {}
+        self.updates = 0
+        self.late = 0
+        # symbol -> last LA (date, price, size) and last TV seen
+        self._last_trade: Dict[str, tuple] = {}
+        self._last_volume: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def update(self, data: Dict[str, Any]) -> None:
+        """Apply one Md message; usable directly as a MarketDataClient callback."""
+        market_data = data.get("marketData") or {}
+        last = market_data.get("LA")
+        total_volume = market_data.get("TV")
+        if not last and total_volume is None:
+            return
+        try:
+            symbol = data["instrumentId"]["symbol"]
+        except (KeyError, TypeError):
+            return
+
+        with self._lock:
+            price = None
+            trade_size = 0.0
+            ts = None
+            if last and last.get("price") is not None:
+                trade = (last.get("date"), last.get("price"), last.get("size"))
+                if trade != self._last_trade.get(symbol):
+                    self._last_trade[symbol] = trade
+                    price = float(trade[1])
+                    trade_size = float(trade[2] or 0)
+                    ts = trade[0] / 1000.0 if trade[0] else None
+
+            volume = 0.0
+            if total_volume is not None:
+                total_volume = float(total_volume)
+                previous = self._last_volume.get(symbol)
+                self._last_volume[symbol] = total_volume
+                # The first TV only sets the baseline; a drop means the session rolled over
+                if previous is not None and total_volume > previous:
+                    volume = total_volume - previous
+            elif price is not None:
+                volume = trade_size
+
+            if price is None and volume == 0.0:
+                return
+            if ts is None:
+                ts = data["timestamp"] / 1000.0 if data.get("timestamp") else time.time()
+
+            series = self.series.get(symbol)
+            if series is None:
+                series = self.series[symbol] = {interval: BarSeries(interval, self.capacity)
+                                                for interval in self.intervals}
+            self.updates += 1
+            for bar_series in series.values():
+                if not bar_series.add_trade(ts, price, volume):
+                    self.late += 1
+
+    def bars(self, symbol: str, interval: int, since: Optional[float] = None,
+             limit: int = 500) -> Optional[Dict[str, List[float]]]:
+        """
+        Columnar bars of a symbol, or None if the symbol has no bars yet.
+
+        Args:
+            symbol: Instrument symbol
+            interval: One of the configured intervals, in seconds
+            since: Epoch seconds; only bars starting at or after it are returned
+            limit: Maximum number of bars
+        """
+        if interval not in self.intervals:
+            raise ValueError(f"Interval {interval}s is not aggregated; available: "
+                             f"{', '.join(format_interval(i) for i in self.intervals)}")
+        with self._lock:
+            series = self.series.get(symbol)
+            if series is None:
+                return None
+            return series[interval].slice(since, limit)
+
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Drop the bars of symbols that are no longer subscribed."""
+        with self._lock:
+            for symbol in symbols:
+                self.series.pop(symbol, None)
+                self._last_trade.pop(symbol, None)
+                self._last_volume.pop(symbol, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'symbols': len(self.series),
+                'intervals': [format_interval(i) for i in self.intervals],
+                'capacity': self.capacity,
+                'updates': self.updates,
+                'late': self.late
+            }
@@ -0,0 +1,248 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+import websocket
+
+from fake_matriz_server import symbol_names
+from market_data_client import MarketDataClient
+from primary_trading_client import PrimaryTradingClient
+
+class FakeServerProcess:
+    def __init__(self, symbols: int, tick_rate: float, host: str = "127.0.0.1"):
+        """
+        FakeMatrizServer running in a child process.
+
+        In-process, the server's event loop would compete for the GIL with the
+        client under test and skew both throughput and latency.
+
+        Args:
+            symbols: Number of instruments to serve
+            tick_rate: Md messages per second per subscribed symbol
+            host: Interface to listen on
+        """
+        self.host = host
+        self.symbols = symbol_names(symbols)
+        self.tick_rate = tick_rate
+        with socket.socket() as probe:
+            probe.bind((host, 0))
+            self.port = probe.getsockname()[1]
+        self._process = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    def start(self, timeout: float = 10.0) -> "FakeServerProcess":
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_matriz_server.py")
+        self._process = subprocess.Popen([sys.executable, script, str(self.port), str(len(self.symbols)),
+                                          str(self.tick_rate)], stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise Exception(f"Fake Matriz server exited with code {self._process.returncode}")
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise Exception("Fake Matriz server failed to start")
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        # The server's example main stops cleanly on Ctrl-C
+        self._process.send_signal(signal.SIGINT)
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max of samples, in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'p50_ms': pick(0.50), 'p90_ms': pick(0.90), 'p99_ms': pick(0.99), 'max_ms': ordered[-1] * 1000,
+            'mean_ms': statistics.fmean(ordered) * 1000, 'samples': len(ordered)}
+
+def bench_rest(server: FakeServerProcess, requests: int, workers: int) -> Dict[str, Any]:
+    """PrimaryTradingClient requests per second, sequential and through the batch API."""
+    # Response caching off so every call goes upstream; identical in-flight calls are still coalesced
+    client = PrimaryTradingClient("bench", "bench", base_url=server.base_url, pool_size=workers, max_workers=workers,
+                                  cache_ttls={"marketdata": 0})
+    symbols = [server.symbols[i % len(server.symbols)] for i in range(requests)]
+    client.get_market_data(symbols[0])
+
+    latencies = []
+    start = time.perf_counter()
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        client.get_market_data(symbol)
+        latencies.append(time.perf_counter() - t0)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = client.get_market_data_many(symbols)
+    batch = time.perf_counter() - start
+    client.close()
+
+    return {
+        'requests': requests,
+        'sequential_rps': requests / sequential,
+        'sequential_latency': percentiles(latencies),
+        'batch_workers': workers,
+        'batch_rps': requests / batch,
+        'batch_errors': sum(1 for r in results if r['error'])
+    }
+
+def bench_market_data(server: FakeServerProcess, symbols: int, duration: float, decoder: str) -> Dict[str, Any]:
+    """MarketDataClient messages per second delivered to callbacks."""
+    token = PrimaryTradingClient("bench", "bench", base_url=server.base_url)._get_access_token()
+    client = MarketDataClient(access_token=token, ws_url=server.ws_url, decoder=decoder)
+    received = [0]
+    latencies = []
+
+    def callback(data):
+        received[0] += 1
+        if received[0] % 10 == 0:
+            latencies.append(time.time() - data['sentAt'])
+
+    client.subscribe(server.symbols[:symbols], callback=callback)
+    time.sleep(0.5)
+    received[0] = 0
+    latencies.clear()
+    time.sleep(duration)
+    count = received[0]
+    client.close()
+
+    return {
+        'decoder': decoder,
+        'symbols': symbols,
+        'duration_s': duration,
+        'messages': count,
+        'messages_per_second': count / duration,
+        'frame_to_callback_latency': percentiles(latencies)
+    }
+
+def bench_end_to_end(server: FakeServerProcess, symbols: int, duration: float, port: int) -> Dict[str, Any]:
+    """Latency from upstream frame to browser /ws delivery through market_data_app."""
+    os.environ.update({
+        'CLIENT_ID': 'bench', 'CLIENT_SECRET': 'bench',
+        'BASE_URL': server.base_url, 'WS_URL': server.ws_url
+    })
+    from werkzeug.serving import make_server
+    import market_data_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    http = make_server("127.0.0.1", port, market_data_app.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{port}"
+
+    web = market_data_app.app.test_client()
+    web.post('/connect', json={})
+
+    latencies = []
+    received = [0]
+    browser = websocket.create_connection(f"ws://127.0.0.1:{port}/ws")
+    browser.recv()  # welcome
+    browser.send(json.dumps({'action': 'subscribe', 'symbols': server.symbols[:symbols]}))
+
+    deadline = time.time() + duration
+    warmup_until = time.time() + 0.5
+    browser.settimeout(1)
+    while time.time() < deadline:
+        try:
+            message = json.loads(browser.recv())
+        except websocket.WebSocketTimeoutException:
+            continue
+        if message.get('type') != 'Md':
+            continue
+        now = time.time()
+        if now < warmup_until:
+            continue
+        received[0] += 1
+        latencies.append(now - message['sentAt'])
+
+    browser.close()
+    web.post('/disconnect')
+    http.shutdown()
+
+    return {
+        'app_url': base,
+        'symbols': symbols,
+        'duration_s': duration,
+        'md_max_rate_hz': market_data_app.MD_MAX_RATE_HZ,
+        'messages': received[0],
+        'messages_per_second': received[0] / max(duration - 0.5, 1e-9),
+        'upstream_to_browser_latency': percentiles(latencies)
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput/latency benchmarks against a local fake Matriz server")
+    parser.add_argument("--symbols", type=int, default=50, help="Symbols subscribed in the streaming benchmarks")
+    parser.add_argument("--tick-rate", type=float, default=20.0, help="Md messages per second per symbol")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per streaming benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="REST requests per REST benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrency of the batch REST benchmark")
+    parser.add_argument("--decoder", default="json", help="MarketDataClient decoder backend")
+    parser.add_argument("--app-port", type=int, default=8791, help="Port for the market_data_app under test")
+    parser.add_argument("--output", default="bench_output.json", help="Where to write the JSON results")
+    parser.add_argument("--only", choices=["rest", "market_data", "end_to_end"], action="append",
+                        help="Run only these benchmarks (repeatable)")
+    args = parser.parse_args()
+
+    server = FakeServerProcess(symbols=max(args.symbols, 100), tick_rate=args.tick_rate).start()
+    selected = args.only or ["rest", "market_data", "end_to_end"]
+    results: Dict[str, Any] = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'results': {}
+    }
+    try:
+        if "rest" in selected:
+            results['results']['rest'] = bench_rest(server, args.requests, args.workers)
+        if "market_data" in selected:
+            results['results']['market_data'] = bench_market_data(server, args.symbols, args.duration, args.decoder)
+        if "end_to_end" in selected:
+            results['results']['end_to_end'] = bench_end_to_end(server, args.symbols, args.duration, args.app_port)
+    finally:
+        server.stop()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results['results'], indent=2))
+
+if __name__ == "__main__":
+    main()
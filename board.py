@@ -0,0 +1,147 @@
+import threading
+from array import array
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional
+
+NAN = float("nan")
+
+# Raw columns, filled from Md updates
+COLUMNS = ("bid", "bid_size", "ask", "ask_size", "last", "volume", "prev_close", "timestamp")
+# Derived columns, computed for the whole panel at snapshot time
+DERIVED = ("mid", "spread", "spread_bps", "change", "change_pct")
+
+def _price(value: Any) -> float:
+    """Price of an LA/CL entry, sent either as {"price": ...} or as a bare number."""
+    if isinstance(value, dict):
+        value = value.get("price")
+    return NAN if value is None else float(value)
+
+def _gather(column: array, rows: List[int]) -> tuple:
+    """Values of column at rows, in order."""
+    if len(rows) > 1:
+        return itemgetter(*rows)(column)
+    return tuple(column[row] for row in rows)
+
+class MarketBoard:
+    def __init__(self, capacity: int = 256):
+        """
+        Top of book of every subscribed symbol in contiguous columns.
+
+        Symbols are interned to row ids on their first update; each column is
+        one preallocated array('d') indexed by row id, with NaN for missing
+        values, so a full-panel snapshot is a slice per column plus one
+        whole-column pass each for mid, spread, spread in bps and change
+        versus the previous close (CL). Rows of forgotten symbols are cleared and reused
+        by the same symbol if it comes back.
+
+        Args:
+            capacity: Rows preallocated; the columns double when it is exceeded
+        """
+        self.ids: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.updates = 0
+        self._capacity = capacity
+        self._columns = {name: array("d", [NAN]) * capacity for name in COLUMNS}
+        self._active = array("b", [0]) * capacity
+        self._lock = threading.Lock()
+
+    def _row(self, symbol: str) -> int:
+        row = self.ids.get(symbol)
+        if row is not None:
+            return row
+        row = self.ids[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        if row >= self._capacity:
+            for column in self._columns.values():
+                column.extend(array("d", [NAN]) * self._capacity)
+            self._active.extend(array("b", [0]) * self._capacity)
+            self._capacity *= 2
+        return row
+
+    def update(self, data: Dict[str, Any]) -> None:
+        """Apply one Md message; usable directly as a MarketDataClient callback."""
+        try:
+            symbol = data["instrumentId"]["symbol"]
+        except (KeyError, TypeError):
+            return
+        market_data = data.get("marketData") or {}
+        columns = self._columns
+
+        with self._lock:
+            row = self._row(symbol)
+            self._active[row] = 1
+            self.updates += 1
+            # Entries absent from the message keep their value; an empty side clears it
+            if "BI" in market_data:
+                bids = market_data["BI"]
+                top = bids[0] if bids else {}
+                columns["bid"][row] = _price(top)
+                columns["bid_size"][row] = float(top.get("size") or 0.0) if top else NAN
+            if "OF" in market_data:
+                offers = market_data["OF"]
+                top = offers[0] if offers else {}
+                columns["ask"][row] = _price(top)
+                columns["ask_size"][row] = float(top.get("size") or 0.0) if top else NAN
+            if "LA" in market_data:
+                columns["last"][row] = _price(market_data["LA"])
+            if "TV" in market_data:
+                volume = market_data["TV"]
+                columns["volume"][row] = NAN if volume is None else float(volume)
+            if "CL" in market_data:
+                columns["prev_close"][row] = _price(market_data["CL"])
+            if data.get("timestamp"):
+                columns["timestamp"][row] = float(data["timestamp"])
+
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Clear the rows of symbols that are no longer subscribed."""
+        with self._lock:
+            for symbol in symbols:
+                row = self.ids.get(symbol)
+                if row is None:
+                    continue
+                self._active[row] = 0
+                for column in self._columns.values():
+                    column[row] = NAN
+
+    def snapshot(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, List[Any]]:
+        """
+        Columnar full-panel snapshot, one list per raw and derived column.
+
+        Missing values are None. Only the copy of the columns happens under
+        the lock; derived columns are computed afterwards, column by column.
+
+        Args:
+            symbols: Restrict to these symbols, in this order (default: every active row)
+        """
+        with self._lock:
+            if symbols is None:
+                rows = [row for row in range(len(self.symbols)) if self._active[row]]
+            else:
+                rows = [self.ids[s] for s in symbols if s in self.ids and self._active[self.ids[s]]]
+            names = [self.symbols[row] for row in rows]
+            # Gather the requested rows of each column at C speed
+            columns = {name: _gather(column, rows) for name, column in self._columns.items()}
+
+        # Whole-column operations: each derived column is one comprehension;
+        # NaN propagates through the arithmetic and becomes None at the end
+        bid, ask, last, prev_close = columns["bid"], columns["ask"], columns["last"], columns["prev_close"]
+        columns["mid"] = mids = [(b + a) / 2 for b, a in zip(bid, ask)]
+        columns["spread"] = spreads = [a - b for b, a in zip(bid, ask)]
+        columns["spread_bps"] = [s / m * 10000 if m else NAN for s, m in zip(spreads, mids)]
+        columns["change"] = changes = [l - c for l, c in zip(last, prev_close)]
+        columns["change_pct"] = [d / c * 100 if c else NAN for d, c in zip(changes, prev_close)]
+
+        result: Dict[str, List[Any]] = {"symbol": names}
+        for name in COLUMNS + DERIVED:
+            # NaN is the only value not equal to itself
+            result[name] = [None if v != v else v for v in columns[name]]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'symbols': sum(self._active[:len(self.symbols)]),
+                'rows': len(self.symbols),
+                'capacity': self._capacity,
+                'updates': self.updates
+            }
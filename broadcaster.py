@@ -0,0 +1,197 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+# What to do when a client's queue is full
+DROP_OLDEST = "drop_oldest"
+CONFLATE = "conflate"
+DISCONNECT = "disconnect"
+POLICIES = (DROP_OLDEST, CONFLATE, DISCONNECT)
+
+class ClientQueue:
+    """Bounded outgoing queue for one browser connection, drained by its own writer thread."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, ws: Any, max_size: int, policy: str):
+        self.id = next(self._ids)
+        self.ws = ws
+        self.max_size = max_size
+        self.policy = policy
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.bytes_sent = 0
+        self.connected_at = time.time()
+        # Per-connection encoder for non-string payloads (e.g. CompactEncoder); None means JSON
+        self.encoder = None
+        # Items are (enqueue time, payload); conflation keys them by symbol
+        self._items = OrderedDict() if policy == CONFLATE else deque()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def put(self, payload: Any, key: Optional[str] = None) -> None:
+        """
+        Queue a message, applying the slow-consumer policy if the queue is full.
+
+        Strings are sent as is; other payloads are encoded by the writer
+        thread, with the connection's encoder if it has one.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            items = self._items
+            now = time.monotonic()
+
+            if self.policy == CONFLATE:
+                if key is None:
+                    key = next(self._seq)
+                if key in items:
+                    # Replace the pending update for this symbol but keep its place in line
+                    items[key] = (items[key][0], payload)
+                    self.conflated += 1
+                    return
+                if len(items) >= self.max_size:
+                    items.popitem(last=False)
+                    self.dropped += 1
+                items[key] = (now, payload)
+            else:
+                if len(items) >= self.max_size:
+                    if self.policy == DISCONNECT:
+                        self.closed = True
+                        self.dropped += len(items) + 1
+                        items.clear()
+                        self._cond.notify()
+                        return
+                    items.popleft()
+                    self.dropped += 1
+                items.append((now, payload))
+            self._cond.notify()
+
+    def _pop(self):
+        if self.policy == CONFLATE:
+            return self._items.popitem(last=False)[1]
+        return self._items.popleft()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._items and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    break
+                _, payload = self._pop()
+                encoder = self.encoder
+            try:
+                if not isinstance(payload, (str, bytes)):
+                    # Encoded at send time so per-connection deltas follow what was actually sent
+                    payload = encoder(payload) if encoder else json.dumps(payload)
+                    if payload is None:
+                        continue
+                self.ws.send(payload)
+                self.sent += 1
+                self.bytes_sent += len(payload)
+            except Exception:
+                metrics.errors_total.inc("ws_send")
+                self.close()
+                break
+
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Stop the writer thread; pending messages are discarded."""
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = len(self._items)
+            oldest = next(iter(self._items.values() if self.policy == CONFLATE else self._items), None)
+        lag = time.monotonic() - oldest[0] if oldest else 0.0
+        return {
+            'id': self.id,
+            'policy': self.policy,
+            'protocol': 'compact' if self.encoder else 'json',
+            'queued': queued,
+            'lag_seconds': lag,
+            'sent': self.sent,
+            'bytes_sent': self.bytes_sent,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'connected_at': self.connected_at,
+            'closed': self.closed
+        }
+
+
+class Broadcaster:
+    def __init__(self, max_queue: int = 1000, policy: str = DROP_OLDEST):
+        """
+        Fan market data out to WebSocket clients without blocking the producer.
+
+        Each message is serialized once and queued per client; a writer thread
+        per client does the (possibly slow) send.
+
+        Args:
+            max_queue: Maximum messages queued per client
+            policy: Slow-consumer policy: drop_oldest, conflate or disconnect
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.published = 0
+        self._clients: Dict[int, ClientQueue] = {}
+        self._lock = threading.Lock()
+
+    def register(self, ws: Any) -> ClientQueue:
+        client = ClientQueue(ws, self.max_queue, self.policy)
+        with self._lock:
+            self._clients[client.id] = client
+        return client
+
+    def unregister(self, client: ClientQueue) -> None:
+        with self._lock:
+            self._clients.pop(client.id, None)
+        client.close()
+
+    def clients(self) -> List[ClientQueue]:
+        # Copy so callers can iterate while clients come and go
+        with self._lock:
+            return list(self._clients.values())
+
+    def publish(self, data: Any, key: Optional[str] = None) -> None:
+        """
+        Encode data once and queue it for every client.
+
+        Args:
+            data: JSON-serializable message, or an already encoded string
+            key: Conflation key, usually the symbol
+        """
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.published += 1
+        for client in self.clients():
+            if client.closed:
+                self.unregister(client)
+            else:
+                client.put(payload, key)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-client queue depth, lag and drop counters."""
+        return [client.stats() for client in self.clients()]
+
+    def close(self) -> None:
+        for client in self.clients():
+            self.unregister(client)
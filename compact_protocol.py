@@ -0,0 +1,211 @@
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+# Every binary frame is a MessagePack array of messages:
+#   [DEFINE, id, symbol, marketId]            symbol id announcement, before its first snapshot
+#   [SNAPSHOT, id, timestamp, {entry: value}] full state; book sides are [[price, size], ...]
+#   [DELTA, id, timestamp, {entry: value}, {side: [depth, [[level, price, size], ...]]}, [removed entries]]
+# Deltas are relative to the last frame sent to the same connection.
+DEFINE = 0
+SNAPSHOT = 1
+DELTA = 2
+
+_FLOAT32 = struct.Struct(">f")
+
+def packb(obj: Any) -> bytes:
+    """Encode the MessagePack subset used by the compact protocol (nil, bool, int, float, str, array, map)."""
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+def _pack(obj: Any, out: bytearray) -> None:
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        # Whole numbers (sizes, volumes, many prices) fit in an int; others in float32 when exact
+        if obj.is_integer() and -2 ** 53 <= obj <= 2 ** 53:
+            _pack_int(int(obj), out)
+        elif _fits_float32(obj):
+            out.append(0xca)
+            out += _FLOAT32.pack(obj)
+        else:
+            out.append(0xcb)
+            out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        n = len(data)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n < 0x100:
+            out += bytes((0xd9, n))
+        elif n < 0x10000:
+            out.append(0xda)
+            out += struct.pack(">H", n)
+        else:
+            out.append(0xdb)
+            out += struct.pack(">I", n)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(len(obj), 0x90, 0xdc, 0xdd, out)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_header(len(obj), 0x80, 0xde, 0xdf, out)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+def _fits_float32(value: float) -> bool:
+    try:
+        return _FLOAT32.unpack(_FLOAT32.pack(value))[0] == value
+    except OverflowError:
+        # Finite values beyond float32's range
+        return False
+
+def _pack_int(n: int, out: bytearray) -> None:
+    if 0 <= n < 0x80:
+        out.append(n)
+    elif -32 <= n < 0:
+        out.append(n & 0xff)
+    elif 0 <= n < 0x100:
+        out += bytes((0xcc, n))
+    elif 0 <= n < 0x10000:
+        out.append(0xcd)
+        out += struct.pack(">H", n)
+    elif 0 <= n < 0x100000000:
+        out.append(0xce)
+        out += struct.pack(">I", n)
+    elif n >= 0:
+        out.append(0xcf)
+        out += struct.pack(">Q", n)
+    elif n >= -0x80000000:
+        out.append(0xd2)
+        out += struct.pack(">i", n)
+    else:
+        out.append(0xd3)
+        out += struct.pack(">q", n)
+
+def _pack_header(n: int, fix: int, code16: int, code32: int, out: bytearray) -> None:
+    if n < 16:
+        out.append(fix | n)
+    elif n < 0x10000:
+        out.append(code16)
+        out += struct.pack(">H", n)
+    else:
+        out.append(code32)
+        out += struct.pack(">I", n)
+
+def _normalize(market_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Book sides become [[price, size], ...]; every other entry is kept as is."""
+    fields = {}
+    for entry, value in market_data.items():
+        if isinstance(value, list):
+            fields[entry] = [[level.get("price"), level.get("size")] if isinstance(level, dict) else level
+                             for level in value]
+        else:
+            fields[entry] = value
+    return fields
+
+class CompactEncoder:
+    def __init__(self):
+        """
+        Per-connection encoder of Md messages into compact binary frames.
+
+        Symbols are interned to small integer ids announced once; after a
+        symbol's first snapshot only changed entries, and only the changed
+        levels of book sides, are sent. Called from the connection's writer
+        thread, so deltas are always relative to what the browser received.
+        Text payloads (control messages) pass through unchanged.
+        """
+        self.ids: Dict[str, int] = {}
+        self.frames = 0
+        self.snapshots = 0
+        self.bytes = 0
+        # id -> normalized fields last sent; ids stay stable for the life of the connection
+        self._sent: Dict[int, Dict[str, Any]] = {}
+        self._announced = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, data: Any) -> Optional[Any]:
+        if isinstance(data, (str, bytes)):
+            return data
+        instrument = data.get("instrumentId") or {}
+        symbol = instrument.get("symbol")
+        if symbol is None:
+            return None
+        fields = _normalize(data.get("marketData") or {})
+
+        with self._lock:
+            messages: List[list] = []
+            sid = self.ids.get(symbol)
+            if sid is None:
+                sid = self.ids[symbol] = len(self.ids)
+            if sid not in self._announced:
+                self._announced.add(sid)
+                messages.append([DEFINE, sid, symbol, instrument.get("marketId")])
+
+            previous = self._sent.get(sid)
+            if previous is None:
+                messages.append([SNAPSHOT, sid, data.get("timestamp"), fields])
+                self.snapshots += 1
+            else:
+                delta = self._diff(previous, fields)
+                if delta is None:
+                    return None
+                messages.append([DELTA, sid, data.get("timestamp"), *delta])
+            self._sent[sid] = fields
+            frame = packb(messages)
+            self.frames += 1
+            self.bytes += len(frame)
+        return frame
+
+    @staticmethod
+    def _diff(previous: Dict[str, Any], fields: Dict[str, Any]) -> Optional[list]:
+        changed = {}
+        books = {}
+        for entry, value in fields.items():
+            old = previous.get(entry)
+            if value == old:
+                continue
+            if isinstance(value, list) and isinstance(old, list):
+                levels = [[i, level[0], level[1]] for i, level in enumerate(value)
+                          if i >= len(old) or old[i] != level]
+                books[entry] = [len(value), levels]
+            else:
+                changed[entry] = value
+        removed = [entry for entry in previous if entry not in fields]
+        if not changed and not books and not removed:
+            return None
+        return [changed, books, removed]
+
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Drop the sent state of symbols so their next update is a full snapshot."""
+        with self._lock:
+            for symbol in symbols:
+                sid = self.ids.get(symbol)
+                if sid is not None:
+                    self._sent.pop(sid, None)
+
+    def reset(self) -> None:
+        """Resync: every symbol is announced and snapshotted again, keeping its id."""
+        with self._lock:
+            self._sent.clear()
+            self._announced.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'symbols': len(self.ids),
+            'frames': self.frames,
+            'snapshots': self.snapshots,
+            'bytes': self.bytes,
+            'bytes_per_frame': self.bytes / self.frames if self.frames else 0.0
+        }
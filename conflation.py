@@ -0,0 +1,115 @@
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+
+def _symbol_of(data: Dict[str, Any]) -> Optional[str]:
+    return data.get("instrumentId", {}).get("symbol")
+
+class Conflator:
+    def __init__(self, deliver: Callable[[Dict[str, Any]], None], max_rate: float = 10.0,
+                 key: Callable[[Dict[str, Any]], Any] = _symbol_of):
+        """
+        Coalesce market data updates per symbol and deliver them at a bounded rate.
+
+        Between flushes only the latest update of each symbol is kept, so the
+        work done downstream grows with the number of active symbols instead
+        of the number of ticks.
+
+        Args:
+            deliver: Function called with each update that survives conflation
+            max_rate: Maximum flushes per second; 0 or less delivers every update immediately
+            key: Function returning the conflation key of an update (the symbol by default)
+        """
+        self.deliver = deliver
+        self.max_rate = max_rate
+        self.key = key
+        self.latest: Dict[Any, Dict[str, Any]] = {}
+        self.received = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.flushes = 0
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the periodic flush thread."""
+        if self.max_rate <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and deliver whatever is pending."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self.flush()
+
+    def update(self, data: Dict[str, Any]) -> None:
+        """Record an update; it is delivered on the next flush unless replaced first."""
+        key = self.key(data)
+        with self._lock:
+            self.received += 1
+            self.latest[key] = data
+            if self.max_rate > 0:
+                if key in self._pending:
+                    self.coalesced += 1
+                self._pending[key] = data
+                return
+        self.delivered += 1
+        self.deliver(data)
+
+    def flush(self) -> int:
+        """
+        Deliver the pending updates now.
+
+        Returns:
+            Number of updates delivered
+        """
+        # Serialize flushes so updates of a symbol are never delivered out of order
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for data in pending.values():
+                try:
+                    self.deliver(data)
+                except Exception:
+                    metrics.errors_total.inc("conflation_deliver")
+            self.delivered += len(pending)
+            self.flushes += 1
+            return len(pending)
+
+    def _flush_loop(self) -> None:
+        interval = 1.0 / self.max_rate
+        while not self._stop_event.wait(interval):
+            if self._pending:
+                self.flush()
+
+    def snapshot(self, keys: Iterable[Any]) -> List[Dict[str, Any]]:
+        """Latest known update for each key, e.g. to bring a new subscriber up to date."""
+        latest = self.latest
+        return [latest[key] for key in keys if key in latest]
+
+    def forget(self, keys: Iterable[Any]) -> None:
+        """Drop state for keys nobody is subscribed to anymore."""
+        with self._lock:
+            for key in keys:
+                self.latest.pop(key, None)
+                self._pending.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_rate': self.max_rate,
+            'received': self.received,
+            'coalesced': self.coalesced,
+            'delivered': self.delivered,
+            'flushes': self.flushes,
+            'pending': len(self._pending),
+            'symbols': len(self.latest)
+        }
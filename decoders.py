@@ -0,0 +1,166 @@
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+Frame = Union[str, bytes]
+
+class Decoder:
+    """JSON decoder backend used by MarketDataClient for incoming frames."""
+
+    name = "json"
+    # Exceptions loads() raises for malformed frames
+    errors = (ValueError,)
+
+    def loads(self, message: Frame) -> Any:
+        return json.loads(message)
+
+    def decode(self, message: Frame) -> Optional[Dict[str, Any]]:
+        """
+        Parse a frame into a JSON object.
+
+        Returns:
+            The object, or None if the frame is malformed or not a JSON object
+        """
+        try:
+            data = self.loads(message)
+        except self.errors:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class OrjsonDecoder(Decoder):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._loads = orjson.loads
+
+    def loads(self, message: Frame) -> Any:
+        return self._loads(message)
+
+
+class MsgspecDecoder(Decoder):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._loads = msgspec.json.Decoder().decode
+        # msgspec.DecodeError is not a ValueError; orjson's and ujson's errors are
+        self.errors = (msgspec.DecodeError, ValueError)
+
+    def loads(self, message: Frame) -> Any:
+        return self._loads(message.encode("utf-8") if isinstance(message, str) else message)
+
+
+class UjsonDecoder(Decoder):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._loads = ujson.loads
+
+    def loads(self, message: Frame) -> Any:
+        return self._loads(message)
+
+
+# Fastest first; "auto" picks the first one that is installed
+DECODERS: Dict[str, Callable[[], Decoder]] = {
+    "orjson": OrjsonDecoder,
+    "msgspec": MsgspecDecoder,
+    "ujson": UjsonDecoder,
+    "json": Decoder,
+}
+
+def available_decoders() -> List[str]:
+    """Names of the decoder backends that can be used in this environment."""
+    names = []
+    for name, factory in DECODERS.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def get_decoder(name: Optional[str] = "json") -> Decoder:
+    """
+    Get a decoder backend by name.
+
+    Args:
+        name: "json", "orjson", "msgspec", "ujson", or "auto" for the fastest installed one
+
+    Returns:
+        Decoder: The decoder instance
+    """
+    if name in (None, "auto"):
+        return get_decoder(available_decoders()[0])
+    if name not in DECODERS:
+        raise ValueError(f"Unknown decoder: {name}")
+    return DECODERS[name]()
+
+
+_MD_TYPE_STR = re.compile(r'"type"\s*:\s*"Md"')
+_MD_TYPE_BYTES = re.compile(rb'"type"\s*:\s*"Md"')
+_SYMBOL_STR = re.compile(r'"symbol"\s*:\s*"([^"\\]*)"')
+_SYMBOL_BYTES = re.compile(rb'"symbol"\s*:\s*"([^"\\]*)"')
+
+def is_market_data(message: Frame) -> bool:
+    """Cheap check, without parsing, that a frame is an Md message."""
+    if isinstance(message, str):
+        return _MD_TYPE_STR.search(message) is not None
+    return _MD_TYPE_BYTES.search(message) is not None
+
+def peek_symbol(message: Frame) -> Optional[str]:
+    """
+    Extract the symbol of a frame without parsing it.
+
+    Returns:
+        The symbol, or None if it can't be read reliably (e.g. it contains escapes)
+    """
+    if isinstance(message, str):
+        match = _SYMBOL_STR.search(message)
+        return match.group(1) if match else None
+    match = _SYMBOL_BYTES.search(message)
+    return match.group(1).decode("utf-8") if match else None
+
+
+def benchmark(frames: List[Frame], names: Optional[List[str]] = None, repeat: int = 3) -> Dict[str, float]:
+    """
+    Measure decode throughput of each backend over a list of frames.
+
+    Args:
+        frames: Raw frames, e.g. from a TickReplayer capture
+        names: Backends to measure (defaults to every installed one)
+        repeat: Passes over the frames; the best one is reported
+
+    Returns:
+        Messages per second per backend
+    """
+    results = {}
+    for name in names or available_decoders():
+        loads = get_decoder(name).loads
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for frame in frames:
+                loads(frame)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = len(frames) / best if best else float("inf")
+    return results
+
+
+# Example usage: compare backends over a capture written by TickRecorder
+if __name__ == "__main__":
+    import sys
+    from tick_log import TickReplayer
+
+    frames = [payload for _, payload in TickReplayer(sys.argv[1]).frames()]
+    print(f"{len(frames)} frames")
+    for name, rate in benchmark(frames).items():
+        print(f"{name:>8}: {rate:,.0f} msg/s")
+    start = time.perf_counter()
+    md_frames = sum(1 for frame in frames if is_market_data(frame))
+    elapsed = time.perf_counter() - start
+    print(f"pre-filter: {len(frames) / elapsed if elapsed else 0:,.0f} msg/s ({md_frames} Md frames)")
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Set
+
+from aiohttp import web
+
+def symbol_names(count: int) -> List[str]:
+    """Symbols served by a FakeMatrizServer with count instruments."""
+    return [f"SYM{i:05d}/DIC25" for i in range(count)]
+
+class FakeMatrizServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8790, symbols: int = 100, tick_rate: float = 10.0):
+        """
+        Local stand-in for the Matriz REST and market data WebSocket API.
+
+        Implements /auth/getToken, /rest/instruments/details, /rest/instruments/detail,
+        /rest/marketdata/{symbol}, POST /rest/insert-cuenta-comitente and the
+        smd/Md WebSocket protocol on "/".
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+            symbols: Number of instruments to serve
+            tick_rate: Md messages per second per subscribed symbol
+        """
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.symbols = symbol_names(symbols)
+        self.tokens: Set[str] = set()
+        self.requests = 0
+        self.frames_sent = 0
+        self.accounts: List[Dict] = []
+        self.sockets: Set[web.WebSocketResponse] = set()
+        self._prices = {symbol: 100.0 + i for i, symbol in enumerate(self.symbols)}
+        # Previous session close, reported as CL
+        self._closes = dict(self._prices)
+        self._volumes = {symbol: 0 for symbol in self.symbols}
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    def _instrument(self, symbol: str) -> Dict:
+        price = self._prices[symbol]
+        return {
+            "instrumentId": {"marketId": "ROFX", "symbol": symbol},
+            "segment": {"marketSegmentId": "DDF", "marketId": "ROFX"},
+            "securityDescription": symbol,
+            "currency": "ARS",
+            "cficode": "FXXXSX",
+            "underlying": symbol.split("/")[0],
+            "lowLimitPrice": round(price * 0.9, 2),
+            "highLimitPrice": round(price * 1.1, 2),
+            "minPriceIncrement": 0.01,
+            "minTradeVol": 1,
+            "maxTradeVol": 1000000,
+            "tickSize": 0.01,
+            "contractMultiplier": 1,
+            "roundLot": 1,
+            "maturityDate": "20251231",
+            "orderTypes": ["LIMIT", "MARKET"],
+            "timesInForce": ["DAY", "IOC"]
+        }
+
+    def _market_data(self, symbol: str, entries: List[str], depth: int) -> Dict:
+        price = self._prices[symbol] = max(0.01, self._prices[symbol] + random.uniform(-0.05, 0.05))
+        # Every update is one trade; TV accumulates it like the day's traded volume
+        trade_size = random.randint(1, 50)
+        self._volumes[symbol] += trade_size
+        data = {}
+        if "BI" in entries:
+            data["BI"] = [{"price": round(price - 0.01 * (i + 1), 2), "size": random.randint(1, 500)} for i in range(depth)]
+        if "OF" in entries:
+            data["OF"] = [{"price": round(price + 0.01 * (i + 1), 2), "size": random.randint(1, 500)} for i in range(depth)]
+        if "LA" in entries:
+            data["LA"] = {"price": round(price, 2), "size": trade_size, "date": int(time.time() * 1000)}
+        if "TV" in entries:
+            data["TV"] = self._volumes[symbol]
+        if "CL" in entries:
+            data["CL"] = {"price": self._closes[symbol], "size": None, "date": None}
+        return data
+
+    def _authorized(self, request: web.Request) -> bool:
+        return request.headers.get("X-Auth-Token") in self.tokens
+
+    async def _get_token(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        return web.Response(headers={"X-Auth-Token": token})
+
+    async def _instruments_details(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401)
+        return web.json_response({"status": "OK", "instruments": [self._instrument(s) for s in self.symbols]})
+
+    async def _instrument_detail(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401)
+        symbol = request.query.get("symbol")
+        if symbol not in self._prices:
+            return web.json_response({"status": "ERROR", "description": "Instrument not found"}, status=404)
+        return web.json_response({"status": "OK", "instrument": self._instrument(symbol)})
+
+    async def _market_data_rest(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401)
+        symbol = request.match_info["symbol"]
+        if symbol not in self._prices:
+            return web.json_response({"status": "ERROR", "description": "Instrument not found"}, status=404)
+        return web.json_response({"status": "OK", "marketData": self._market_data(symbol, ["BI", "OF", "LA", "TV"], 1)})
+
+    async def _insert_cuenta_comitente(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({"status": "ERROR", "description": "Invalid JSON"}, status=400)
+        self.accounts.append(payload)
+        return web.json_response({"status": "OK", "numCuenta": str(len(self.accounts))})
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        if not self._authorized(request):
+            return web.Response(status=401)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+
+        # symbol -> (entries, depth) subscribed on this connection
+        subscribed: Dict[str, tuple] = {}
+        ticker = asyncio.create_task(self._tick(ws, subscribed))
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                command = json.loads(msg.data)
+                if command.get("type") != "smd":
+                    continue
+                for product in command.get("products", []):
+                    symbol = product.get("symbol")
+                    if command.get("depth", 1) == 0:
+                        subscribed.pop(symbol, None)
+                    elif symbol in self._prices:
+                        subscribed[symbol] = (command.get("entries", ["OF"]), command.get("depth", 1))
+        finally:
+            ticker.cancel()
+            self.sockets.discard(ws)
+        return ws
+
+    async def _tick(self, ws: web.WebSocketResponse, subscribed: Dict[str, tuple]) -> None:
+        interval = 1.0 / self.tick_rate
+        next_tick = time.monotonic()
+        while not ws.closed:
+            for symbol, (entries, depth) in list(subscribed.items()):
+                await ws.send_str(json.dumps({
+                    "type": "Md",
+                    "timestamp": int(time.time() * 1000),
+                    # Not part of the real protocol: exact send time for latency measurements
+                    "sentAt": time.time(),
+                    "instrumentId": {"marketId": "ROFX", "symbol": symbol},
+                    "marketData": self._market_data(symbol, entries, depth)
+                }))
+                self.frames_sent += 1
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/auth/getToken", self._get_token)
+        app.router.add_get("/rest/instruments/details", self._instruments_details)
+        app.router.add_get("/rest/instruments/detail", self._instrument_detail)
+        app.router.add_get("/rest/marketdata/{symbol:.+}", self._market_data_rest)
+        app.router.add_post("/rest/insert-cuenta-comitente", self._insert_cuenta_comitente)
+        app.router.add_get("/", self._websocket)
+        return app
+
+    async def _serve(self) -> None:
+        self._runner = web.AppRunner(self._make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "FakeMatrizServer":
+        """Run the server on a background thread."""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._serve())
+            self._started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not self._started.wait(timeout=10):
+            raise Exception("Fake Matriz server failed to start")
+        return self
+
+    def drop_connections(self) -> None:
+        """Close every market data WebSocket, as a server restart would."""
+        async def close_all():
+            for ws in list(self.sockets):
+                await ws.close()
+
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result(timeout=10)
+
+    def stop(self) -> None:
+        """Stop the background server."""
+        if self._loop is None:
+            return
+        # Open WebSocket handlers would otherwise hold up the runner cleanup
+        self.drop_connections()
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+
+# Example usage: python fake_matriz_server.py [port] [symbols] [tick_rate]
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    server = FakeMatrizServer(
+        port=int(args[0]) if len(args) > 0 else 8790,
+        symbols=int(args[1]) if len(args) > 1 else 100,
+        tick_rate=float(args[2]) if len(args) > 2 else 10.0
+    )
+    server.start()
+    print(f"Fake Matriz API on {server.base_url} (WebSocket {server.ws_url})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
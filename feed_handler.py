@@ -0,0 +1,376 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from broadcaster import CONFLATE, Broadcaster
+from market_data_client import CLOSED, CONNECTED, DISCONNECTED, RECONNECTING
+from subscription_router import SubscriptionRouter
+import metrics
+
+# Wire format between the feed handler and web workers: one JSON object per line.
+# Workers send {"op": "subscribe" | "unsubscribe", "symbols": [...]} or {"op": "instruments"};
+# the handler sends Md messages as received upstream, {"type": "error", "error": ...}, and
+# answers "instruments" with {"type": "instruments", "response": ...} or {"type": "instruments", "error": ...}.
+
+class _WorkerSocket:
+    """Adapts a worker connection to the ws interface ClientQueue writes to."""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+
+    def send(self, payload: str) -> None:
+        self.conn.sendall(payload.encode("utf-8") + b"\n")
+
+    def close(self) -> None:
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class FeedHandler:
+    def __init__(self, upstream: Any, socket_path: str, max_queue: int = 10000,
+                 instruments: Optional[Callable[[], Dict[str, Any]]] = None, instruments_ttl: float = 600):
+        """
+        Own the upstream market data connection and publish it to web worker processes.
+
+        Workers connect over a Unix socket and subscribe symbols; upstream
+        subscriptions are reference-counted across all of them, so a symbol
+        is subscribed once no matter how many workers watch it and is dropped
+        when the last one leaves. Each update is serialized once and queued per
+        worker; a slow worker only gets the latest pending update of a symbol.
+
+        The instrument list is downloaded here too and shared with every
+        worker, so workers never log in to the REST API themselves.
+
+        Args:
+            upstream: Connected (Sharded)MarketDataClient
+            socket_path: Path of the Unix socket to listen on
+            max_queue: Symbols with a pending update kept per worker
+            instruments: Function returning the /rest/instruments/details payload
+            instruments_ttl: Seconds a downloaded instrument list is served to workers
+        """
+        self.upstream = upstream
+        self.socket_path = socket_path
+        self.workers = Broadcaster(max_queue=max_queue, policy=CONFLATE)
+        self.router = SubscriptionRouter(upstream=upstream)
+        self.instruments = instruments
+        self.instruments_ttl = instruments_ttl
+        # Encoded "instruments" reply and when it was downloaded
+        self._instruments_line: Optional[str] = None
+        self._instruments_at = 0.0
+        self._instruments_lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FeedHandler":
+        """Listen for workers on a background thread."""
+        if os.path.exists(self.socket_path):
+            # Left behind by a previous run
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _serve_worker(self, conn: socket.socket) -> None:
+        worker = self.workers.register(_WorkerSocket(conn))
+        try:
+            for line in conn.makefile("r", encoding="utf-8"):
+                self._handle_command(worker, line)
+        except OSError:
+            pass
+        finally:
+            self.router.remove_client(worker)
+            self.workers.unregister(worker)
+
+    def _handle_command(self, worker: Any, line: str) -> None:
+        try:
+            command = json.loads(line)
+            symbols = command.get("symbols") or []
+            op = command.get("op")
+            if op == "subscribe":
+                self.router.subscribe(worker, symbols)
+                # Symbols other workers already watch would otherwise stay empty until their next tick
+                for symbol in symbols:
+                    message = self.upstream.last_message(symbol)
+                    if message is not None:
+                        worker.put(json.dumps(message), symbol)
+            elif op == "unsubscribe":
+                self.router.unsubscribe(worker, symbols)
+            elif op == "instruments":
+                worker.put(self._instruments_reply())
+            else:
+                raise ValueError(f"Unknown op: {op}")
+        except Exception as e:
+            metrics.errors_total.inc("feed_command")
+            worker.put(json.dumps({"type": "error", "error": str(e)}))
+
+    def _instruments_reply(self) -> str:
+        # Workers starting together wait for one download instead of each making their own
+        with self._instruments_lock:
+            if self._instruments_line is None or time.time() - self._instruments_at >= self.instruments_ttl:
+                try:
+                    if self.instruments is None:
+                        raise ValueError("Feed handler has no instrument source")
+                    self._instruments_line = json.dumps({"type": "instruments", "response": self.instruments()})
+                    self._instruments_at = time.time()
+                except Exception as e:
+                    metrics.errors_total.inc("feed_instruments")
+                    return json.dumps({"type": "instruments", "error": str(e)})
+            return self._instruments_line
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'socket': self.socket_path,
+            'symbols': len(self.router.topics),
+            'routed': self.router.routed,
+            'workers': self.workers.stats()
+        }
+
+    def stop(self) -> None:
+        """Stop accepting workers and disconnect the current ones."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        self.workers.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class FeedClient:
+    def __init__(self, socket_path: str, reconnect_delay: float = 1.0):
+        """
+        Web worker side of FeedHandler, usable wherever a MarketDataClient is.
+
+        Subscriptions are forwarded to the feed handler and replayed whenever
+        the connection to it is re-established. Depth and entries are decided
+        by the feed handler's upstream client.
+
+        Args:
+            socket_path: Unix socket of the feed handler
+            reconnect_delay: Seconds between attempts to reach the feed handler
+        """
+        self.socket_path = socket_path
+        self.reconnect_delay = reconnect_delay
+        self.recorder = None
+        self.subscriptions: Dict[str, int] = {}
+        self.callbacks: Dict[str, Callable] = {}
+        self.last_update: Dict[str, float] = {}
+        self.last_messages: Dict[str, Dict[str, Any]] = {}
+        self.connected = False
+        self.state = DISCONNECTED
+        self.reconnects = 0
+        self.errors: List[str] = []
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        # One get_instruments() request in flight at a time, answered through _on_line
+        self._instruments_lock = threading.Lock()
+        self._instruments_ready = threading.Event()
+        self._instruments_reply: Optional[Dict[str, Any]] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while self.state != CLOSED:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                with self._send_lock:
+                    self._sock = sock
+                self.connected = True
+                if self.state == RECONNECTING:
+                    self.reconnects += 1
+                self.state = CONNECTED
+                if self.subscriptions:
+                    self._send({"op": "subscribe", "symbols": list(self.subscriptions)})
+                for line in sock.makefile("r", encoding="utf-8"):
+                    self._on_line(line)
+            except OSError:
+                pass
+            finally:
+                with self._send_lock:
+                    self._sock = None
+                sock.close()
+                self.connected = False
+                # Updates missed while disconnected make the stored state unreliable
+                self.last_messages = {}
+                # A pending get_instruments() will not get its answer on this connection
+                self._instruments_reply = {"error": "Connection to the feed handler lost"}
+                self._instruments_ready.set()
+            if self.state == CLOSED:
+                return
+            self.state = RECONNECTING
+            time.sleep(self.reconnect_delay)
+
+    def _send(self, command: Dict[str, Any]) -> bool:
+        with self._send_lock:
+            if self._sock is None:
+                # Subscriptions are replayed by _run once the feed handler is reachable
+                return False
+            try:
+                self._sock.sendall(json.dumps(command).encode("utf-8") + b"\n")
+                return True
+            except OSError:
+                return False
+
+    def _on_line(self, line: str) -> None:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return
+        if data.get("type") == "error":
+            self.errors = (self.errors + [data.get("error")])[-10:]
+            return
+        if data.get("type") == "instruments":
+            self._instruments_reply = data
+            self._instruments_ready.set()
+            return
+        if data.get("type") != "Md":
+            return
+        try:
+            symbol = data["instrumentId"]["symbol"]
+        except (KeyError, TypeError):
+            return
+        self.last_update[symbol] = time.monotonic()
+        self.last_messages[symbol] = data
+        callback = self.callbacks.get(symbol)
+        if callback:
+            callback(data)
+
+    def subscribe(self, symbols: List[str], depth: int = 1, callback: Optional[Callable] = None,
+                  entries: Optional[List[str]] = None) -> None:
+        """
+        Subscribe to market data for specified symbols through the feed handler.
+
+        Args:
+            symbols: List of symbols to subscribe to
+            depth: Recorded for status(); the feed handler's client decides the actual depth
+            callback: Optional callback function to handle updates
+            entries: Ignored; the feed handler's client decides the entries
+        """
+        for symbol in symbols:
+            self.subscriptions[symbol] = depth
+            if callback:
+                self.callbacks[symbol] = callback
+        self._send({"op": "subscribe", "symbols": list(symbols)})
+
+    def unsubscribe(self, symbols: List[str]) -> None:
+        self._send({"op": "unsubscribe", "symbols": list(symbols)})
+        for symbol in symbols:
+            self.subscriptions.pop(symbol, None)
+            self.callbacks.pop(symbol, None)
+            self.last_update.pop(symbol, None)
+            self.last_messages.pop(symbol, None)
+
+    def get_instruments(self, timeout: float = 60.0) -> Dict[str, Any]:
+        """
+        Get the /rest/instruments/details payload downloaded by the feed handler.
+
+        Args:
+            timeout: Seconds to wait for the feed handler's answer
+
+        Returns:
+            Dict containing the API response
+        """
+        with self._instruments_lock:
+            self._instruments_ready.clear()
+            self._instruments_reply = None
+            if not self._send({"op": "instruments"}):
+                raise Exception("Not connected to the feed handler")
+            if not self._instruments_ready.wait(timeout):
+                raise Exception("Timed out waiting for the instrument list")
+            reply = self._instruments_reply
+        if "error" in reply:
+            raise Exception(f"Failed to load instruments: {reply['error']}")
+        return reply["response"]
+
+    def last_message(self, symbol: str) -> Optional[Dict[str, Any]]:
+        if self.state != CONNECTED or symbol not in self.subscriptions:
+            return None
+        return self.last_messages.get(symbol)
+
+    def stale_symbols(self, max_age: float) -> List[str]:
+        now = time.monotonic()
+        return [symbol for symbol in self.subscriptions
+                if symbol not in self.last_update or now - self.last_update[symbol] > max_age]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'connected': self.connected,
+            'feed_socket': self.socket_path,
+            'reconnects': self.reconnects,
+            'subscriptions': len(self.subscriptions),
+            'errors': self.errors
+        }
+
+    def close(self) -> None:
+        self.state = CLOSED
+        with self._send_lock:
+            sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# Example usage: python feed_handler.py, then start the web workers with FEED_SOCKET set
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from market_data_client import MarketDataClient
+    from primary_trading_client import PrimaryTradingClient
+    from rate_limiter import BACKGROUND
+    from sharded_market_data_client import ShardedMarketDataClient
+    from tick_log import TickRecorder
+
+    load_dotenv()
+    socket_path = os.getenv("FEED_SOCKET", "/tmp/matriz-feed.sock")
+    primary_client = PrimaryTradingClient(
+        client_id=os.environ["CLIENT_ID"],
+        client_secret=os.environ["CLIENT_SECRET"],
+        base_url=os.getenv("BASE_URL", "https://api.demo.matrizoms.com.ar"),
+        token_cache_path=os.getenv("TOKEN_CACHE_PATH")
+    )
+    client_options = dict(
+        token_provider=primary_client._get_access_token,
+        on_auth_failure=primary_client.token_manager.invalidate,
+        recorder=TickRecorder(os.environ["TICK_LOG_DIR"]) if os.getenv("TICK_LOG_DIR") else None,
+        decoder=os.getenv("MD_DECODER", "json"),
+        entries=[e.strip() for e in os.getenv("MD_ENTRIES", "BI,OF,LA,TV,CL").split(",") if e.strip()]
+    )
+    shards = int(os.getenv("MD_SHARDS", "1"))
+    access_token = primary_client._get_access_token()
+    if shards > 1:
+        upstream = ShardedMarketDataClient(access_token=access_token, ws_url=os.environ["WS_URL"], shards=shards,
+                                           **client_options)
+    else:
+        upstream = MarketDataClient(access_token=access_token, ws_url=os.environ["WS_URL"], **client_options)
+
+    handler = FeedHandler(upstream, socket_path,
+                          instruments=lambda: primary_client.get_instruments(priority=BACKGROUND)).start()
+    print(f"Feed handler listening on {socket_path}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        handler.stop()
+        upstream.close()
+        if upstream.recorder:
+            upstream.recorder.close()
@@ -0,0 +1,382 @@
+import bisect
+import hashlib
+from itertools import islice
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+_TOKEN_SPLIT = re.compile(r"[^0-9A-Z.]+")
+
+class InstrumentRecord:
+    """Compact view of one entry of /rest/instruments/details."""
+
+    __slots__ = (
+        "symbol", "market_id", "segment_id", "segment_market_id", "currency",
+        "low_limit_price", "high_limit_price", "min_price_increment", "min_trade_vol",
+        "max_trade_vol", "tick_size", "contract_multiplier", "maturity_date", "cficode"
+    )
+
+    def __init__(self, *values: Any):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_api(cls, instrument: Dict[str, Any]) -> "InstrumentRecord":
+        instrument_id = instrument.get("instrumentId", {})
+        segment = instrument.get("segment", {})
+        return cls(
+            instrument_id.get("symbol", ""),
+            instrument_id.get("marketId"),
+            segment.get("marketSegmentId"),
+            segment.get("marketId"),
+            instrument.get("currency"),
+            instrument.get("lowLimitPrice"),
+            instrument.get("highLimitPrice"),
+            instrument.get("minPriceIncrement"),
+            instrument.get("minTradeVol"),
+            instrument.get("maxTradeVol"),
+            instrument.get("tickSize"),
+            instrument.get("contractMultiplier"),
+            instrument.get("maturityDate"),
+            instrument.get("cficode"),
+        )
+
+    def to_row(self) -> List[Any]:
+        return [getattr(self, name) for name in self.__slots__]
+
+    def to_info(self) -> Dict[str, Any]:
+        """Return the nested dict format used by PrimaryTradingClient.get_instruments_by_symbol."""
+        def value(v):
+            return "N/A" if v is None else v
+
+        return {
+            'symbol': self.symbol,
+            'market_id': value(self.market_id),
+            'segment': {
+                'market_segment_id': value(self.segment_id),
+                'market_id': value(self.segment_market_id)
+            },
+            'price_limits': {
+                'low': value(self.low_limit_price),
+                'high': value(self.high_limit_price)
+            },
+            'trading_info': {
+                'min_price_increment': value(self.min_price_increment),
+                'min_trade_vol': value(self.min_trade_vol),
+                'max_trade_vol': value(self.max_trade_vol),
+                'tick_size': value(self.tick_size),
+                'contract_multiplier': value(self.contract_multiplier)
+            },
+            'maturity_date': value(self.maturity_date),
+            'cficode': value(self.cficode)
+        }
+
+
+class _CatalogIndex:
+    """Immutable set of records and indexes; swapped as a whole on refresh."""
+
+    NGRAM = 3
+
+    def __init__(self, records: List[InstrumentRecord], loaded_at: float):
+        self.records = records
+        self.loaded_at = loaded_at
+        self.symbols = [r.symbol for r in records]
+        self.by_symbol: Dict[str, int] = {}
+        self.by_market: Dict[str, List[int]] = {}
+        self.by_segment: Dict[str, List[int]] = {}
+        self.ngrams: Dict[str, List[int]] = {}
+        self.upper = [s.upper() for s in self.symbols]
+
+        for i, record in enumerate(records):
+            self.by_symbol[record.symbol] = i
+            self.by_market.setdefault(record.market_id, []).append(i)
+            self.by_segment.setdefault(record.segment_id, []).append(i)
+            upper = self.upper[i]
+            for gram in {upper[j:j + self.NGRAM] for j in range(len(upper) - self.NGRAM + 1)}:
+                self.ngrams.setdefault(gram, []).append(i)
+
+        # Sorted (upper-cased symbol, index) pairs for prefix lookups with bisect
+        self.sorted_upper = sorted((s, i) for i, s in enumerate(self.upper))
+        self.sorted_keys = [key for key, _ in self.sorted_upper]
+
+        # Search ranking order (shorter symbols first) and each record's position in it
+        self.ranked = sorted(range(len(records)), key=lambda i: (len(self.symbols[i]), self.symbols[i]))
+        self.ranked_upper = [self.upper[i] for i in self.ranked]
+        self.rank = [0] * len(records)
+        for position, i in enumerate(self.ranked):
+            self.rank[i] = position
+
+        digest = hashlib.sha1(json.dumps([r.to_row() for r in records], default=str).encode("utf-8"))
+        self.etag = digest.hexdigest()
+
+    def prefix(self, text: str) -> List[int]:
+        text = text.upper()
+        start = bisect.bisect_left(self.sorted_keys, text)
+        result = []
+        for key, i in self.sorted_upper[start:]:
+            if not key.startswith(text):
+                break
+            result.append(i)
+        return result
+
+    def _postings(self, text: str) -> List[List[int]]:
+        """Posting lists of the query's n-grams, rarest first."""
+        grams = {text[j:j + self.NGRAM] for j in range(len(text) - self.NGRAM + 1)}
+        return sorted((self.ngrams.get(g, []) for g in grams), key=len)
+
+    @staticmethod
+    def _intersect(postings: List[List[int]]) -> set:
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        return candidates
+
+    def substring(self, text: str) -> List[int]:
+        text = text.upper()
+        if len(text) < self.NGRAM:
+            return [i for i, s in enumerate(self.upper) if text in s]
+        candidates = self._intersect(self._postings(text))
+        return [i for i in sorted(candidates) if text in self.upper[i]]
+
+    def ranked_substring(self, text: str) -> List[int]:
+        """Like substring(), but in search ranking order."""
+        text = text.upper()
+        postings = self._postings(text) if len(text) >= self.NGRAM else None
+        # Short or common queries: a scan in ranking order beats sorting the candidates
+        if postings is None or len(postings[0]) * 8 > len(self.records):
+            return [i for i, s in zip(self.ranked, self.ranked_upper) if text in s]
+        candidates = self._intersect(postings)
+        return [i for i in sorted(candidates, key=self.rank.__getitem__) if text in self.upper[i]]
+
+    def prefix_count(self, text: str) -> int:
+        text = text.upper()
+        start = bisect.bisect_left(self.sorted_keys, text)
+        end = bisect.bisect_left(self.sorted_keys, text[:-1] + chr(ord(text[-1]) + 1), start)
+        return end - start
+
+
+class InstrumentCatalog:
+    def __init__(self, loader: Callable[[], Dict[str, Any]], ttl: float = 3600,
+                 snapshot_path: Optional[str] = None,
+                 background_loader: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        In-process, indexed cache of the instrument list.
+
+        The first lookup loads the catalog. Once it is older than ttl, the
+        next lookup starts a refresh in the background and keeps serving the
+        current catalog until the new one is ready; start() refreshes on a
+        timer instead, so lookups never find it stale.
+
+        Args:
+            loader: Function returning the /rest/instruments/details payload
+            ttl: Seconds a loaded catalog is served before it is refreshed
+            snapshot_path: Optional file used to persist the catalog for warm starts
+            background_loader: Loader used by refreshes nobody is waiting on
+                (defaults to loader), e.g. one on a lower rate limit priority
+        """
+        self.loader = loader
+        self.background_loader = background_loader or loader
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self._index: Optional[_CatalogIndex] = None
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+        # Lazy refresh started by a lookup of a stale catalog
+        self._refreshing = False
+        self._retry_at = 0.0
+        self._state_lock = threading.Lock()
+
+        if self.snapshot_path:
+            self._load_snapshot()
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        return self._index.loaded_at if self._index else None
+
+    @property
+    def etag(self) -> str:
+        return self._get_index().etag
+
+    def _get_index(self) -> _CatalogIndex:
+        index = self._index
+        if index is None:
+            with self._load_lock:
+                if self._index is None:
+                    self._refresh_locked()
+                index = self._index
+        elif time.time() - index.loaded_at >= self.ttl:
+            self._refresh_stale()
+        return index
+
+    def _refresh_stale(self) -> None:
+        with self._state_lock:
+            if self._refreshing or time.time() < self._retry_at:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            with self._load_lock:
+                # The refresh thread or another lookup may have refreshed it already
+                index = self._index
+                if index is None or time.time() - index.loaded_at >= self.ttl:
+                    self._refresh_locked(self.background_loader)
+        except Exception:
+            # Keep serving the previous catalog; lookups retry after a short pause
+            metrics.errors_total.inc("catalog_refresh")
+            self._retry_at = time.time() + min(self.ttl, 60)
+        finally:
+            self._refreshing = False
+
+    def refresh(self) -> None:
+        """Download the instrument list and rebuild the indexes."""
+        with self._load_lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self, loader: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+        response = (loader or self.loader)()
+        if response.get("status") != "OK" or "instruments" not in response:
+            raise Exception(f"Failed to load instruments: {response}")
+
+        records = [InstrumentRecord.from_api(instrument) for instrument in response["instruments"]]
+        self._index = _CatalogIndex(records, time.time())
+        if self.snapshot_path:
+            self._save_snapshot()
+
+    def start(self) -> None:
+        """Refresh the catalog in a background thread every ttl seconds."""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop_event.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=1)
+            self._refresh_thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.is_set():
+            index = self._index
+            age = time.time() - index.loaded_at if index else self.ttl
+            wait = self.ttl - age
+            if wait > 0 and self._stop_event.wait(wait):
+                break
+            try:
+                with self._load_lock:
+                    # A foreground lookup may have loaded the catalog while we waited
+                    index = self._index
+                    if index is None or time.time() - index.loaded_at >= self.ttl:
+                        self._refresh_locked(self.background_loader)
+            except Exception:
+                # Keep serving the previous catalog; retry after a short pause
+                metrics.errors_total.inc("catalog_refresh")
+                self._stop_event.wait(min(self.ttl, 60))
+
+    def _load_snapshot(self) -> None:
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            records = [InstrumentRecord(*row) for row in snapshot["instruments"]]
+            self._index = _CatalogIndex(records, float(snapshot["loaded_at"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_snapshot(self) -> None:
+        index = self._index
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"loaded_at": index.loaded_at, "instruments": [r.to_row() for r in index.records]}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._get_index().records)
+
+    def symbols(self) -> List[str]:
+        """All symbols in catalog order."""
+        return self._get_index().symbols
+
+    def get(self, symbol: str) -> Optional[InstrumentRecord]:
+        """Exact lookup by symbol."""
+        index = self._get_index()
+        i = index.by_symbol.get(symbol)
+        return index.records[i] if i is not None else None
+
+    def by_market(self, market_id: str) -> List[InstrumentRecord]:
+        index = self._get_index()
+        return [index.records[i] for i in index.by_market.get(market_id, [])]
+
+    def by_segment(self, segment_id: str) -> List[InstrumentRecord]:
+        index = self._get_index()
+        return [index.records[i] for i in index.by_segment.get(segment_id, [])]
+
+    def find_prefix(self, text: str) -> List[InstrumentRecord]:
+        """Case-insensitive symbol prefix lookup."""
+        index = self._get_index()
+        return [index.records[i] for i in index.prefix(text)]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[str], int]:
+        """
+        Ranked symbol search.
+
+        Symbols starting with the query rank first, then symbols with a token
+        starting with it, then any other symbol containing it. Within a rank,
+        shorter symbols come first.
+
+        Args:
+            query: Text to search for (case-insensitive)
+            limit: Maximum number of symbols to return
+            offset: Number of ranked results to skip, for paging
+
+        Returns:
+            Tuple of (page of symbols, total number of matches)
+        """
+        query = query.strip()
+        if not query:
+            return [], 0
+
+        index = self._get_index()
+        text = query.upper()
+        upper = index.upper
+        # Every prefix or token prefix match also contains the query, so the
+        # substring matches are the whole result set, already in ranking order
+        matches = index.ranked_substring(text)
+        # A token (e.g. "YPFD" in "MERV - XMEV - YPFD - 24hs") starts with text
+        token_start = None if _TOKEN_SPLIT.search(text) else re.compile(r"(?<![0-9A-Z.])" + re.escape(text)).search
+
+        # Walk the tiers in order and stop as soon as the page is filled
+        wanted = offset + limit
+        ranked = list(islice((i for i in matches if upper[i].startswith(text)),
+                             min(wanted, index.prefix_count(text))))
+        if len(ranked) < wanted and token_start is not None:
+            ranked.extend(islice((i for i in matches if token_start(upper[i]) and not upper[i].startswith(text)),
+                                 wanted - len(ranked)))
+        if len(ranked) < wanted:
+            ranked.extend(islice((i for i in matches if not upper[i].startswith(text)
+                                  and not (token_start is not None and token_start(upper[i]))),
+                                 wanted - len(ranked)))
+
+        return [index.symbols[i] for i in ranked[offset:wanted]], len(matches)
+
+    def find_substring(self, text: str, case_sensitive: bool = False) -> List[InstrumentRecord]:
+        """Symbol substring lookup, in catalog order."""
+        index = self._get_index()
+        matches = [index.records[i] for i in index.substring(text)]
+        if case_sensitive:
+            matches = [r for r in matches if text in r.symbol]
+        return matches
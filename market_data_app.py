@@ -1,7 +1,20 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_sock import Sock
 from market_data_client import MarketDataClient
+from sharded_market_data_client import ShardedMarketDataClient
+from feed_handler import FeedClient
 from primary_trading_client import PrimaryTradingClient
+from instrument_catalog import InstrumentCatalog
+from rate_limiter import parse_limits
+from broadcaster import Broadcaster
+from subscription_router import SubscriptionRouter
+from conflation import Conflator
+from tick_log import TickRecorder, TickReplayer
+from message_buffer import MessageStore
+from bars import BarAggregator, format_interval, parse_interval
+from board import MarketBoard
+from compact_protocol import CompactEncoder
+import metrics
 import threading
 import json
 from dotenv import load_dotenv
@@ -23,33 +36,162 @@ sock = Sock(app)
 # Global variables
 market_data_client = None
 market_data_thread = None
+replay_thread = None
 primary_client = None
-connected_clients = set()
-received_messages = []
+# Instrument catalog behind /get_instruments and /symbols/search
+catalog = None
 
 # Hardcoded credentials
 CLIENT_ID = get_required_env('CLIENT_ID')
 CLIENT_SECRET = get_required_env('CLIENT_SECRET')
 WS_URL = get_required_env('WS_URL')
+BASE_URL = os.getenv('BASE_URL', 'https://api.demo.matrizoms.com.ar')
+TOKEN_CACHE_PATH = os.getenv('TOKEN_CACHE_PATH')
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH')
+WS_QUEUE_SIZE = int(os.getenv('WS_QUEUE_SIZE', '1000'))
+WS_SLOW_CLIENT_POLICY = os.getenv('WS_SLOW_CLIENT_POLICY', 'drop_oldest')
+MD_MAX_RATE_HZ = float(os.getenv('MD_MAX_RATE_HZ', '10'))
+TICK_LOG_DIR = os.getenv('TICK_LOG_DIR')
+MESSAGE_BUFFER_SIZE = int(os.getenv('MESSAGE_BUFFER_SIZE', '1000'))
+MD_DECODER = os.getenv('MD_DECODER', 'json')
+MD_SHARDS = int(os.getenv('MD_SHARDS', '1'))
+RATE_LIMITS = parse_limits(os.getenv('RATE_LIMITS'))
+# LA and TV feed the bar aggregator; CL (previous close) the board's change column
+MD_ENTRIES = [e.strip() for e in os.getenv('MD_ENTRIES', 'BI,OF,LA,TV,CL').split(',') if e.strip()]
+BAR_INTERVALS = [parse_interval(i) for i in os.getenv('BAR_INTERVALS', '1s,1m').split(',') if i.strip()]
+BAR_CAPACITY = int(os.getenv('BAR_CAPACITY', '3600'))
+# Unix socket of feed_handler.py; when set, market data comes from it instead of a direct upstream connection
+FEED_SOCKET = os.getenv('FEED_SOCKET')
+
+# Last MESSAGE_BUFFER_SIZE messages per symbol, served by /messages
+received_messages = MessageStore(capacity_per_symbol=MESSAGE_BUFFER_SIZE)
+
+# OHLCV bars per symbol and interval, served by /bars
+bars = BarAggregator(intervals=BAR_INTERVALS, capacity=BAR_CAPACITY)
+# Top of book of every subscribed symbol, served by /board
+board = MarketBoard()
+
+# Browser fan-out: each update is serialized once and queued per client
+broadcaster = Broadcaster(max_queue=WS_QUEUE_SIZE, policy=WS_SLOW_CLIENT_POLICY)
 
 def market_data_callback(data):
     """Callback function to handle market data updates"""
-    # Send the message to all connected WebSocket clients
-    for client in connected_clients:
-        try:
-            client.send(json.dumps(data))
-        except:
-            connected_clients.remove(client)
+    # Runs on the upstream receive thread, so it only records the update; the
+    # conflator flushes the latest state per symbol to the router at MD_MAX_RATE_HZ
+    received_messages.append(data.get('instrumentId', {}).get('symbol'), data)
+    bars.update(data)
+    board.update(data)
+    conflator.update(data)
+
+# Per-connection symbol sets with ref-counted upstream subscriptions
+router = SubscriptionRouter(callback=market_data_callback)
+conflator = Conflator(router.route, max_rate=MD_MAX_RATE_HZ)
+conflator.start()
+
+def forget_symbols(symbols):
+    """Drop per-symbol state once no connection watches the symbols anymore"""
+    conflator.forget(symbols)
+    board.forget(symbols)
+    bars.forget(symbols)
+    received_messages.forget(symbols)
+
+# Per-connection fan-out state, sampled when /metrics is scraped
+metrics.REGISTRY.register(metrics.Gauge(
+    "matriz_ws_client_queue_depth", "Messages queued for each /ws connection", ["client"],
+    callback=lambda: [((str(c['id']),), c['queued']) for c in broadcaster.stats()]))
+metrics.REGISTRY.register(metrics.Gauge(
+    "matriz_ws_client_lag_seconds", "Age of the oldest queued message for each /ws connection", ["client"],
+    callback=lambda: [((str(c['id']),), c['lag_seconds']) for c in broadcaster.stats()]))
+metrics.REGISTRY.register(metrics.Gauge(
+    "matriz_ws_client_dropped", "Messages dropped for each /ws connection", ["client"],
+    callback=lambda: [((str(c['id']),), c['dropped']) for c in broadcaster.stats()]))
+metrics.REGISTRY.register(metrics.Gauge(
+    "matriz_ws_clients", "Open /ws connections",
+    callback=lambda: [((), len(broadcaster.clients()))]))
+metrics.REGISTRY.register(metrics.Gauge(
+    "matriz_md_subscriptions", "Symbols subscribed upstream",
+    callback=lambda: [((), len(market_data_client.subscriptions) if market_data_client else 0)]))
+
+def send_snapshot(client, symbols):
+    """Send the latest known update of each symbol to one connection"""
+    for data in conflator.snapshot(symbols):
+        # Compact connections encode the message themselves
+        client.put(data if client.encoder else json.dumps(data), data['instrumentId']['symbol'])
+
+# Reply type of each browser command
+COMMAND_REPLIES = {
+    'subscribe': 'subscribed',
+    'unsubscribe': 'unsubscribed',
+    'snapshot': 'subscriptions',
+    'resync': 'subscriptions',
+    'protocol': 'protocol'
+}
+
+def handle_client_command(client, message):
+    """Apply a {"action": "subscribe"|"unsubscribe"|"snapshot"|"resync"|"protocol", "symbols": [...]} message from a browser"""
+    try:
+        command = json.loads(message)
+        action = command.get('action')
+        symbols = command.get('symbols') or []
+        if isinstance(symbols, str):
+            symbols = [symbols]
+
+        if action == 'subscribe':
+            router.subscribe(client, symbols)
+            # Late joiners get the current state instead of waiting for the next tick
+            send_snapshot(client, symbols)
+        elif action == 'unsubscribe':
+            forget_symbols(router.unsubscribe(client, symbols))
+            if client.encoder:
+                client.encoder.forget(symbols)
+        elif action == 'snapshot':
+            send_snapshot(client, router.symbols_for(client))
+        elif action == 'resync':
+            # The browser dropped its state: re-announce ids and start over from snapshots
+            if client.encoder:
+                client.encoder.reset()
+            send_snapshot(client, router.symbols_for(client))
+        elif action == 'protocol':
+            fmt = command.get('format', 'json')
+            if fmt not in ('json', 'compact'):
+                raise ValueError(f"Unknown format: {fmt}")
+            client.encoder = CompactEncoder() if fmt == 'compact' else None
+            send_snapshot(client, router.symbols_for(client))
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        reply = {'type': COMMAND_REPLIES[action], 'symbols': router.symbols_for(client)}
+        if action == 'protocol':
+            reply['format'] = 'compact' if client.encoder else 'json'
+    except Exception as e:
+        reply = {'type': 'error', 'error': str(e)}
+    client.put(json.dumps(reply))
 
 @sock.route('/ws')
 def handle_websocket(ws):
-    connected_clients.add(ws)
+    client = broadcaster.register(ws)
+    client.put(json.dumps({'type': 'welcome', 'client_id': client.id}))
     try:
-        while True:
-            # Keep the connection alive
-            ws.receive()
+        while not client.closed:
+            message = ws.receive()
+            if message:
+                handle_client_command(client, message)
     except:
-        connected_clients.remove(ws)
+        pass
+    finally:
+        forget_symbols(router.remove_client(client))
+        broadcaster.unregister(client)
+
+@app.route('/ws/stats', methods=['GET'])
+def websocket_stats():
+    return jsonify({
+        'routed': router.routed,
+        'conflation': conflator.stats(),
+        'clients': broadcaster.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -57,32 +199,75 @@ def index():
 
 @app.route('/get_instruments', methods=['GET'])
 def get_instruments():
-    global primary_client
     try:
-        if primary_client is None:
+        if catalog is None:
             return jsonify({'error': 'Not connected'}), 400
             
-        instruments = primary_client.get_instruments()
-        if instruments.get('status') == 'OK':
-            # Extract symbols from instruments
-            symbols = [instrument['instrumentId']['symbol'] for instrument in instruments['instruments']]
-            return jsonify({'symbols': symbols})
-        return jsonify({'error': 'Failed to get instruments'}), 500
+        # Served from the in-process catalog; browsers revalidate with If-None-Match
+        etag = catalog.etag
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({'symbols': catalog.symbols()})
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/symbols/search', methods=['GET'])
+def search_symbols():
+    try:
+        if catalog is None:
+            return jsonify({'error': 'Not connected'}), 400
+
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, request.args.get('offset', 0, type=int))
+
+        symbols, total = catalog.search(query, limit=limit, offset=offset)
+        return jsonify({'query': query, 'symbols': symbols, 'total': total, 'offset': offset, 'limit': limit})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def open_market_data():
+    """Create the REST client and the market data source, and route browser subscriptions to it"""
+    global market_data_client, primary_client, catalog
+    if FEED_SOCKET:
+        # The feed handler owns the upstream connection, the login and the instrument download;
+        # this worker only relays, and loads its catalog from the feed handler on first lookup
+        market_data_client = FeedClient(FEED_SOCKET)
+        catalog = InstrumentCatalog(market_data_client.get_instruments)
+    else:
+        # Initialize PrimaryTradingClient with hardcoded credentials
+        primary_client = PrimaryTradingClient(client_id=CLIENT_ID, client_secret=CLIENT_SECRET, base_url=BASE_URL,
+                                              token_cache_path=TOKEN_CACHE_PATH,
+                                              catalog_snapshot_path=CATALOG_SNAPSHOT_PATH,
+                                              rate_limits=RATE_LIMITS)
+        catalog = primary_client.catalog
+        catalog.start()
+
+        access_token = primary_client._get_access_token()
+
+        # Create MarketDataClient with the obtained token and explicit WebSocket URL
+        ws_url = WS_URL  # Explicit WebSocket URL
+        recorder = TickRecorder(TICK_LOG_DIR) if TICK_LOG_DIR else None
+        client_options = dict(token_provider=primary_client._get_access_token,
+                              on_auth_failure=primary_client.token_manager.invalidate,
+                              recorder=recorder, decoder=MD_DECODER, entries=MD_ENTRIES)
+        if MD_SHARDS > 1:
+            market_data_client = ShardedMarketDataClient(access_token=access_token, ws_url=ws_url,
+                                                         shards=MD_SHARDS, **client_options)
+        else:
+            market_data_client = MarketDataClient(access_token=access_token, ws_url=ws_url, **client_options)
+        primary_client.attach_market_data(market_data_client)
+    router.attach(market_data_client)
+
 @app.route('/connect', methods=['POST'])
 def connect():
     global market_data_client, market_data_thread, primary_client
     if market_data_client is None:
         try:
-            # Initialize PrimaryTradingClient with hardcoded credentials
-            primary_client = PrimaryTradingClient(client_id=CLIENT_ID, client_secret=CLIENT_SECRET)
-            access_token = primary_client._get_access_token()
-            
-            # Create MarketDataClient with the obtained token and explicit WebSocket URL
-            ws_url = WS_URL  # Explicit WebSocket URL
-            market_data_client = MarketDataClient(access_token=access_token, ws_url=ws_url)
+            open_market_data()
             return jsonify({'status': 'connected'})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -90,11 +275,18 @@ def connect():
 
 @app.route('/disconnect', methods=['POST'])
 def disconnect():
-    global market_data_client, market_data_thread, primary_client
+    global market_data_client, market_data_thread, primary_client, catalog
     if market_data_client:
+        router.detach()
         market_data_client.close()
+        if market_data_client.recorder:
+            market_data_client.recorder.close()
         market_data_client = None
-        primary_client = None
+        catalog.stop()
+        catalog = None
+        if primary_client is not None:
+            primary_client.close()
+            primary_client = None
         return jsonify({'status': 'disconnected'})
     return jsonify({'status': 'not connected'})
 
@@ -109,18 +301,117 @@ def subscribe():
         return jsonify({'error': 'Symbol is required'}), 400
     
     try:
-        market_data_client.subscribe([symbol], callback=market_data_callback)
-        return jsonify({'status': 'subscribed', 'symbol': symbol})
+        # Subscribe one connection if client_id is given, otherwise every open connection
+        client_id = request.json.get('client_id')
+        clients = [c for c in broadcaster.clients() if client_id is None or c.id == client_id]
+        if client_id is not None and not clients:
+            return jsonify({'error': f'Unknown client_id: {client_id}'}), 404
+        if not clients:
+            # Subscriptions belong to /ws connections, so there is nothing to subscribe
+            return jsonify({'status': 'no clients', 'symbol': symbol, 'clients': 0}), 409
+        for client in clients:
+            router.subscribe(client, [symbol])
+            send_snapshot(client, [symbol])
+        return jsonify({'status': 'subscribed', 'symbol': symbol, 'clients': len(clients)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/status', methods=['GET'])
+def status():
+    global market_data_client
+    if not market_data_client:
+        return jsonify({'state': 'not connected'})
+    stale_after = request.args.get('stale_after', 30.0, type=float)
+    clients = getattr(market_data_client, 'clients', [market_data_client])
+    stale = [symbol for client in clients for symbol in client.stale_symbols(stale_after)]
+    return jsonify({**market_data_client.status(), 'stale_symbols': stale})
+
+@app.route('/subscribe/bulk', methods=['POST'])
+def subscribe_bulk():
+    global market_data_client
+    if not market_data_client:
+        return jsonify({'error': 'Not connected'}), 400
+
+    symbols = request.json.get('symbols')
+    if not symbols or not isinstance(symbols, list):
+        return jsonify({'error': 'symbols must be a non-empty list'}), 400
+
+    try:
+        # Same targeting as /subscribe, but the whole list goes upstream in batched smd messages
+        client_id = request.json.get('client_id')
+        clients = [c for c in broadcaster.clients() if client_id is None or c.id == client_id]
+        if client_id is not None and not clients:
+            return jsonify({'error': f'Unknown client_id: {client_id}'}), 404
+        if not clients:
+            return jsonify({'status': 'no clients', 'symbols': symbols, 'clients': 0}), 409
+        for client in clients:
+            router.subscribe(client, symbols)
+            send_snapshot(client, symbols)
+        return jsonify({'status': 'subscribed', 'symbols': symbols, 'clients': len(clients)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/replay', methods=['POST'])
+def replay():
+    """Replay the frames captured in TICK_LOG_DIR through the browser fan-out, without Matriz"""
+    global replay_thread
+    if not TICK_LOG_DIR:
+        return jsonify({'error': 'TICK_LOG_DIR is not set'}), 400
+    if replay_thread and replay_thread.is_alive():
+        return jsonify({'error': 'Replay already running'}), 409
+
+    speed = float((request.json or {}).get('speed', 1.0))
+
+    def on_frame(message):
+        data = json.loads(message)
+        if data.get('type') == 'Md':
+            market_data_callback(data)
+
+    replayer = TickReplayer(TICK_LOG_DIR)
+    replay_thread = threading.Thread(target=replayer.replay, args=(on_frame, speed), daemon=True)
+    replay_thread.start()
+    return jsonify({'status': 'replaying', 'segments': len(replayer.segments), 'speed': speed})
+
 @app.route('/messages', methods=['GET'])
 def get_messages():
-    return jsonify({'messages': received_messages})
+    symbol = request.args.get('symbol')
+    since = request.args.get('since', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    messages, cursor = received_messages.since(symbol, since=since, limit=limit)
+    return jsonify({'messages': messages, 'next': cursor})
+
+@app.route('/bars', methods=['GET'])
+def get_bars():
+    symbol = request.args.get('symbol')
+    if not symbol:
+        return jsonify({'error': 'Symbol is required'}), 400
+    try:
+        interval = parse_interval(request.args.get('interval', format_interval(BAR_INTERVALS[0])))
+        since = request.args.get('from', type=float)
+        limit = max(1, min(request.args.get('limit', 500, type=int), BAR_CAPACITY))
+        result = bars.bars(symbol, interval, since=since, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if result is None:
+        return jsonify({'error': f'No bars for {symbol}'}), 404
+    return jsonify({'symbol': symbol, 'interval': format_interval(interval), 'bars': result})
+
+@app.route('/board', methods=['GET'])
+def get_board():
+    """Top of book, mid, spread and change of every subscribed symbol (or ?symbols=A,B) in one call"""
+    symbols = request.args.get('symbols')
+    if symbols is not None:
+        symbols = [s.strip() for s in symbols.split(',') if s.strip()]
+    return jsonify({'board': board.snapshot(symbols), 'stats': board.stats()})
 
 @app.route('/market-data')
 def market_data():
     return render_template('market_data.html')
 
+# Every worker process serves /ws on its own, so in feed mode each one attaches at startup
+# instead of waiting for a /connect that would only reach one of them
+if FEED_SOCKET:
+    open_market_data()
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -1,30 +1,87 @@
 import websocket
 import json
+import random
 import threading
-from typing import Dict, Optional, Any, List, Callable
+import time
+from typing import Dict, Optional, Any, List, Callable, Union
 from datetime import datetime
+from order_book import ALL_ENTRIES, OrderBookEngine, TopOfBook
+from decoders import Decoder, get_decoder, is_market_data, peek_symbol
+import metrics
+
+# Connection states
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+CLOSED = "closed"
 
 class MarketDataClient:
-    def __init__(self, access_token: str, ws_url: str = "wss://api.demo.matrizoms.com.ar"):
+    def __init__(self, access_token: str, ws_url: str = "wss://api.demo.matrizoms.com.ar",
+                 token_provider: Optional[Callable[[], str]] = None, entries: Optional[List[str]] = None,
+                 maintain_books: bool = False, book_depth: int = 5, recorder: Optional[Any] = None,
+                 decoder: Union[str, Decoder] = "json", max_products_per_message: int = 100,
+                 on_auth_failure: Optional[Callable[[str], None]] = None, reconnect_base_delay: float = 0.5,
+                 reconnect_max_delay: float = 30.0, connect_timeout: float = 10.0):
         """
         Initialize the Market Data WebSocket client.
         
         Args:
             access_token: The access token for authentication
             ws_url: The WebSocket URL (defaults to production URL)
+            token_provider: Optional function returning a fresh token, used on every (re)connect
+            entries: Default market data entries to subscribe to (BI, OF, LA, TV, OI, ...)
+            maintain_books: Keep a per-symbol order book updated from the stream
+            book_depth: Price levels preallocated per side when maintain_books is set
+            recorder: Optional TickRecorder that captures every raw frame
+            decoder: JSON backend name ("json", "orjson", "msgspec", "ujson", "auto") or a Decoder
+            max_products_per_message: Symbols per smd message when (un)subscribing in bulk
+            on_auth_failure: Called with the rejected token when the handshake returns 401
+            reconnect_base_delay: First reconnect backoff in seconds
+            reconnect_max_delay: Upper bound of the reconnect backoff in seconds
+            connect_timeout: Seconds to wait for the handshake of each connection attempt
         """
         # Ensure the URL ends with a trailing slash
         ws_url = ws_url.rstrip('/') + '/'
         self.ws_url = ws_url
         self.access_token = access_token
+        self.token_provider = token_provider
         self.ws = None
         self.ws_thread = None
+        self.entries = list(entries) if entries else ["OF"]
+        self.books = OrderBookEngine(depth=book_depth) if maintain_books else None
+        self.recorder = recorder
+        self.decoder = get_decoder(decoder) if isinstance(decoder, str) or decoder is None else decoder
+        self.max_products_per_message = max_products_per_message
+        self.on_auth_failure = on_auth_failure
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.connect_timeout = connect_timeout
         self.subscriptions = {}
+        self.subscription_entries = {}
         self.callbacks = {}
         self.connected = False
         self.connection_event = threading.Event()
+        # Set when the current connection attempt opened or failed
+        self._attempt_done = threading.Event()
+        self._attempt_done.set()
+        self._open_ws = None
+        self.dropped_frames = 0
+        self.callback_errors = 0
+
+        # Reconnect state machine: a single thread owns recovery at any time
+        self.state = DISCONNECTED
+        self.reconnects = 0
+        self.disconnected_at = None
+        self.last_recovery_seconds = None
+        self.last_update: Dict[str, float] = {}
+        self.last_messages: Dict[str, Dict[str, Any]] = {}
+        self.gaps: Dict[str, tuple] = {}
+        self._state_lock = threading.Lock()
+        self._reconnect_thread = None
 
-    def subscribe(self, symbols: List[str], depth: int = 1, callback: Optional[Callable] = None) -> None:
+    def subscribe(self, symbols: List[str], depth: int = 1, callback: Optional[Callable] = None,
+                  entries: Optional[List[str]] = None) -> None:
         """
         Subscribe to real-time market data for specified symbols.
         
@@ -32,34 +89,56 @@ class MarketDataClient:
             symbols: List of symbols to subscribe to
             depth: Order book depth (default: 1)
             callback: Optional callback function to handle updates
+            entries: Market data entries to request (defaults to the client's entries)
         """
+        entries = list(entries) if entries else self.entries
+        unknown = [entry for entry in entries if entry not in ALL_ENTRIES]
+        if unknown:
+            raise ValueError(f"Unknown market data entries: {unknown}")
+
+        with self._state_lock:
+            # The reconnect loop replays every stored subscription once the socket is back;
+            # checked under the lock so the switch to CONNECTED cannot miss this one
+            reconnecting = self.state == RECONNECTING
+            if reconnecting:
+                self._store_subscriptions(symbols, depth, callback, entries)
+        if reconnecting:
+            return
+
         if not self.ws:
             self._connect_websocket()
             
         # Wait for connection to be established
-        if not self.connection_event.wait(timeout=10):
+        if not self.connection_event.wait(timeout=self.connect_timeout):
             raise Exception("Failed to establish WebSocket connection - connection timeout")
             
-        # Create subscription message
-        subscription_msg = {
-            "type": "smd",
-            "level": 1,
-            "entries": ["OF"],
-            "products": [{"symbol": symbol, "marketId": "ROFX"} for symbol in symbols],
-            "depth": depth
-        }
-        
         try:
-            self.ws.send(json.dumps(subscription_msg))
-            
-            # Store subscription and callback
-            for symbol in symbols:
-                self.subscriptions[symbol] = depth
-                if callback:
-                    self.callbacks[symbol] = callback
+            self._send_subscriptions(symbols, depth, entries)
+            self._store_subscriptions(symbols, depth, callback, entries)
         except Exception as e:
             raise
 
+    def _send_subscriptions(self, symbols: List[str], depth: int, entries: List[str]) -> None:
+        # Large symbol lists are sent as a few batched smd messages
+        for chunk in self._chunks(symbols):
+            subscription_msg = {
+                "type": "smd",
+                "level": 1,
+                "entries": entries,
+                "products": [{"symbol": symbol, "marketId": "ROFX"} for symbol in chunk],
+                "depth": depth
+            }
+            self.ws.send(json.dumps(subscription_msg))
+
+    def _store_subscriptions(self, symbols: List[str], depth: int, callback: Optional[Callable],
+                             entries: List[str]) -> None:
+        # Store subscription and callback
+        for symbol in symbols:
+            self.subscriptions[symbol] = depth
+            self.subscription_entries[symbol] = tuple(entries)
+            if callback:
+                self.callbacks[symbol] = callback
+
     def unsubscribe(self, symbols: List[str]) -> None:
         """
         Unsubscribe from market data for specified symbols.
@@ -67,35 +146,89 @@ class MarketDataClient:
         Args:
             symbols: List of symbols to unsubscribe from
         """
+        # Local state goes first: while reconnecting there is no socket to send to,
+        # and anything left here would be replayed by _resubscribe()
+        for symbol in symbols:
+            self.subscriptions.pop(symbol, None)
+            self.subscription_entries.pop(symbol, None)
+            self.callbacks.pop(symbol, None)
+            self.last_update.pop(symbol, None)
+            self.last_messages.pop(symbol, None)
+            self.gaps.pop(symbol, None)
+            if self.books:
+                self.books.remove(symbol)
+
         if not self.ws or not self.ws.sock or not self.ws.sock.connected:
             return
+        self._send_unsubscriptions(symbols)
 
-        # Prepare unsubscribe message in the correct format
-        unsubscribe_msg = {
-            "type": "smd",
-            "level": 1,
-            "entries": ["OF"],
-            "products": [
-                {
-                    "symbol": symbol,
-                    "marketId": "ROFX"  # Default market ID, you might want to make this configurable
-                }
-                for symbol in symbols
-            ],
-            "depth": 0  # Set depth to 0 to unsubscribe
-        }
+    def _send_unsubscriptions(self, symbols: List[str]) -> None:
+        for chunk in self._chunks(symbols):
+            # Prepare unsubscribe message in the correct format
+            unsubscribe_msg = {
+                "type": "smd",
+                "level": 1,
+                "entries": self.entries,
+                "products": [
+                    {
+                        "symbol": symbol,
+                        "marketId": "ROFX"  # Default market ID, you might want to make this configurable
+                    }
+                    for symbol in chunk
+                ],
+                "depth": 0  # Set depth to 0 to unsubscribe
+            }
 
-        # Send unsubscribe message
-        self.ws.send(json.dumps(unsubscribe_msg))
+            # Send unsubscribe message
+            self.ws.send(json.dumps(unsubscribe_msg))
 
-        # Remove subscriptions and callbacks
-        for symbol in symbols:
-            self.subscriptions.pop(symbol, None)
-            self.callbacks.pop(symbol, None)
+    def _chunks(self, symbols: List[str]) -> List[List[str]]:
+        size = max(1, self.max_products_per_message)
+        return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+    def last_message(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest Md message of a subscribed symbol, or None if the stream cannot
+        vouch for it (not subscribed, nothing received yet, or not connected).
+        """
+        if self.state != CONNECTED or symbol not in self.subscriptions:
+            return None
+        return self.last_messages.get(symbol)
+
+    def top_of_book(self, symbol: str) -> Optional[TopOfBook]:
+        """
+        Get the latest best bid/offer for a symbol.
+        
+        Requires the client to be created with maintain_books=True.
+        """
+        if not self.books:
+            raise Exception("Order books are disabled - create the client with maintain_books=True")
+        return self.books.top_of_book(symbol)
+
+    def book(self, symbol: str, depth: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a copy of the order book for a symbol.
+        
+        Requires the client to be created with maintain_books=True.
+        """
+        if not self.books:
+            raise Exception("Order books are disabled - create the client with maintain_books=True")
+        return self.books.book(symbol, depth)
 
     def _connect_websocket(self) -> None:
         """Establish WebSocket connection with authentication."""
         try:
+            if self.state != RECONNECTING:
+                self.state = CONNECTING
+            # Never leave a previous socket running next to the new one
+            self._discard_socket()
+            self.connection_event.clear()
+            self._attempt_done.clear()
+
+            # Pick up a refreshed token so reconnects don't reuse an expired one
+            if self.token_provider:
+                self.access_token = self.token_provider()
+
             # Create WebSocket connection with authentication header
             self.ws = websocket.WebSocketApp(
                 self.ws_url,
@@ -111,47 +244,233 @@ class MarketDataClient:
             self.ws_thread.daemon = True
             self.ws_thread.start()
             
-            # Wait for connection to be established
-            if not self.connection_event.wait(timeout=10):
-                raise Exception("WebSocket connection timeout - failed to establish connection within 10 seconds")
+            # Wait for the handshake; an error or close before it ends the attempt early
+            if not self._attempt_done.wait(timeout=self.connect_timeout):
+                raise Exception(f"WebSocket connection timeout - failed to establish connection "
+                                f"within {self.connect_timeout} seconds")
+            if not self.connected:
+                raise Exception("WebSocket connection failed")
+            with self._state_lock:
+                if self.state == CONNECTING:
+                    self.state = CONNECTED
                 
-        except Exception as e:
+        except Exception:
+            self._discard_socket()
+            self._attempt_done.set()
+            with self._state_lock:
+                if self.state == CONNECTING:
+                    self.state = DISCONNECTED
             raise
 
     def _on_ws_message(self, ws, message: str) -> None:
         """Handle incoming WebSocket messages."""
+        # Frames still arriving on a replaced socket would duplicate updates; replays pass ws=None
+        if ws is not None and ws is not self.ws:
+            return
+        timed = metrics.enabled
+        if timed:
+            metrics.ws_frames_total.inc()
+        if self.recorder:
+            self.recorder.record(message)
+        # Discard non-Md frames, and Md frames for symbols no longer subscribed, before paying for a full parse
+        if not is_market_data(message):
+            return
+        if not self.books:
+            symbol = peek_symbol(message)
+            if symbol is not None and symbol not in self.subscriptions:
+                return
+
+        if timed:
+            started = time.perf_counter()
+        data = self.decoder.decode(message)
+        if data is None:
+            # Malformed frame, or valid JSON that is not an object
+            self.dropped_frames += 1
+            metrics.errors_total.inc("md_decode")
+            return
+        if timed:
+            metrics.md_decode_seconds.observe(time.perf_counter() - started)
+
+        if data.get("type") != "Md":
+            return
         try:
-            data = json.loads(message)
-            
-            # Check if this is a market data message
-            if data.get("type") == "Md":
-                symbol = data.get("instrumentId", {}).get("symbol")
-                if symbol in self.callbacks:
-                    self.callbacks[symbol](data)
-        except json.JSONDecodeError as e:
-            pass
+            symbol = data["instrumentId"]["symbol"]
+        except (KeyError, TypeError):
+            return
+        if self.books:
+            self.books.apply(data)
+        self.last_update[symbol] = time.monotonic()
+        self.last_messages[symbol] = data
+        if timed:
+            metrics.md_messages_total.inc(symbol)
+        callback = self.callbacks.get(symbol)
+        if callback:
+            if timed:
+                started = time.perf_counter()
+            # websocket-client would pass the exception to on_error and drop a healthy connection
+            try:
+                callback(data)
+            except Exception:
+                self.callback_errors += 1
+                metrics.errors_total.inc("md_callback")
+            if timed:
+                metrics.md_callback_seconds.observe(time.perf_counter() - started)
 
     def _on_ws_error(self, ws, error) -> None:
         """Handle WebSocket errors."""
-        self.connected = False
-        self.connection_event.clear()
-        # Attempt to reconnect after a delay
-        threading.Timer(5.0, self._connect_websocket).start()
+        if ws is not self.ws:
+            return
+        if getattr(error, "status_code", None) == 401 and self.on_auth_failure:
+            # Make the next reconnect log in again instead of reusing the rejected token
+            self.on_auth_failure(self.access_token)
+        self._connection_lost(ws)
 
     def _on_ws_close(self, ws, close_status_code, close_msg) -> None:
         """Handle WebSocket connection close."""
-        self.connected = False
-        self.connection_event.clear()
-        # Attempt to reconnect after a delay
-        threading.Timer(5.0, self._connect_websocket).start()
+        if ws is not self.ws:
+            return
+        self._connection_lost(ws)
 
     def _on_ws_open(self, ws) -> None:
         """Handle WebSocket connection open."""
+        if ws is not self.ws:
+            return
+        self._open_ws = ws
         self.connected = True
         self.connection_event.set()
+        self._attempt_done.set()
+
+    def _connection_lost(self, ws: Any) -> None:
+        self.connected = False
+        self.connection_event.clear()
+        with self._state_lock:
+            if ws is not self._open_ws:
+                # Failed before opening: let _connect_websocket give up now instead of at its timeout
+                self._attempt_done.set()
+                return
+            # Error and close usually both fire for one failure; only the first starts a reconnect
+            if self.state in (RECONNECTING, CLOSED):
+                return
+            self.state = RECONNECTING
+            self.disconnected_at = time.monotonic()
+            # Updates missed while disconnected make the stored state unreliable
+            self.last_messages = {}
+            self._reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
+            self._reconnect_thread.start()
+        # An error callback can fire while the socket is still open
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _reconnect_delay(self, attempt: int) -> float:
+        # Exponential backoff with "equal jitter": half fixed, half random
+        delay = min(self.reconnect_max_delay, self.reconnect_base_delay * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _reconnect_loop(self) -> None:
+        attempt = 0
+        while self.state == RECONNECTING:
+            time.sleep(self._reconnect_delay(attempt))
+            attempt += 1
+            if self.state != RECONNECTING:
+                return
+
+            try:
+                # _connect_websocket refreshes the token through token_provider first
+                self._connect_websocket()
+                replayed = self._resubscribe()
+            except Exception:
+                metrics.errors_total.inc("reconnect")
+                self._discard_socket()
+                continue
+
+            with self._state_lock:
+                if self.state == CLOSED:
+                    return
+                self.state = CONNECTED
+                current = self._subscription_specs()
+            # subscribe()/unsubscribe() calls made during the replay only changed the stored state
+            try:
+                self._send_grouped({symbol: spec for symbol, spec in current.items()
+                                    if replayed.get(symbol) != spec})
+                removed = [symbol for symbol in replayed if symbol not in current]
+                if removed:
+                    self._send_unsubscriptions(removed)
+            except Exception:
+                # The socket dropped again; handled below
+                pass
+            if not self.connected:
+                # Dropped again while resubscribing; start over
+                self._connection_lost(self.ws)
+                return
+            recovered_at = time.monotonic()
+            self.reconnects += 1
+            self.last_recovery_seconds = recovered_at - self.disconnected_at
+            for symbol in self.subscriptions:
+                self.gaps[symbol] = (self.disconnected_at, recovered_at)
+            return
+
+    def _discard_socket(self) -> None:
+        ws = self.ws
+        self.ws = None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _subscription_specs(self) -> Dict[str, tuple]:
+        """symbol -> (depth, entries) of every stored subscription."""
+        return {symbol: (depth, self.subscription_entries.get(symbol, tuple(self.entries)))
+                for symbol, depth in list(self.subscriptions.items())}
+
+    def _send_grouped(self, specs: Dict[str, tuple]) -> None:
+        groups: Dict[tuple, List[str]] = {}
+        for symbol, spec in specs.items():
+            groups.setdefault(spec, []).append(symbol)
+        for (depth, entries), symbols in groups.items():
+            self._send_subscriptions(symbols, depth, list(entries))
+
+    def _resubscribe(self) -> Dict[str, tuple]:
+        """
+        Replay every stored subscription, grouped into batched smd messages.
+
+        Returns:
+            The replayed symbol -> (depth, entries)
+        """
+        specs = self._subscription_specs()
+        self._send_grouped(specs)
+        return specs
+
+    def staleness(self) -> Dict[str, Optional[float]]:
+        """Seconds since the last update of each subscribed symbol (None if none was received)."""
+        now = time.monotonic()
+        last_update = self.last_update
+        return {symbol: (now - last_update[symbol]) if symbol in last_update else None
+                for symbol in list(self.subscriptions)}
+
+    def stale_symbols(self, max_age: float) -> List[str]:
+        """Subscribed symbols without an update in the last max_age seconds."""
+        return [symbol for symbol, age in self.staleness().items() if age is None or age > max_age]
+
+    def status(self) -> Dict[str, Any]:
+        """Connection state and recovery metrics."""
+        return {
+            'state': self.state,
+            'connected': self.connected,
+            'reconnects': self.reconnects,
+            'last_recovery_seconds': self.last_recovery_seconds,
+            'subscriptions': len(self.subscriptions),
+            'symbols_with_gaps': len(self.gaps),
+            'dropped_frames': self.dropped_frames
+        }
         
     def close(self):
         """Close the WebSocket connection."""
+        with self._state_lock:
+            self.state = CLOSED
         if self.ws:
             self.ws.close()
             self.ws = None
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+class SymbolRingBuffer:
+    """Fixed-capacity ring of (sequence number, receive time, message) for one symbol."""
+
+    __slots__ = ("capacity", "seqs", "times", "messages", "head", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seqs = array("q", [0]) * capacity
+        self.times = array("d", [0.0]) * capacity
+        self.messages: List[Any] = [None] * capacity
+        self.head = 0   # next slot to write
+        self.count = 0
+
+    def append(self, seq: int, received_at: float, message: Any) -> None:
+        head = self.head
+        self.seqs[head] = seq
+        self.times[head] = received_at
+        self.messages[head] = message
+        self.head = (head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _slot(self, i: int) -> int:
+        """Physical slot of the i-th oldest entry."""
+        return (self.head - self.count + i) % self.capacity
+
+    def after(self, since: int, limit: int) -> List[Tuple[int, float, Any]]:
+        """Entries with a sequence number greater than since, oldest first."""
+        # Sequence numbers grow monotonically, so binary search the logical order
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.seqs[self._slot(mid)] <= since:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        for i in range(lo, min(self.count, lo + limit)):
+            slot = self._slot(i)
+            result.append((self.seqs[slot], self.times[slot], self.messages[slot]))
+        return result
+
+
+class MessageStore:
+    def __init__(self, capacity_per_symbol: int = 1000):
+        """
+        Bounded per-symbol history of market data messages.
+
+        Every message gets a global, monotonic sequence number that callers
+        use as a cursor to fetch only what they have not seen yet.
+
+        Args:
+            capacity_per_symbol: Messages kept per symbol; older ones are overwritten
+        """
+        self.capacity = capacity_per_symbol
+        self.buffers: Dict[str, SymbolRingBuffer] = {}
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, symbol: str, message: Any) -> int:
+        """
+        Store a message.
+
+        Returns:
+            The sequence number assigned to it
+        """
+        with self._lock:
+            buffer = self.buffers.get(symbol)
+            if buffer is None:
+                buffer = self.buffers[symbol] = SymbolRingBuffer(self.capacity)
+            seq = next(self._seq)
+            buffer.append(seq, time.time(), message)
+            self.last_seq = seq
+            return seq
+
+    def since(self, symbol: Optional[str] = None, since: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Messages newer than a cursor.
+
+        Args:
+            symbol: Only return messages of this symbol; all symbols if None
+            since: Sequence number of the last message the caller has seen
+            limit: Maximum number of messages returned
+
+        Returns:
+            Tuple of (messages oldest first, cursor to pass as since next time)
+        """
+        with self._lock:
+            if symbol is not None:
+                buffer = self.buffers.get(symbol)
+                per_symbol = {symbol: buffer.after(since, limit)} if buffer else {}
+            else:
+                per_symbol = {s: b.after(since, limit) for s, b in self.buffers.items()}
+            last_seq = self.last_seq
+
+        merged = heapq.merge(*([(seq, ts, s, m) for seq, ts, m in entries] for s, entries in per_symbol.items()))
+        messages = [{'seq': seq, 'symbol': s, 'received_at': ts, 'data': m}
+                    for seq, ts, s, m in itertools.islice(merged, limit)]
+
+        # A full page means there may be more; otherwise the caller is caught up
+        cursor = messages[-1]['seq'] if len(messages) == limit else max(since, last_seq)
+        return messages, cursor
+
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Drop the history of symbols that are no longer subscribed."""
+        with self._lock:
+            for symbol in symbols:
+                self.buffers.pop(symbol, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.buffers = {}
@@ -0,0 +1,171 @@
+import bisect
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Hot paths check this flag before taking timestamps, so disabled metrics cost one attribute lookup
+enabled = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items)
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        """
+        Gauge whose samples can be set directly or computed at scrape time by callback.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def collect(self) -> List[str]:
+        if self.callback:
+            try:
+                items = list(self.callback())
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, or return the existing one with the same name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def render() -> str:
+    return REGISTRY.render()
+
+# Symbols in REST paths are folded into a placeholder so label cardinality stays bounded
+_SYMBOL_PATHS = re.compile(r"^(/rest/marketdata)/.+$")
+
+def endpoint_label(endpoint: str) -> str:
+    return _SYMBOL_PATHS.sub(r"\1/{symbol}", endpoint)
+
+
+# Metrics shared by the clients and both Flask apps
+rest_request_seconds = REGISTRY.register(Histogram(
+    "matriz_rest_request_seconds", "Latency of REST calls to the Matriz API", ["endpoint"]))
+rest_responses_total = REGISTRY.register(Counter(
+    "matriz_rest_responses_total", "REST responses from the Matriz API by status code", ["endpoint", "status"]))
+rest_throttled_total = REGISTRY.register(Counter(
+    "matriz_rest_throttled_total", "429 responses from the Matriz API by endpoint group", ["group"]))
+cache_requests_total = REGISTRY.register(Counter(
+    "matriz_cache_requests_total", "Cached REST lookups by result (hit, miss, coalesced, stream)", ["endpoint", "result"]))
+token_refreshes_total = REGISTRY.register(Counter(
+    "matriz_token_refreshes_total", "Access tokens obtained from /auth/getToken"))
+ws_frames_total = REGISTRY.register(Counter(
+    "matriz_ws_frames_total", "WebSocket frames received from the market data feed"))
+md_messages_total = REGISTRY.register(Counter(
+    "matriz_md_messages_total", "Md messages decoded, by symbol", ["symbol"]))
+md_decode_seconds = REGISTRY.register(Histogram(
+    "matriz_md_decode_seconds", "Time spent decoding Md frames"))
+md_callback_seconds = REGISTRY.register(Histogram(
+    "matriz_md_callback_seconds", "Time spent in market data callbacks"))
+errors_total = REGISTRY.register(Counter(
+    "matriz_errors_total", "Exceptions caught and handled, by location", ["where"]))
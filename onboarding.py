@@ -0,0 +1,367 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from primary_trading_client import APIError, PrimaryTradingClient, RateLimitError
+from rate_limiter import BACKGROUND, parse_limits
+
+# Dates are YYYY-MM-DD, optionally with a time (fechaVencimientoPerfil)
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2})?)?$")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_BOOLEAN = ("true", "false")
+_CUIT_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+REQUIRED_FIELDS = ("restApiPath", "restApiMethod", "fechaApertura", "denominacion", "codTpContribIVA",
+                   "codTpComitente", "titulares")
+
+def iter_payloads(source: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream (position, payload) pairs from a JSONL file or a directory of .json files.
+
+    Positions ("<file>:<line>" or the file name) are only used for reporting;
+    the checkpoint is indexed by record_key(). Lines that are not valid JSON
+    are yielded as the error message so they end up in the results.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(source, name), "r", encoding="utf-8") as f:
+                    yield name, json.load(f)
+            except ValueError as e:
+                yield name, ValueError(f"Invalid JSON: {e}")
+        return
+
+    base = os.path.basename(source)
+    with open(source, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield f"{base}:{line_number}", json.loads(line)
+            except ValueError as e:
+                yield f"{base}:{line_number}", ValueError(f"Invalid JSON: {e}")
+
+def record_key(payload: Dict[str, Any]) -> str:
+    """
+    Identity of the account a payload creates, stable across edits and re-sorts of the input.
+
+    The CUIT of a legal entity, otherwise the documents of its holders,
+    otherwise a hash of the payload's content.
+    """
+    juridicos = payload.get("juridicos")
+    if isinstance(juridicos, dict) and juridicos.get("cuit"):
+        return f"cuit:{juridicos['cuit']}"
+    titulares = payload.get("titulares")
+    if isinstance(titulares, list) and titulares and all(
+            isinstance(t, dict) and t.get("tpDoc") and t.get("numDoc") for t in titulares):
+        return "doc:" + "+".join(sorted(f"{t['tpDoc']}-{t['numDoc']}" for t in titulares))
+    content = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return "sha256:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def valid_cuit(cuit: str) -> bool:
+    """11 digits with a correct mod-11 check digit."""
+    if not isinstance(cuit, str) or len(cuit) != 11 or not cuit.isdigit():
+        return False
+    check = 11 - sum(int(d) * w for d, w in zip(cuit, _CUIT_WEIGHTS)) % 11
+    check = {11: 0, 10: 9}.get(check, check)
+    return check == int(cuit[10])
+
+def validate_payload(payload: Any) -> List[str]:
+    """
+    Check an insert-cuenta-comitente payload before it is sent.
+
+    Returns:
+        List of problems, empty if the payload looks valid
+    """
+    if not isinstance(payload, dict):
+        return ["payload must be a JSON object"]
+
+    errors = [f"missing {field}" for field in REQUIRED_FIELDS if payload.get(field) in (None, "", [])]
+    for field, value in payload.items():
+        if field.startswith("fecha") and isinstance(value, str) and not _DATE.match(value):
+            errors.append(f"{field} must be an ISO date")
+    for field in ("esFisico", "pmtGeneraAvisosAlertasUIF", "pmtAccesoDMAMTR"):
+        if field in payload and str(payload[field]).lower() not in _BOOLEAN:
+            errors.append(f"{field} must be true or false")
+    for email in str(payload.get("emailsInfo", "")).replace(";", ",").split(","):
+        if email.strip() and not _EMAIL.match(email.strip()):
+            errors.append(f"invalid email {email.strip()}")
+
+    juridicos = payload.get("juridicos")
+    if isinstance(juridicos, dict) and juridicos.get("cuit") and not valid_cuit(juridicos["cuit"]):
+        errors.append("juridicos.cuit is not a valid CUIT")
+
+    titulares = payload.get("titulares")
+    if titulares is not None and not isinstance(titulares, list):
+        errors.append("titulares must be a list")
+    else:
+        for i, titular in enumerate(titulares or []):
+            if not isinstance(titular, dict):
+                errors.append(f"titulares[{i}] must be an object")
+                continue
+            for field in ("apellido", "nombre", "tpDoc", "numDoc"):
+                if not titular.get(field):
+                    errors.append(f"titulares[{i}] missing {field}")
+            if titular.get("cuit") and not valid_cuit(titular["cuit"]):
+                errors.append(f"titulares[{i}].cuit is not a valid CUIT")
+            for field, value in titular.items():
+                if field.startswith("fecha") and isinstance(value, str) and not _DATE.match(value):
+                    errors.append(f"titulares[{i}].{field} must be an ISO date")
+    return errors
+
+class Checkpoint:
+    def __init__(self, path: str):
+        """
+        Append-only JSONL log of per-record results.
+
+        Every finished record is written and flushed immediately, so after a
+        crash the log holds everything that completed; the last entry of a key
+        wins when it is read back. Records in "review" may have been created
+        by a request whose outcome is unknown and are never resent unless
+        retry_review is set.
+        """
+        self.path = path
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.results[entry["key"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def done(self, key: str, retry_failed: bool = True, retry_review: bool = False) -> bool:
+        entry = self.results.get(key)
+        if entry is None:
+            return False
+        if entry["status"] == "review":
+            return not retry_review
+        return entry["status"] == "ok" or not retry_failed
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.results[entry["key"]] = entry
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class OnboardingPipeline:
+    def __init__(self, client: PrimaryTradingClient, checkpoint_path: str, concurrency: int = 4,
+                 rate: float = 5.0, max_retries: int = 5, retry_failed: bool = True,
+                 endpoint_prefix: str = "/rest/", dry_run: bool = False,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None, retry_review: bool = False):
+        """
+        Submit insert-cuenta-comitente payloads in bulk and resumably.
+
+        Payloads are read lazily, validated, and sent through the client with at
+        most concurrency requests in flight. Submissions use the client's
+        rate limiter in the background lane, so interactive calls sharing the
+        client go first and 429s (with their Retry-After) slow down every
+        worker. Account creation is not idempotent, so only failures where
+        the request never reached the server (429, connection refused,
+        connect timeout) are retried, with exponential backoff; 5xx, read
+        timeouts and dropped connections are recorded as "review" for a
+        manual check instead. Each result is appended to the checkpoint under
+        the record's identity (record_key), and records already accepted
+        there are skipped, so a crashed run picks up where it stopped.
+
+        Args:
+            client: Authenticated PrimaryTradingClient
+            checkpoint_path: JSONL file with one result per processed record
+            concurrency: Maximum number of requests in flight
+            rate: Requests per second of the client's "accounts" limiter group (0 keeps its current limit)
+            max_retries: Retries per record for 429s and failed connection attempts
+            retry_failed: Resend records that failed or were invalid in an earlier run
+            endpoint_prefix: Prepended to each payload's restApiPath
+            dry_run: Only validate; nothing is sent or checkpointed
+            on_result: Optional function called with every result entry
+            retry_review: Resend records left in "review" by an earlier run (after checking them)
+        """
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        if rate > 0:
+            client.rate_limiter.configure("accounts", rate)
+        self.max_retries = max_retries
+        self.retry_failed = retry_failed
+        self.endpoint_prefix = endpoint_prefix
+        self.dry_run = dry_run
+        self.on_result = on_result
+        self.retry_review = retry_review
+
+    def _submit(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """Send one payload, retrying failures that cannot have created it. Returns the response and the attempts made."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self.client.submit_payload(payload, endpoint_prefix=self.endpoint_prefix,
+                                                  priority=BACKGROUND), attempt
+            except RateLimitError:
+                # The client's limiter already holds the group back until Retry-After
+                if attempt > self.max_retries:
+                    raise
+            except requests.RequestException as e:
+                if not _never_sent(e) or attempt > self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        delay = min(30.0, 0.5 * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _process(self, key: str, position: str, payload: Any, checkpoint: Optional[Checkpoint]) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {"key": key, "source": position}
+        if isinstance(payload, dict):
+            entry["denominacion"] = payload.get("denominacion")
+        errors = [str(payload)] if isinstance(payload, Exception) else validate_payload(payload)
+        if errors:
+            entry.update(status="invalid", errors=errors)
+        elif self.dry_run:
+            entry.update(status="valid")
+        else:
+            started = time.time()
+            try:
+                response, attempts = self._submit(payload)
+                entry.update(status="ok", response=response, attempts=attempts)
+            except Exception as e:
+                status = "review" if _maybe_applied(e) else "error"
+                entry.update(status=status, error=str(e), status_code=getattr(e, "status_code", None))
+            entry["seconds"] = round(time.time() - started, 3)
+        entry["at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        if checkpoint is not None:
+            checkpoint.record(entry)
+        if self.on_result:
+            self.on_result(entry)
+        return entry
+
+    def run(self, source: str) -> Dict[str, int]:
+        """
+        Process every payload of source.
+
+        Args:
+            source: JSONL file or directory of .json files
+
+        Returns:
+            Counts per status, plus "skipped" for records already done and
+            "duplicate" for records repeating one seen earlier in this run
+        """
+        checkpoint = None if self.dry_run else Checkpoint(self.checkpoint_path)
+        counts: Dict[str, int] = {"skipped": 0, "duplicate": 0}
+        seen = set()
+        counts_lock = threading.Lock()
+        # Bounds the records read ahead of the workers, so sources of any size stream in constant memory
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        def work(key: str, position: str, payload: Any) -> None:
+            try:
+                status = self._process(key, position, payload, checkpoint)["status"]
+                with counts_lock:
+                    counts[status] = counts.get(status, 0) + 1
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for position, payload in iter_payloads(source):
+                    key = record_key(payload) if isinstance(payload, dict) else position
+                    if key in seen:
+                        # Sending it again would open the same account twice
+                        counts["duplicate"] += 1
+                        continue
+                    seen.add(key)
+                    if checkpoint is not None and checkpoint.done(key, self.retry_failed, self.retry_review):
+                        counts["skipped"] += 1
+                        continue
+                    slots.acquire()
+                    executor.submit(work, key, position, payload)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        return counts
+
+def _never_sent(error: requests.RequestException) -> bool:
+    """True if the request failed before reaching the server (refused, unresolvable or connect timeout)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        # urllib3's NewConnectionError and NameResolutionError are ConnectTimeoutErrors too
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+def _maybe_applied(error: Exception) -> bool:
+    """True if the request may have been processed even though it failed (5xx, read timeout, dropped connection)."""
+    if isinstance(error, RateLimitError):
+        return False
+    if isinstance(error, APIError):
+        return error.status_code is None or error.status_code >= 500
+    if isinstance(error, requests.RequestException):
+        return not _never_sent(error)
+    return False
+
+
+# Example usage: python onboarding.py cuentas.jsonl --checkpoint cuentas.checkpoint.jsonl
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Bulk insert-cuenta-comitente submission with checkpointing")
+    parser.add_argument("source", help="JSONL file or directory of .json payloads (like p1.json)")
+    parser.add_argument("--checkpoint", help="Results file (default: <source>.checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second (0 keeps RATE_LIMITS)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for 429s and failed connection attempts")
+    parser.add_argument("--no-retry-failed", action="store_true", help="Skip records that failed in an earlier run")
+    parser.add_argument("--retry-review", action="store_true",
+                        help="Resend records left in review (only after checking they were not created)")
+    parser.add_argument("--endpoint-prefix", default="/rest/", help="Prepended to each restApiPath")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the payloads")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = PrimaryTradingClient(
+        client_id=os.getenv("CLIENT_ID", ""),
+        client_secret=os.getenv("CLIENT_SECRET", ""),
+        base_url=os.getenv("BASE_URL", "https://api.demo.matrizoms.com.ar"),
+        token_cache_path=os.getenv("TOKEN_CACHE_PATH"),
+        rate_limits=parse_limits(os.getenv("RATE_LIMITS"))
+    )
+
+    def report(entry):
+        print(f"{entry['source']} {entry['key']}: {entry['status']} {entry.get('errors') or entry.get('error') or ''}".rstrip())
+
+    pipeline = OnboardingPipeline(
+        client,
+        checkpoint_path=args.checkpoint or f"{args.source.rstrip('/')}.checkpoint.jsonl",
+        concurrency=args.concurrency,
+        rate=args.rate,
+        max_retries=args.max_retries,
+        retry_failed=not args.no_retry_failed,
+        endpoint_prefix=args.endpoint_prefix,
+        dry_run=args.dry_run,
+        on_result=report,
+        retry_review=args.retry_review
+    )
+    print(json.dumps(pipeline.run(args.source)))
+    client.close()
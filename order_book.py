@@ -0,0 +1,177 @@
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+# Market data entries accepted by the smd subscription message
+ALL_ENTRIES = ("BI", "OF", "LA", "OP", "CL", "SE", "HI", "LO", "TV", "OI", "IV", "EV", "NV", "ACP")
+
+class BookSide:
+    """Fixed-capacity price levels stored in preallocated arrays."""
+
+    __slots__ = ("prices", "sizes", "count")
+
+    def __init__(self, depth: int):
+        self.prices = array("d", [0.0]) * depth
+        self.sizes = array("d", [0.0]) * depth
+        self.count = 0
+
+    def update(self, levels: Optional[List[Dict[str, Any]]]) -> None:
+        """Overwrite the side in place with the levels of an Md message."""
+        if not levels:
+            self.count = 0
+            return
+
+        capacity = len(self.prices)
+        if len(levels) > capacity:
+            # The server sent more levels than we preallocated; grow once
+            extra = len(levels) - capacity
+            self.prices.extend(array("d", [0.0]) * extra)
+            self.sizes.extend(array("d", [0.0]) * extra)
+
+        prices, sizes = self.prices, self.sizes
+        n = 0
+        for level in levels:
+            price = level.get("price")
+            if price is None:
+                continue
+            prices[n] = price
+            sizes[n] = level.get("size") or 0.0
+            n += 1
+        self.count = n
+
+    def top(self) -> Optional[Tuple[float, float]]:
+        if self.count == 0:
+            return None
+        return (self.prices[0], self.sizes[0])
+
+    def levels(self, depth: int) -> List[Tuple[float, float]]:
+        n = min(depth, self.count)
+        return [(self.prices[i], self.sizes[i]) for i in range(n)]
+
+
+class TopOfBook:
+    """Immutable best bid/offer snapshot; replaced as a whole on every update."""
+
+    __slots__ = ("symbol", "bid", "bid_size", "offer", "offer_size", "last", "last_size", "volume", "timestamp")
+
+    def __init__(self, symbol, bid, bid_size, offer, offer_size, last, last_size, volume, timestamp):
+        self.symbol = symbol
+        self.bid = bid
+        self.bid_size = bid_size
+        self.offer = offer
+        self.offer_size = offer_size
+        self.last = last
+        self.last_size = last_size
+        self.volume = volume
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class OrderBook:
+    """Book state for one symbol, updated in place from Md messages."""
+
+    __slots__ = ("symbol", "bids", "offers", "last_price", "last_size", "volume", "other", "timestamp",
+                 "updates", "top", "_lock")
+
+    def __init__(self, symbol: str, depth: int):
+        self.symbol = symbol
+        self.bids = BookSide(depth)
+        self.offers = BookSide(depth)
+        self.last_price = None
+        self.last_size = None
+        self.volume = None
+        self.other: Dict[str, Any] = {}
+        self.timestamp = None
+        self.updates = 0
+        self.top = None
+        self._lock = threading.Lock()
+
+    def apply(self, market_data: Dict[str, Any], timestamp: Any) -> None:
+        with self._lock:
+            for entry, value in market_data.items():
+                if entry == "BI":
+                    self.bids.update(value)
+                elif entry == "OF":
+                    self.offers.update(value)
+                elif entry == "LA":
+                    if value:
+                        self.last_price = value.get("price")
+                        self.last_size = value.get("size")
+                    else:
+                        self.last_price = self.last_size = None
+                elif entry == "TV":
+                    self.volume = value
+                else:
+                    self.other[entry] = value
+            self.timestamp = timestamp
+            self.updates += 1
+
+            bid = self.bids.top() or (None, None)
+            offer = self.offers.top() or (None, None)
+            self.top = TopOfBook(self.symbol, bid[0], bid[1], offer[0], offer[1],
+                                 self.last_price, self.last_size, self.volume, timestamp)
+
+    def snapshot(self, depth: int) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "symbol": self.symbol,
+                "bids": self.bids.levels(depth),
+                "offers": self.offers.levels(depth),
+                "last": {"price": self.last_price, "size": self.last_size},
+                "volume": self.volume,
+                "other": dict(self.other),
+                "timestamp": self.timestamp,
+            }
+
+
+class OrderBookEngine:
+    def __init__(self, depth: int = 5):
+        """
+        Per-symbol order books maintained from the Md stream.
+
+        Args:
+            depth: Number of price levels preallocated per side
+        """
+        self.depth = depth
+        self.books: Dict[str, OrderBook] = {}
+        self._lock = threading.Lock()
+
+    def apply(self, message: Dict[str, Any]) -> Optional[OrderBook]:
+        """
+        Apply a decoded Md message to the book of its symbol.
+
+        Args:
+            message: Decoded Md message
+
+        Returns:
+            The updated book, or None if the message has no symbol
+        """
+        symbol = message.get("instrumentId", {}).get("symbol")
+        if symbol is None:
+            return None
+
+        book = self.books.get(symbol)
+        if book is None:
+            with self._lock:
+                book = self.books.setdefault(symbol, OrderBook(symbol, self.depth))
+
+        book.apply(message.get("marketData") or {}, message.get("timestamp"))
+        return book
+
+    def top_of_book(self, symbol: str) -> Optional[TopOfBook]:
+        """Latest best bid/offer for symbol, or None if no update was received yet."""
+        book = self.books.get(symbol)
+        return book.top if book else None
+
+    def book(self, symbol: str, depth: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Consistent copy of the book for symbol up to depth levels per side."""
+        book = self.books.get(symbol)
+        if book is None:
+            return None
+        return book.snapshot(depth or self.depth)
+
+    def remove(self, symbol: str) -> None:
+        with self._lock:
+            self.books.pop(symbol, None)
@@ -1,10 +1,56 @@
+import time
 import requests
-from typing import Dict, Optional, Any, List
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Any, List, Callable, Tuple, Union
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from market_data_client import MarketDataClient
+from token_manager import TokenManager
+from instrument_catalog import InstrumentCatalog
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter
+from response_cache import ResponseCache
+import metrics
+
+# Seconds responses are cached per endpoint: instrument definitions change rarely, quotes constantly
+DEFAULT_CACHE_TTLS = {"instrument_detail": 3600.0, "marketdata": 1.0}
+
+class APIError(Exception):
+    """The API answered with an error status."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+class RateLimitError(APIError):
+    """The API answered 429; retry_after is the server's hint in seconds, if any."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Rate limit exceeded", 429)
+        self.retry_after = retry_after
+
+def _retry_after(response: Any) -> Optional[float]:
+    """Retry-After of a requests or aiohttp response, in seconds."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date form
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
 
 class PrimaryTradingClient:
-    def __init__(self, client_id: str, client_secret: str, base_url: str = "https://api.demo.matrizoms.com.ar"):
+    def __init__(self, client_id: str, client_secret: str, base_url: str = "https://api.demo.matrizoms.com.ar",
+                 pool_size: int = 10, timeout: Union[float, Tuple[float, float]] = (5.0, 30.0),
+                 max_workers: int = 8, token_ttl: float = 8 * 3600, token_cache_path: Optional[str] = None,
+                 catalog_ttl: float = 3600, catalog_snapshot_path: Optional[str] = None,
+                 rate_limits: Optional[Dict[str, Tuple[float, Optional[float]]]] = None,
+                 rate_limit_retries: int = 2, max_retry_wait: float = 10.0, cache_size: int = 1024,
+                 cache_ttls: Optional[Dict[str, float]] = None):
         """
         Initialize the Primary Trading API client.
         
@@ -12,12 +58,89 @@ class PrimaryTradingClient:
             client_id: Your Primary API client ID
             client_secret: Your Primary API client secret
             base_url: The base URL for the API (defaults to production URL)
+            pool_size: Maximum number of keep-alive connections kept open to the API
+            timeout: Request timeout in seconds, or a (connect, read) tuple
+            max_workers: Maximum number of concurrent requests used by the batch methods
+            token_ttl: Seconds an access token is considered valid
+            token_cache_path: Optional file where the token is cached between restarts
+            catalog_ttl: Seconds between refreshes of the instrument catalog
+            catalog_snapshot_path: Optional file where the instrument catalog is persisted
+            rate_limits: Requests per second (and burst) per endpoint group, see rate_limiter.ENDPOINT_GROUPS
+            rate_limit_retries: Times a 429 is retried after waiting out its Retry-After
+            max_retry_wait: Longest Retry-After that is waited out instead of raising RateLimitError
+            cache_size: Responses kept in the read-through cache
+            cache_ttls: Overrides of DEFAULT_CACHE_TTLS (0 disables caching of an endpoint)
         """
         self.base_url = base_url.rstrip('/')
         self.client_id = client_id
         self.client_secret = client_secret
-        self.access_token = None
-        self.token_expiry = None
+        self.token_manager = TokenManager(
+            self._fetch_token,
+            ttl=token_ttl,
+            cache_path=token_cache_path,
+            cache_key=f"{self.base_url}|{self.client_id}"
+        )
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+        # Pooled keep-alive transport: connections are reused across calls so
+        # only the first request to the host pays the TCP/TLS handshake
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Every request goes through one limiter, so batch calls, catalog refreshes
+        # and bulk jobs share the same per-group budgets and concurrency limit
+        self.rate_limiter = RateLimiter(rate_limits, max_concurrency=pool_size)
+        self.rate_limit_retries = rate_limit_retries
+        self.max_retry_wait = max_retry_wait
+
+        # Identical concurrent lookups share one upstream call; repeated ones within the TTL are served locally
+        self.cache = ResponseCache(cache_size)
+        self.cache_ttls = {**DEFAULT_CACHE_TTLS, **(cache_ttls or {})}
+        # Live market data clients whose stream state answers get_market_data
+        self.market_data_sources: Tuple[Any, ...] = ()
+        self.stream_hits = 0
+
+        # Loaded on first lookup and refreshed once older than catalog_ttl; catalog.start() refreshes on a timer.
+        # A lookup waiting on the first load is interactive, later refreshes go through the background lane.
+        self.catalog = InstrumentCatalog(self.get_instruments, ttl=catalog_ttl,
+                                         snapshot_path=catalog_snapshot_path,
+                                         background_loader=lambda: self.get_instruments(priority=BACKGROUND))
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.token_manager.token
+
+    @property
+    def token_expiry(self) -> Optional[datetime]:
+        return self.token_manager.expiry
+
+    def _fetch_token(self) -> str:
+        """Log in with /auth/getToken and return the X-Auth-Token header."""
+        endpoint = "/auth/getToken"
+        group = self.rate_limiter.group_for(endpoint)
+        # Logins spend the "auth" budget like any other call; a request waiting on its token is interactive
+        self.rate_limiter.acquire(group, INTERACTIVE)
+        status = None
+        retry_after = None
+        try:
+            response = self._send("POST", f"{self.base_url}{endpoint}", endpoint,
+                                  {"X-Username": self.client_id, "X-Password": self.client_secret},
+                                  {"timeout": self.timeout})
+            status = response.status_code
+            if status == 429:
+                retry_after = _retry_after(response)
+        finally:
+            self.rate_limiter.release(group, status, retry_after)
+
+        if status == 429:
+            raise RateLimitError(retry_after)
+        token = response.headers.get("X-Auth-Token")
+        if response.status_code >= 400 or not token:
+            raise Exception(f"Authentication failed: {response.status_code} {response.text}")
+        return token
 
     def _get_access_token(self) -> str:
         """
@@ -26,54 +149,98 @@ class PrimaryTradingClient:
         Returns:
             str: The access token
         """
-        if self.access_token and self.token_expiry and datetime.now() < self.token_expiry:
-            return self.access_token
+        return self.token_manager.get_token()
 
-        # TODO: Implement token refresh logic
-        # This is a placeholder - you'll need to implement the actual OAuth flow
-        # Get token from the API using /auth/getToken and the header X-Username and X-Password	
-        response = requests.post(f"{self.base_url}/auth/getToken", headers={"X-Username": self.client_id, "X-Password": self.client_secret})
-        # save the token in the access_token variable. The token will be in the header response at X-Auth-Token
-        self.access_token = response.headers["X-Auth-Token"]
-        return self.access_token
-
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+    def _make_request(self, method: str, endpoint: str, priority: int = INTERACTIVE, **kwargs) -> Dict[str, Any]:
         """
         Make an authenticated request to the API.
         
         Args:
             method: HTTP method (GET, POST, etc.)
             endpoint: API endpoint
+            priority: rate_limiter.INTERACTIVE or rate_limiter.BACKGROUND
             **kwargs: Additional arguments to pass to requests
             
         Returns:
             Dict containing the API response
         """
-        headers = {
-            "X-Auth-Token": self._get_access_token(),
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        
-        if "headers" in kwargs:
-            headers.update(kwargs.pop("headers"))
-        
+        extra_headers = kwargs.pop("headers", {})
+        kwargs.setdefault("timeout", self.timeout)
         url = f"{self.base_url}{endpoint}"
-        response = requests.request(method, url, headers=headers, **kwargs)
+        group = self.rate_limiter.group_for(endpoint)
+        reauthenticated = False
+        throttled = 0
+
+        while True:
+            token = self._get_access_token()
+            headers = {"X-Auth-Token": token}
+            # JSON bodies get their Content-Type from requests
+            if "json" not in kwargs:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers.update(extra_headers)
+
+            self.rate_limiter.acquire(group, priority)
+            status = None
+            retry_after = None
+            try:
+                response = self._send(method, url, endpoint, headers, kwargs)
+                status = response.status_code
+                if status == 429:
+                    retry_after = _retry_after(response)
+            finally:
+                self.rate_limiter.release(group, status, retry_after)
+
+            # A 401 means the token was revoked or expired early: re-authenticate once and retry
+            if status == 401 and not reauthenticated:
+                reauthenticated = True
+                self.token_manager.invalidate(token)
+                continue
+            # The limiter holds the group back until Retry-After has passed
+            if status == 429 and throttled < self.rate_limit_retries and (retry_after or 0) <= self.max_retry_wait:
+                throttled += 1
+                continue
+            break
         
         if response.status_code == 429:
-            raise Exception("Rate limit exceeded")
+            raise RateLimitError(retry_after)
         elif response.status_code >= 400:
-            raise Exception(f"API Error: {response.text}")
+            raise APIError(f"API Error: {response.text}", response.status_code)
             
         return response.json()
 
+    def _send(self, method: str, url: str, endpoint: str, headers: Dict[str, str],
+              kwargs: Dict[str, Any]) -> requests.Response:
+        if not metrics.enabled:
+            return self.session.request(method, url, headers=headers, **kwargs)
+        started = time.perf_counter()
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        label = metrics.endpoint_label(endpoint)
+        metrics.rest_request_seconds.observe(time.perf_counter() - started, label)
+        metrics.rest_responses_total.inc(label, str(response.status_code))
+        return response
+
     def get_market_data(self, symbol: str) -> Dict[str, Any]:
-        """Get market data for a specific symbol."""
-        return self._make_request("GET", f"/rest/marketdata/{symbol}")
+        """
+        Get market data for a specific symbol.
+
+        Answered from the stream when an attached MarketDataClient is connected
+        and subscribed to the symbol (the result then has "source": "stream"),
+        otherwise from REST through the response cache.
+        """
+        for source in self.market_data_sources:
+            message = source.last_message(symbol)
+            if message is not None:
+                self.stream_hits += 1
+                metrics.cache_requests_total.inc("/rest/marketdata/{symbol}", "stream")
+                return {"status": "OK", "marketData": message.get("marketData", {}),
+                        "timestamp": message.get("timestamp"), "source": "stream"}
+        return self.cache.get(("marketdata", symbol), self.cache_ttls["marketdata"],
+                              lambda: self._make_request("GET", f"/rest/marketdata/{symbol}"),
+                              "/rest/marketdata/{symbol}")
 
-    def get_instruments(self) -> Dict[str, Any]:
+    def get_instruments(self, priority: int = INTERACTIVE) -> Dict[str, Any]:
         """Get all instruments."""
-        return self._make_request("GET", "/rest/instruments/details")
+        return self._make_request("GET", "/rest/instruments/details", priority=priority)
 
     def get_instruments_by_symbol(self, symbol: str) -> List[Dict[str, Any]]:
         """
@@ -85,44 +252,108 @@ class PrimaryTradingClient:
         Returns:
             List of matching instruments
         """
-        response = self.get_instruments()
-        matching_instruments = []
-        
-        # Check if response has the expected structure
-        if response.get("status") == "OK" and "instruments" in response:
-            for instrument in response["instruments"]:
-                # Get the symbol from the instrumentId
-                instrument_symbol = instrument.get("instrumentId", {}).get("symbol", "")
-                if symbol in instrument_symbol:
-                    # Create a more detailed instrument dictionary
-                    instrument_info = {
-                        'symbol': instrument_symbol,
-                        'market_id': instrument.get("instrumentId", {}).get("marketId", "N/A"),
-                        'segment': {
-                            'market_segment_id': instrument.get("segment", {}).get("marketSegmentId", "N/A"),
-                            'market_id': instrument.get("segment", {}).get("marketId", "N/A")
-                        },
-                        'price_limits': {
-                            'low': instrument.get("lowLimitPrice", "N/A"),
-                            'high': instrument.get("highLimitPrice", "N/A")
-                        },
-                        'trading_info': {
-                            'min_price_increment': instrument.get("minPriceIncrement", "N/A"),
-                            'min_trade_vol': instrument.get("minTradeVol", "N/A"),
-                            'max_trade_vol': instrument.get("maxTradeVol", "N/A"),
-                            'tick_size': instrument.get("tickSize", "N/A"),
-                            'contract_multiplier': instrument.get("contractMultiplier", "N/A")
-                        },
-                        'maturity_date': instrument.get("maturityDate", "N/A"),
-                        'cficode': instrument.get("cficode", "N/A")
-                    }
-                    matching_instruments.append(instrument_info)
-                
-        return matching_instruments
+        return [record.to_info() for record in self.catalog.find_substring(symbol, case_sensitive=True)]
     
     def get_instrument_detail(self, symbol: str, market_id: str = "ROFX") -> Dict[str, Any]:
         """Get instrument detail by symbol."""
-        return self._make_request("GET", f"/rest/instruments/detail", params={"marketId": market_id, "symbol": symbol})
+        return self.cache.get(("instrument_detail", market_id, symbol), self.cache_ttls["instrument_detail"],
+                              lambda: self._make_request("GET", f"/rest/instruments/detail",
+                                                         params={"marketId": market_id, "symbol": symbol}),
+                              "/rest/instruments/detail")
+
+    def _run_batch(self, func: Callable[[str], Dict[str, Any]], symbols: List[str]) -> List[Dict[str, Any]]:
+        """
+        Run func for every symbol over a bounded worker pool.
+        
+        Args:
+            func: Function called with each symbol
+            symbols: Symbols to process
+            
+        Returns:
+            One entry per symbol, in input order, with either "data" or "error" set
+        """
+        def call(symbol: str) -> Dict[str, Any]:
+            try:
+                return {"symbol": symbol, "data": func(symbol), "error": None}
+            except Exception as e:
+                return {"symbol": symbol, "data": None, "error": str(e)}
+
+        if not symbols:
+            return []
+
+        # Make sure the token is fetched once up front instead of by every worker
+        self._get_access_token()
+
+        workers = min(self.max_workers, len(symbols))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(call, symbols))
+
+    def get_instrument_details(self, symbols: List[str], market_id: str = "ROFX") -> List[Dict[str, Any]]:
+        """
+        Get instrument details for several symbols concurrently.
+        
+        Args:
+            symbols: Symbols to look up
+            market_id: Market ID shared by all symbols
+            
+        Returns:
+            List of {"symbol", "data", "error"} entries in the same order as symbols
+        """
+        return self._run_batch(lambda symbol: self.get_instrument_detail(symbol, market_id=market_id), symbols)
+
+    def get_market_data_many(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """
+        Get market data for several symbols concurrently.
+        
+        Args:
+            symbols: Symbols to look up
+            
+        Returns:
+            List of {"symbol", "data", "error"} entries in the same order as symbols
+        """
+        return self._run_batch(self.get_market_data, symbols)
+
+    def submit_payload(self, payload: Dict[str, Any], endpoint_prefix: str = "/rest/",
+                       priority: int = INTERACTIVE) -> Dict[str, Any]:
+        """
+        Send a self-describing payload such as p1.json (insert-cuenta-comitente).
+
+        The restApiPath/restApiMethod routing keys pick the endpoint and method;
+        the remaining fields are sent as the JSON body.
+
+        Args:
+            payload: Payload with restApiPath and restApiMethod
+            endpoint_prefix: Prepended to restApiPath to build the endpoint
+            priority: rate_limiter.INTERACTIVE or rate_limiter.BACKGROUND
+
+        Returns:
+            Dict containing the API response
+        """
+        body = dict(payload)
+        path = body.pop("restApiPath").strip("/")
+        method = body.pop("restApiMethod", "POST").upper()
+        return self._make_request(method, f"{endpoint_prefix.rstrip('/')}/{path}", json=body, priority=priority)
+
+    def attach_market_data(self, client: Any) -> None:
+        """
+        Answer get_market_data from a live (Sharded)MarketDataClient's stream state.
+
+        Args:
+            client: Any object with last_message(symbol)
+        """
+        if client not in self.market_data_sources:
+            self.market_data_sources = self.market_data_sources + (client,)
+
+    def detach_market_data(self, client: Any) -> None:
+        self.market_data_sources = tuple(source for source in self.market_data_sources if source is not client)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache counters plus market data reads answered from the stream."""
+        return {**self.cache.stats(), 'stream_hits': self.stream_hits}
+
+    def close(self) -> None:
+        """Close the pooled HTTP connections."""
+        self.session.close()
 
     def create_market_data_client(self) -> MarketDataClient:
         """
@@ -134,7 +365,10 @@ class PrimaryTradingClient:
         # Convert https URL to wss URL for WebSocket and ensure it ends with a trailing slash
         ws_url = self.base_url.replace("https://", "wss://").rstrip('/') + '/'
         print(f"Creating WebSocket client with URL: {ws_url}")  # Debug print
-        return MarketDataClient(access_token=self._get_access_token(), ws_url=ws_url)
+        client = MarketDataClient(access_token=self._get_access_token(), ws_url=ws_url, token_provider=self._get_access_token,
+                                  on_auth_failure=self.token_manager.invalidate)
+        self.attach_market_data(client)
+        return client
 
 # Example usage:
 if __name__ == "__main__":
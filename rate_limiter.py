@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import metrics
+
+# Priority lanes: lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Endpoint group rules, first match wins; everything else is "default"
+ENDPOINT_GROUPS = (
+    (re.compile(r"^/auth/"), "auth"),
+    (re.compile(r"^/rest/marketdata"), "marketdata"),
+    (re.compile(r"^/rest/instruments"), "instruments"),
+    (re.compile(r"cuenta-comitente"), "accounts"),
+)
+
+def endpoint_group(endpoint: str) -> str:
+    for pattern, group in ENDPOINT_GROUPS:
+        if pattern.search(endpoint):
+            return group
+    return "default"
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[float, Optional[float]]]:
+    """
+    Parse "group=rate[:burst],..." (e.g. RATE_LIMITS="marketdata=20,accounts=5:1").
+
+    Returns:
+        Dict of group -> (requests per second, burst)
+    """
+    limits = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        group, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[group.strip()] = (float(rate), float(burst) if burst else None)
+    return limits
+
+class TokenBucket:
+    # Minimum rate a throttled bucket is reduced to
+    MIN_RATE = 0.1
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None, probe_interval: float = 60.0):
+        """
+        Token bucket whose rate adapts to 429s.
+
+        A 429 sets a ceiling slightly under the rate that was being achieved
+        and drops the rate below it; successes then move the rate back up
+        towards the ceiling without crossing it. The ceiling is raised a few
+        percent after every probe_interval without throttling, so the bucket
+        settles just under the server's limit instead of saw-toothing around it.
+
+        Args:
+            rate: Configured requests per second (None for no limit until the first 429)
+            burst: Tokens that can accumulate (defaults to one second worth)
+            probe_interval: Seconds without 429s before the ceiling is raised again
+        """
+        self.limit = rate
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.probe_interval = probe_interval
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_throttle = 0.0
+        self.throttled = 0
+        self.observed_rate = 0.0
+        self._window_start = self.updated
+        self._window_count = 0
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token can be taken (0 if one is available now)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate is not None:
+            self.tokens -= 1
+        self._window_count += 1
+        if now - self._window_start >= 1.0:
+            self.observed_rate = self._window_count / (now - self._window_start)
+            self._window_start, self._window_count = now, 0
+
+    def on_success(self, now: float) -> None:
+        if self.rate is None:
+            return
+        if now - self.last_throttle >= self.probe_interval and (self.limit is None or self.ceiling < self.limit):
+            self.ceiling = self.ceiling * 1.05 if self.limit is None else min(self.limit, self.ceiling * 1.05)
+            self.last_throttle = now
+        self.rate += (self.ceiling - self.rate) * 0.05
+
+    def on_throttle(self, now: float, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, now + (retry_after if retry_after is not None else 1.0))
+        # Requests already in flight usually come back throttled together; count that as one signal
+        if now - self.last_throttle < 1.0:
+            return
+        achieved = self.rate if self.rate is not None else max(self.observed_rate, self._window_count)
+        self.ceiling = max(self.MIN_RATE, achieved * 0.95)
+        self.rate = max(self.MIN_RATE, self.ceiling * 0.8)
+        self.tokens = 0.0
+        self.last_throttle = now
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'ceiling': self.ceiling,
+            'rate': self.rate,
+            'observed_rate': self.observed_rate,
+            'blocked_for': max(0.0, self.blocked_until - now),
+            'throttled': self.throttled
+        }
+
+class RateLimiter:
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, Optional[float]]]] = None, max_concurrency: int = 10,
+                 min_concurrency: int = 1, background_share: float = 0.75):
+        """
+        Client-side request admission shared by every call of a client.
+
+        Each endpoint group has its own TokenBucket. On top of that an AIMD
+        concurrency limit caps the requests in flight: it grows by about one
+        per round of successful requests and shrinks by a quarter on a 429,
+        5xx or connection error.
+
+        Callers pick a priority lane. Within a group, waiters are served in
+        (priority, arrival) order, and background requests may only use
+        background_share of the concurrency limit and never take a slot while
+        an interactive request is waiting for one.
+
+        Args:
+            limits: Dict of group -> (requests per second, burst); unlisted groups
+                are unlimited until they see a 429
+            max_concurrency: Upper bound of requests in flight
+            min_concurrency: Lower bound the concurrency limit backs off to
+            background_share: Fraction of the concurrency limit background requests may use
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.background_share = background_share
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._waiting: Dict[str, List[Tuple[int, int]]] = {}
+        self._needs_slot: Set[Tuple[int, int]] = set()
+        self._seq = itertools.count()
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+        for group, (rate, burst) in (limits or {}).items():
+            self.configure(group, rate, burst)
+
+    group_for = staticmethod(endpoint_group)
+
+    def configure(self, group: str, rate: Optional[float], burst: Optional[float] = None) -> None:
+        """Set the requests per second (None for no limit) of an endpoint group."""
+        with self._cond:
+            self.buckets[group] = TokenBucket(rate, burst)
+            self._cond.notify_all()
+
+    def _bucket(self, group: str) -> TokenBucket:
+        bucket = self.buckets.get(group)
+        if bucket is None:
+            bucket = self.buckets[group] = TokenBucket()
+        return bucket
+
+    def _slots(self, priority: int) -> int:
+        if priority <= INTERACTIVE:
+            return max(1, int(self.concurrency))
+        return max(1, int(self.concurrency * self.background_share))
+
+    def acquire(self, group: str, priority: int = INTERACTIVE) -> None:
+        """Block until a request to group may be sent. Every acquire must be paired with release."""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            waiting = self._waiting.setdefault(group, [])
+            heapq.heappush(waiting, ticket)
+            try:
+                while True:
+                    timeout = None
+                    if waiting[0] == ticket:
+                        has_slot = self.in_flight < self._slots(priority)
+                        if priority > INTERACTIVE and self._needs_slot:
+                            has_slot = False
+                        if has_slot:
+                            self._needs_slot.discard(ticket)
+                            now = time.monotonic()
+                            bucket = self._bucket(group)
+                            timeout = bucket.wait_time(now)
+                            if timeout <= 0:
+                                bucket.take(now)
+                                self.in_flight += 1
+                                return
+                        elif priority <= INTERACTIVE:
+                            self._needs_slot.add(ticket)
+                    self._cond.wait(timeout)
+            finally:
+                self._needs_slot.discard(ticket)
+                waiting.remove(ticket)
+                heapq.heapify(waiting)
+                self._cond.notify_all()
+
+    def release(self, group: str, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """
+        Report the outcome of a request started with acquire.
+
+        Args:
+            group: The group passed to acquire
+            status: HTTP status code, or None if the request failed without a response
+            retry_after: Retry-After of a 429, in seconds
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            bucket = self._bucket(group)
+            if status == 429:
+                bucket.on_throttle(now, retry_after)
+                metrics.rest_throttled_total.inc(group)
+            if status is None or status == 429 or status >= 500:
+                if now - self._last_backoff >= 1.0:
+                    self.concurrency = max(self.min_concurrency, self.concurrency * 0.75)
+                    self._last_backoff = now
+            else:
+                bucket.on_success(now)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                'concurrency': self.concurrency,
+                'in_flight': self.in_flight,
+                'waiting': sum(len(waiting) for waiting in self._waiting.values()),
+                'groups': {group: bucket.stats(now) for group, bucket in self.buckets.items()}
+            }
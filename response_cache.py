@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+
+class _Call:
+    """An upstream call that concurrent identical requests wait on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024):
+        """
+        Read-through LRU cache of API responses.
+
+        Identical requests issued while one is already in flight wait for it
+        and share its result instead of going upstream again. Errors are
+        passed to every waiter and never cached. Cached values are shared
+        between callers and must be treated as read-only.
+
+        Args:
+            max_entries: Responses kept before the least recently used is evicted
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        # key -> (expires_at, value), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, ttl: float, loader: Callable[[], Any], label: str = "") -> Any:
+        """
+        Return the cached value of key, or load it.
+
+        Args:
+            key: Cache key, e.g. (endpoint, params)
+            ttl: Seconds a loaded value stays valid (0 disables caching but still coalesces)
+            loader: Called without arguments to fetch the value on a miss
+            label: Endpoint label for metrics
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.cache_requests_total.inc(label, "hit")
+                    return entry[1]
+                del self._entries[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        metrics.cache_requests_total.inc(label, "miss" if leader else "coalesced")
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and ttl > 0:
+                    self._entries[key] = (time.monotonic() + ttl, call.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            call.done.set()
+        return call.value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything if key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,108 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from market_data_client import MarketDataClient
+from order_book import TopOfBook
+
+class ShardedMarketDataClient:
+    def __init__(self, access_token: str, ws_url: str = "wss://api.demo.matrizoms.com.ar", shards: int = 2,
+                 **kwargs):
+        """
+        Spread subscriptions over several WebSocket connections.
+
+        Each symbol always lands on the same connection (stable CRC32 hash),
+        every connection is read and decoded on its own thread, and all of
+        them report through the callbacks given to subscribe().
+
+        Args:
+            access_token: The access token for authentication
+            ws_url: The WebSocket URL (defaults to production URL)
+            shards: Number of upstream connections
+            **kwargs: Additional arguments for each MarketDataClient
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.ws_url = ws_url
+        self.clients = [MarketDataClient(access_token=access_token, ws_url=ws_url, **kwargs) for _ in range(shards)]
+
+    @property
+    def recorder(self) -> Optional[Any]:
+        return self.clients[0].recorder
+
+    @property
+    def subscriptions(self) -> Dict[str, int]:
+        merged = {}
+        for client in self.clients:
+            merged.update(client.subscriptions)
+        return merged
+
+    @property
+    def connected(self) -> bool:
+        return all(client.connected for client in self.clients if client.ws)
+
+    def shard_for(self, symbol: str) -> MarketDataClient:
+        """The connection a symbol is assigned to."""
+        return self.clients[zlib.crc32(symbol.encode("utf-8")) % len(self.clients)]
+
+    def _group(self, symbols: List[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for symbol in symbols:
+            groups.setdefault(zlib.crc32(symbol.encode("utf-8")) % len(self.clients), []).append(symbol)
+        return groups
+
+    def subscribe(self, symbols: List[str], depth: int = 1, callback: Optional[Callable] = None,
+                  entries: Optional[List[str]] = None) -> None:
+        """
+        Subscribe to real-time market data for specified symbols.
+
+        Shards are connected and subscribed in parallel; each one receives its
+        symbols as batched smd messages.
+
+        Args:
+            symbols: List of symbols to subscribe to
+            depth: Order book depth (default: 1)
+            callback: Optional callback function to handle updates
+            entries: Market data entries to request
+        """
+        groups = self._group(symbols)
+        if not groups:
+            return
+        if len(groups) == 1:
+            shard, group = next(iter(groups.items()))
+            self.clients[shard].subscribe(group, depth=depth, callback=callback, entries=entries)
+            return
+
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = [executor.submit(self.clients[shard].subscribe, group, depth, callback, entries)
+                       for shard, group in groups.items()]
+            for future in futures:
+                future.result()
+
+    def unsubscribe(self, symbols: List[str]) -> None:
+        """
+        Unsubscribe from market data for specified symbols.
+
+        Args:
+            symbols: List of symbols to unsubscribe from
+        """
+        for shard, group in self._group(symbols).items():
+            self.clients[shard].unsubscribe(group)
+
+    def last_message(self, symbol: str) -> Optional[Dict[str, Any]]:
+        return self.shard_for(symbol).last_message(symbol)
+
+    def top_of_book(self, symbol: str) -> Optional[TopOfBook]:
+        return self.shard_for(symbol).top_of_book(symbol)
+
+    def book(self, symbol: str, depth: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        return self.shard_for(symbol).book(symbol, depth)
+
+    def status(self) -> Dict[str, Any]:
+        """Connection state of every shard."""
+        return {'shards': [client.status() for client in self.clients]}
+
+    def close(self) -> None:
+        """Close every connection."""
+        for client in self.clients:
+            client.close()
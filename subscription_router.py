@@ -0,0 +1,170 @@
+import json
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from broadcaster import ClientQueue
+import metrics
+
+class SubscriptionRouter:
+    def __init__(self, upstream: Any = None, callback: Optional[Callable] = None):
+        """
+        Route Md updates to the connections that asked for each symbol.
+
+        Upstream subscriptions are reference-counted: the first connection
+        watching a symbol subscribes it on the MarketDataClient and the last
+        one leaving unsubscribes it.
+
+        Args:
+            upstream: MarketDataClient used for upstream subscriptions (can be set later)
+            callback: Callback registered upstream; defaults to self.route
+        """
+        self.upstream = upstream
+        self.callback = callback or self.route
+        # symbol -> frozenset of clients; replaced on change so route() needs no lock
+        self.topics: Dict[str, FrozenSet[ClientQueue]] = {}
+        self.client_symbols: Dict[int, set] = {}
+        self.routed = 0
+        # Guards topics and client_symbols; never held across a call upstream
+        self._lock = threading.Lock()
+        # Serializes upstream subscribe/unsubscribe calls
+        self._upstream_lock = threading.Lock()
+
+    def subscribe(self, client: ClientQueue, symbols: Iterable[str]) -> List[str]:
+        """
+        Add symbols to a client's watch list.
+
+        Returns:
+            The symbols that were newly subscribed upstream
+        """
+        with self._lock:
+            new_upstream = []
+            watched = self.client_symbols.setdefault(client.id, set())
+            for symbol in symbols:
+                if symbol in watched:
+                    continue
+                watched.add(symbol)
+                clients = self.topics.get(symbol, frozenset())
+                if not clients:
+                    new_upstream.append(symbol)
+                self.topics[symbol] = clients | {client}
+
+        if not new_upstream:
+            return []
+        # The upstream call blocks on the network, so other connections keep
+        # changing their watch lists meanwhile; upstream calls are serialized
+        # and each one applies the watch lists as they are when it runs
+        with self._upstream_lock:
+            with self._lock:
+                pending = [symbol for symbol in new_upstream if symbol in self.topics]
+            if not pending:
+                return []
+            try:
+                self._upstream().subscribe(pending, callback=self.callback)
+            except Exception as e:
+                # Connections that joined these symbols meanwhile were counting on this call too
+                with self._lock:
+                    waiting = self._drop_topics(pending)
+                for other, failed in waiting.items():
+                    if other is not client:
+                        other.put(json.dumps({"type": "error", "error": f"Subscription failed: {e}",
+                                              "symbols": failed}))
+                raise
+            return pending
+
+    def unsubscribe(self, client: ClientQueue, symbols: Iterable[str]) -> List[str]:
+        """
+        Remove symbols from a client's watch list.
+
+        Returns:
+            The symbols that were unsubscribed upstream
+        """
+        with self._lock:
+            gone = self._forget(client, symbols)
+        return self._unsubscribe_upstream(gone)
+
+    def remove_client(self, client: ClientQueue) -> List[str]:
+        """Drop every subscription held by a closed connection."""
+        with self._lock:
+            symbols = self.client_symbols.pop(client.id, set())
+            gone = self._forget(client, symbols)
+        try:
+            return self._unsubscribe_upstream(gone)
+        except Exception:
+            metrics.errors_total.inc("upstream_unsubscribe")
+            return gone
+
+    def _unsubscribe_upstream(self, gone: List[str]) -> List[str]:
+        if not gone:
+            return []
+        with self._upstream_lock:
+            with self._lock:
+                # Another connection may have subscribed them again meanwhile
+                gone = [symbol for symbol in gone if symbol not in self.topics]
+                upstream = self.upstream
+            if gone and upstream:
+                upstream.unsubscribe(gone)
+            return gone
+
+    def _forget(self, client: ClientQueue, symbols: Iterable[str]) -> List[str]:
+        gone = []
+        watched = self.client_symbols.get(client.id, set())
+        for symbol in list(symbols):
+            watched.discard(symbol)
+            clients = self.topics.get(symbol)
+            if not clients or client not in clients:
+                continue
+            clients = clients - {client}
+            if clients:
+                self.topics[symbol] = clients
+            else:
+                del self.topics[symbol]
+                gone.append(symbol)
+        return gone
+
+    def _drop_topics(self, symbols: Iterable[str]) -> Dict[ClientQueue, List[str]]:
+        """Remove symbols from every watch list; returns the symbols each client lost."""
+        dropped: Dict[ClientQueue, List[str]] = {}
+        for symbol in symbols:
+            for client in self.topics.pop(symbol, frozenset()):
+                self.client_symbols.get(client.id, set()).discard(symbol)
+                dropped.setdefault(client, []).append(symbol)
+        return dropped
+
+    def _upstream(self) -> Any:
+        if self.upstream is None:
+            raise Exception("Not connected")
+        return self.upstream
+
+    def symbols_for(self, client: ClientQueue) -> List[str]:
+        return sorted(self.client_symbols.get(client.id, ()))
+
+    def route(self, data: Dict[str, Any]) -> None:
+        """Deliver an Md update to the connections watching its symbol."""
+        symbol = data.get("instrumentId", {}).get("symbol")
+        clients = self.topics.get(symbol)
+        if not clients:
+            return
+        # Serialize once for every JSON connection; compact ones encode their own deltas
+        payload = None
+        self.routed += 1
+        for client in clients:
+            if client.encoder is not None:
+                client.put(data, symbol)
+                continue
+            if payload is None:
+                payload = json.dumps(data)
+            client.put(payload, symbol)
+
+    def attach(self, upstream: Any) -> None:
+        """Use a new upstream client and resubscribe every watched symbol on it."""
+        with self._upstream_lock:
+            with self._lock:
+                self.upstream = upstream
+                symbols = list(self.topics)
+            if symbols:
+                upstream.subscribe(symbols, callback=self.callback)
+
+    def detach(self) -> None:
+        """Stop using the upstream client; client watch lists are kept for the next attach."""
+        with self._upstream_lock, self._lock:
+            self.upstream = None
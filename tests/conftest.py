@@ -0,0 +1,34 @@
+import asyncio
+import os
+import sys
+import time
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition until it is true or timeout seconds have passed; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+async def wait_for_async(condition, timeout=5.0):
+    """wait_for for code running on the event loop."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.02)
+    return condition()
+
+
+def md(symbol, timestamp=1700000000000, **market_data):
+    """An Md message as the Matriz feed sends it."""
+    return {"type": "Md", "timestamp": timestamp, "instrumentId": {"marketId": "ROFX", "symbol": symbol},
+            "marketData": market_data}
@@ -0,0 +1,118 @@
+import asyncio
+import random
+
+import pytest
+from aiohttp import web
+
+import async_market_data_client
+from async_market_data_client import AsyncMarketDataClient
+from async_primary_trading_client import AsyncPrimaryTradingClient
+from conftest import wait_for_async
+from fake_matriz_server import FakeMatrizServer
+from primary_trading_client import APIError, RateLimitError
+
+
+@pytest.fixture
+def server():
+    server = FakeMatrizServer(port=0, symbols=5, tick_rate=50).start()
+    server.tokens.add("token")
+    yield server
+    server.stop()
+
+
+def test_reconnect_replays_each_subscriptions_entries(server):
+    a, b = server.symbols[:2]
+
+    async def main():
+        received = {}
+        async with AsyncMarketDataClient("token", ws_url=server.ws_url) as client:
+            await client.subscribe([a], entries=["BI"])
+            await client.subscribe([b], entries=["LA", "TV"])
+
+            async def consume():
+                async for data in client.stream([a, b]):
+                    received[data["instrumentId"]["symbol"]] = data
+
+            task = asyncio.create_task(consume())
+            assert await wait_for_async(lambda: len(received) == 2)
+            server.drop_connections()
+            assert await wait_for_async(lambda: not client.connected.is_set())
+            received.clear()
+            assert await wait_for_async(lambda: len(received) == 2)
+            task.cancel()
+        assert set(received[a]["marketData"]) == {"BI"}
+        assert set(received[b]["marketData"]) == {"LA", "TV"}
+
+    asyncio.run(main())
+
+
+def test_failed_reopen_keeps_backing_off(server, monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        # wait_for() polls every 0.02 s through the same asyncio.sleep
+        if delay != 0.02:
+            delays.append(delay)
+        await real_sleep(0)
+
+    async def main():
+        client = AsyncMarketDataClient("token", ws_url=server.ws_url, max_reconnect_delay=8)
+        await client.connect()
+
+        async def refuse():
+            raise OSError("connection refused")
+
+        client._open = refuse
+        monkeypatch.setattr(random, "uniform", lambda low, high: high)
+        monkeypatch.setattr(async_market_data_client.asyncio, "sleep", fake_sleep)
+        await client.ws.close()
+        assert await wait_for_async(lambda: len(delays) >= 6)
+        client._closing = True
+        client._reader_task.cancel()
+        monkeypatch.undo()
+        await client._session.close()
+
+    asyncio.run(main())
+    assert delays[:6] == [1.0, 2.0, 4.0, 8, 8, 8]
+
+
+def test_rest_errors_match_the_sync_client():
+    async def token(request):
+        return web.Response(headers={"X-Auth-Token": "token"})
+
+    async def throttled(request):
+        return web.Response(status=429, headers={"Retry-After": "3"})
+
+    async def missing(request):
+        return web.json_response({"status": "ERROR"}, status=404)
+
+    async def echo(request):
+        return web.json_response({"contentType": request.content_type})
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/auth/getToken", token)
+        app.router.add_get("/throttled", throttled)
+        app.router.add_get("/missing", missing)
+        app.router.add_post("/echo", echo)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncPrimaryTradingClient("id", "secret", base_url=f"http://127.0.0.1:{port}") as client:
+                with pytest.raises(RateLimitError) as throttled_error:
+                    await client._make_request("GET", "/throttled")
+                assert throttled_error.value.retry_after == 3.0
+                with pytest.raises(APIError) as missing_error:
+                    await client._make_request("GET", "/missing")
+                assert missing_error.value.status_code == 404
+                assert (await client._make_request("POST", "/echo", json={"a": 1}))["contentType"] == "application/json"
+                assert (await client._make_request("POST", "/echo", data="a=1"))["contentType"] == \
+                    "application/x-www-form-urlencoded"
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
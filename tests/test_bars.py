@@ -0,0 +1,71 @@
+import pytest
+
+from bars import BarAggregator, BarSeries, format_interval, parse_interval
+from conftest import md
+
+T0 = 1700000040  # a minute boundary
+
+
+def trade(seconds, price, size, **market_data):
+    date = int((T0 + seconds) * 1000)
+    return md("A", date, LA={"date": date, "price": price, "size": size}, **market_data)
+
+
+def test_parse_and_format_interval():
+    assert [parse_interval(v) for v in ("1s", "5m", "1h", "1d", "30")] == [1, 300, 3600, 86400, 30]
+    assert [format_interval(s) for s in (1, 90, 300, 7200)] == ["1s", "90s", "5m", "2h"]
+    with pytest.raises(ValueError):
+        parse_interval("0m")
+
+
+def test_trades_fold_into_bars_of_every_interval():
+    bars = BarAggregator(intervals=(60, 1), capacity=10)
+    bars.update(trade(0, 10.0, 1))
+    # Md repeats the last trade until the next one; it is counted once
+    bars.update(trade(0, 10.0, 1))
+    bars.update(trade(0.5, 12.0, 2))
+    bars.update(trade(1.2, 9.0, 3))
+    # Older than the current bar of both intervals
+    bars.update(trade(-1, 50.0, 1))
+
+    assert bars.bars("A", 1) == {"t": [T0, T0 + 1], "open": [10.0, 9.0], "high": [12.0, 9.0], "low": [10.0, 9.0],
+                                 "close": [12.0, 9.0], "volume": [3.0, 3.0], "trades": [2, 1]}
+    assert bars.bars("A", 60) == {"t": [T0], "open": [10.0], "high": [12.0], "low": [9.0], "close": [9.0],
+                                  "volume": [6.0], "trades": [3]}
+    assert bars.stats()["updates"] == 4 and bars.stats()["late"] == 2
+
+
+def test_volume_comes_from_total_volume_when_sent():
+    bars = BarAggregator(intervals=(60,))
+    # The first TV only sets the baseline
+    bars.update(trade(0, 10.0, 1, TV=100))
+    bars.update(trade(0, 10.0, 1, TV=105))
+    bars.update(trade(2, 11.0, 2, TV=107))
+    # A lower TV is a new session: it resets the baseline and adds nothing
+    bars.update(md("A", (T0 + 3) * 1000, TV=50))
+    bar = bars.bars("A", 60)
+    assert bar["volume"] == [7.0] and bar["trades"] == [2] and bar["close"] == [11.0]
+
+
+def test_series_overwrites_the_oldest_bars_and_slices_across_the_wrap():
+    series = BarSeries(interval=1, capacity=3)
+    for i in range(5):
+        assert series.add_trade(T0 + i, float(i), 1.0)
+    assert series.slice()["t"] == [T0 + 2, T0 + 3, T0 + 4]
+    assert series.slice(limit=2)["close"] == [3.0, 4.0]
+    assert series.slice(since=T0 + 2, limit=2)["t"] == [T0 + 2, T0 + 3]
+    assert series.slice(since=T0 + 3)["t"] == [T0 + 3, T0 + 4]
+    assert series.slice(since=T0 + 10)["t"] == []
+
+
+def test_unknown_symbols_intervals_and_forget():
+    bars = BarAggregator(intervals=(1,))
+    assert bars.bars("A", 1) is None
+    with pytest.raises(ValueError, match="available: 1s"):
+        bars.bars("A", 60)
+    bars.update(trade(0, 10.0, 1))
+    bars.forget(["A"])
+    assert bars.bars("A", 1) is None
+    # The trade memory went with the bars, so the repeated LA opens a bar again
+    bars.update(trade(0, 10.0, 1))
+    assert bars.bars("A", 1)["trades"] == [1]
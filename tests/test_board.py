@@ -0,0 +1,31 @@
+from board import MarketBoard
+from conftest import md
+
+
+def test_snapshot_derives_columns_and_reports_missing_values_as_none():
+    board = MarketBoard(capacity=2)
+    board.update(md("A", BI=[{"price": 99.0, "size": 5}], OF=[{"price": 101.0, "size": 3}],
+                    LA={"price": 102.0}, CL={"price": 100.0}))
+    board.update(md("B", OF=[{"price": 10.0, "size": 1}], LA={"price": 5.0}, CL={"price": 0}))
+    board.update(md("C", BI=[], LA=7.0))
+
+    snapshot = board.snapshot()
+    assert snapshot["symbol"] == ["A", "B", "C"]
+    assert snapshot["mid"] == [100.0, None, None]
+    assert snapshot["spread"] == [2.0, None, None]
+    assert snapshot["spread_bps"] == [200.0, None, None]
+    assert snapshot["change"] == [2.0, 5.0, None]
+    # A zero previous close has no meaningful percentage change
+    assert snapshot["change_pct"] == [2.0, None, None]
+    assert snapshot["bid"] == [99.0, None, None]
+    assert snapshot["last"] == [102.0, 5.0, 7.0]
+
+
+def test_snapshot_of_selected_and_forgotten_symbols():
+    board = MarketBoard()
+    for symbol in ("A", "B", "C"):
+        board.update(md(symbol, LA={"price": 1.0}))
+    board.forget(["B"])
+    assert board.snapshot(["C", "B", "unknown", "A"])["symbol"] == ["C", "A"]
+    assert board.snapshot(["A"])["last"] == [1.0]
+    assert board.snapshot([])["symbol"] == []
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from broadcaster import CONFLATE, DISCONNECT, DROP_OLDEST, Broadcaster, ClientQueue
+from conftest import wait_for
+
+
+class SlowSocket:
+    """send() blocks until the gate opens, like a browser that stopped reading."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.sending = threading.Event()
+        self.sent = []
+        self.closed = False
+
+    def send(self, payload):
+        self.sending.set()
+        self.gate.wait(5)
+        if payload == "boom":
+            raise OSError("connection reset")
+        self.sent.append(payload)
+
+    def close(self):
+        self.closed = True
+
+
+def stalled_client(max_size, policy):
+    """A client whose writer is stuck sending "0", so later puts stay queued."""
+    ws = SlowSocket()
+    client = ClientQueue(ws, max_size, policy)
+    client.put("0")
+    assert ws.sending.wait(5)
+    return ws, client
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    ws, client = stalled_client(3, DROP_OLDEST)
+    for i in range(1, 6):
+        client.put(str(i))
+    assert client.stats()["queued"] == 3 and client.dropped == 2
+    ws.gate.set()
+    assert wait_for(lambda: len(ws.sent) == 4)
+    assert ws.sent == ["0", "3", "4", "5"]
+    client.close()
+
+
+def test_conflate_replaces_pending_updates_in_place():
+    ws, client = stalled_client(2, CONFLATE)
+    client.put("A1", key="A")
+    client.put("B1", key="B")
+    client.put("A2", key="A")
+    assert client.conflated == 1 and client.dropped == 0
+    # Full: a new symbol evicts the oldest pending one
+    client.put("C1", key="C")
+    assert client.dropped == 1
+    ws.gate.set()
+    assert wait_for(lambda: len(ws.sent) == 3)
+    assert ws.sent == ["0", "B1", "C1"]
+    client.close()
+
+
+def test_disconnect_policy_closes_a_client_that_falls_behind():
+    ws, client = stalled_client(2, DISCONNECT)
+    for i in range(1, 4):
+        client.put(str(i))
+    assert client.closed and client.dropped == 3
+    client.put("ignored")
+    ws.gate.set()
+    assert wait_for(lambda: ws.closed)
+    assert ws.sent == ["0"]
+
+
+def test_failed_send_closes_the_client():
+    ws = SlowSocket()
+    ws.gate.set()
+    client = ClientQueue(ws, 10, DROP_OLDEST)
+    client.put("boom")
+    assert wait_for(lambda: ws.closed)
+    assert client.closed
+
+
+def test_publish_encodes_once_and_skips_closed_clients():
+    broadcaster = Broadcaster(max_queue=10)
+    fast, gone = SlowSocket(), SlowSocket()
+    fast.gate.set()
+    gone.gate.set()
+    client = broadcaster.register(fast)
+    closed = broadcaster.register(gone)
+    closed.close()
+    broadcaster.publish({"type": "Md", "n": 1}, key="A")
+    assert wait_for(lambda: fast.sent == ['{"type": "Md", "n": 1}'])
+    assert broadcaster.clients() == [client]
+    # Non-string payloads go through the connection's encoder; None means nothing to send
+    client.encoder = lambda payload: None if payload["n"] == 2 else f"n={payload['n']}"
+    client.put({"n": 2})
+    client.put({"n": 3})
+    assert wait_for(lambda: len(fast.sent) == 2)
+    assert fast.sent[-1] == "n=3"
+    broadcaster.close()
+    assert broadcaster.clients() == []
+    with pytest.raises(ValueError):
+        Broadcaster(policy="block")
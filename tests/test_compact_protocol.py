@@ -0,0 +1,125 @@
+import base64
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from conftest import md
+from compact_protocol import DEFINE, DELTA, SNAPSHOT, CompactEncoder, packb
+
+HTML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "market_data.html")
+
+
+def unpack(data):
+    """Reference MessagePack reader for the subset packb emits."""
+    pos = 0
+
+    def take(n):
+        nonlocal pos
+        chunk = data[pos:pos + n]
+        pos += n
+        return chunk
+
+    def read():
+        b = take(1)[0]
+        if b < 0x80:
+            return b
+        if b >= 0xe0:
+            return b - 0x100
+        if b & 0xf0 == 0x80:
+            return {read(): read() for _ in range(b & 0x0f)}
+        if b & 0xf0 == 0x90:
+            return [read() for _ in range(b & 0x0f)]
+        if b & 0xe0 == 0xa0:
+            return take(b & 0x1f).decode("utf-8")
+        fixed = {0xca: ">f", 0xcb: ">d", 0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd2: ">i", 0xd3: ">q"}
+        if b in fixed:
+            fmt = fixed[b]
+            return struct.unpack(fmt, take(struct.calcsize(fmt)))[0]
+        if b in (0xc0, 0xc2, 0xc3):
+            return {0xc0: None, 0xc2: False, 0xc3: True}[b]
+        if b in (0xd9, 0xda, 0xdb):
+            n = struct.unpack({0xd9: ">B", 0xda: ">H", 0xdb: ">I"}[b], take({0xd9: 1, 0xda: 2, 0xdb: 4}[b]))[0]
+            return take(n).decode("utf-8")
+        if b in (0xdc, 0xdd):
+            n = struct.unpack(">H" if b == 0xdc else ">I", take(2 if b == 0xdc else 4))[0]
+            return [read() for _ in range(n)]
+        if b in (0xde, 0xdf):
+            n = struct.unpack(">H" if b == 0xde else ">I", take(2 if b == 0xde else 4))[0]
+            return {read(): read() for _ in range(n)}
+        raise ValueError(f"Unexpected type 0x{b:02x}")
+
+    value = read()
+    assert pos == len(data)
+    return value
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 127, 128, 255, 256, 65535, 65536, 2 ** 32, 2 ** 63, -1, -32, -33, -2 ** 31 - 1,
+    1.5, 0.1, 1e300, -1e39, float("inf"), 100.0, "", "a" * 31, "b" * 32, "ñ" * 200, "c" * 70000,
+    list(range(15)), list(range(16)), list(range(70000)), {str(i): i for i in range(20)},
+    [{"price": 101.25, "size": 10}, {"price": 101.3, "size": None}],
+])
+def test_packb_round_trip(value):
+    decoded = unpack(packb(value))
+    # Whole floats are sent as ints; everything else keeps its value exactly
+    assert decoded == value
+
+
+STREAM = [
+    md("A", 1, BI=[{"price": 99.5, "size": 10}, {"price": 99.4, "size": 5}], OF=[{"price": 100.1, "size": 3}],
+       LA={"price": 100.0, "size": 1, "date": 1}, TV=10),
+    md("B", 2, OF=[{"price": 7.25, "size": 1}]),
+    # Only the second bid level and the trade change
+    md("A", 3, BI=[{"price": 99.5, "size": 10}, {"price": 99.3, "size": 8}], OF=[{"price": 100.1, "size": 3}],
+       LA={"price": 100.1, "size": 2, "date": 3}, TV=12),
+    # Book shrinks and TV disappears
+    md("A", 4, BI=[{"price": 99.5, "size": 10}], OF=[{"price": 100.1, "size": 3}],
+       LA={"price": 100.1, "size": 2, "date": 3}),
+]
+
+
+def test_encoder_sends_definitions_snapshots_then_deltas():
+    encoder = CompactEncoder()
+    frames = [unpack(encoder(message)) for message in STREAM]
+    assert [[m[0] for m in frame] for frame in frames] == [[DEFINE, SNAPSHOT], [DEFINE, SNAPSHOT], [DELTA], [DELTA]]
+    _, _, _, changed, books, removed = frames[2][0]
+    assert books == {"BI": [2, [[1, 99.3, 8]]]}
+    assert set(changed) == {"LA", "TV"}
+    assert removed == []
+    assert frames[3][0][4] == {"BI": [1, []]} and frames[3][0][5] == ["TV"]
+    # An unchanged message produces no frame at all
+    assert encoder(STREAM[3]) is None
+    assert encoder("text passes through") == "text passes through"
+
+
+def _browser_decoder():
+    with open(HTML, encoding="utf-8") as f:
+        page = f.read()
+    match = re.search(r"(const DEFINE = 0.*?)\n\s*function resync\(\)", page, re.S)
+    assert match, "compact decoder not found in market_data.html"
+    return match.group(1)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_browser_decoder_rebuilds_every_message():
+    encoder = CompactEncoder()
+    frames = [base64.b64encode(encoder(message)).decode() for message in STREAM]
+    script = _browser_decoder() + """
+        const frames = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+        const out = [];
+        for (const frame of frames) {
+            const bytes = Buffer.from(frame, 'base64');
+            const buffer = bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length);
+            out.push(...decodeCompactFrame(buffer));
+        }
+        console.log(JSON.stringify(out));
+    """
+    result = subprocess.run(["node", "-e", script], input=json.dumps(frames), capture_output=True, text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout) == STREAM
@@ -0,0 +1,62 @@
+from conflation import Conflator
+from conftest import md, wait_for
+
+
+def test_flush_delivers_only_the_latest_update_per_symbol_in_arrival_order():
+    delivered = []
+    conflator = Conflator(delivered.append, max_rate=10)
+    for message in (md("A", 1), md("B", 2), md("A", 3), md("A", 4)):
+        conflator.update(message)
+    assert delivered == []
+    assert conflator.flush() == 2
+    assert [(m["instrumentId"]["symbol"], m["timestamp"]) for m in delivered] == [("A", 4), ("B", 2)]
+    stats = conflator.stats()
+    assert (stats["received"], stats["coalesced"], stats["delivered"], stats["pending"]) == (4, 2, 2, 0)
+    assert conflator.flush() == 0
+
+
+def test_zero_rate_delivers_every_update_immediately():
+    delivered = []
+    conflator = Conflator(delivered.append, max_rate=0)
+    conflator.start()
+    conflator.update(md("A", 1))
+    conflator.update(md("A", 2))
+    assert len(delivered) == 2 and conflator.stats()["coalesced"] == 0
+
+
+def test_flush_thread_delivers_at_the_configured_rate_and_stop_drains():
+    delivered = []
+    conflator = Conflator(delivered.append, max_rate=50)
+    conflator.start()
+    conflator.update(md("A", 1))
+    assert wait_for(lambda: len(delivered) == 1, timeout=2)
+    conflator.update(md("B", 2))
+    conflator.stop()
+    assert conflator.stats()["pending"] == 0
+    assert [m["instrumentId"]["symbol"] for m in delivered] == ["A", "B"]
+
+
+def test_a_failing_deliver_does_not_lose_the_other_symbols():
+    delivered = []
+
+    def deliver(message):
+        if message["instrumentId"]["symbol"] == "A":
+            raise RuntimeError("client gone")
+        delivered.append(message)
+
+    conflator = Conflator(deliver)
+    conflator.update(md("A", 1))
+    conflator.update(md("B", 2))
+    assert conflator.flush() == 2
+    assert [m["instrumentId"]["symbol"] for m in delivered] == ["B"]
+
+
+def test_snapshot_and_forget():
+    conflator = Conflator(lambda message: None)
+    conflator.update(md("A", 1))
+    conflator.update(md("B", 2))
+    assert [m["timestamp"] for m in conflator.snapshot(["B", "A", "C"])] == [2, 1]
+    conflator.forget(["A"])
+    assert conflator.snapshot(["A", "B"]) == [md("B", 2)]
+    # A forgotten symbol's pending update is not delivered either
+    assert conflator.flush() == 1
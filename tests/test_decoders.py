@@ -0,0 +1,49 @@
+import pytest
+
+from decoders import DECODERS, available_decoders, get_decoder, is_market_data, peek_symbol
+from market_data_client import MarketDataClient
+
+MD = '{"type":"Md","timestamp":1,"instrumentId":{"marketId":"ROFX","symbol":"DLR/DIC25"},"marketData":{"OF":[]}}'
+
+
+@pytest.fixture(params=available_decoders())
+def decoder(request):
+    return get_decoder(request.param)
+
+
+def test_decode_object(decoder):
+    assert decoder.decode(MD)["instrumentId"]["symbol"] == "DLR/DIC25"
+    assert decoder.decode(MD.encode("utf-8"))["type"] == "Md"
+
+
+@pytest.mark.parametrize("frame", ['{"type":"Md",', "not json", "[]", '"x"', "1", "null", ""])
+def test_decode_bad_frame_returns_none(decoder, frame):
+    assert decoder.decode(frame) is None
+
+
+def test_unknown_decoder():
+    with pytest.raises(ValueError):
+        get_decoder("nope")
+    assert "json" in DECODERS
+
+
+def test_peek_helpers():
+    assert is_market_data(MD)
+    assert not is_market_data('{"type":"other"}')
+    assert peek_symbol(MD) == "DLR/DIC25"
+    assert peek_symbol(MD.encode("utf-8")) == "DLR/DIC25"
+    assert peek_symbol('{"symbol":"A\\"B"}') is None
+
+
+@pytest.mark.parametrize("name", available_decoders())
+def test_client_counts_dropped_frames(name):
+    client = MarketDataClient(access_token="t", ws_url="ws://127.0.0.1:1", decoder=name)
+    received = []
+    client.subscriptions["DLR/DIC25"] = 1
+    client.callbacks["DLR/DIC25"] = received.append
+    # Pass the pre-filter but fail to decode into an object
+    client._on_ws_message(None, '"type":"Md" "symbol":"DLR/DIC25"')
+    client._on_ws_message(None, "[" + MD + "]")
+    client._on_ws_message(None, MD)
+    assert client.dropped_frames == 2
+    assert len(received) == 1
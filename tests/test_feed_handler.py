@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import wait_for
+from feed_handler import FeedClient, FeedHandler
+
+
+@pytest.fixture
+def feed(tmp_path):
+    calls = []
+
+    def instruments():
+        calls.append(1)
+        if len(calls) > 1:
+            raise Exception("should have been served from the cache")
+        return {"status": "OK", "instruments": [{"instrumentId": {"marketId": "ROFX", "symbol": "A"}}]}
+
+    handler = FeedHandler(upstream=None, socket_path=str(tmp_path / "feed.sock"), instruments=instruments).start()
+    clients = []
+
+    def connect():
+        client = FeedClient(handler.socket_path, reconnect_delay=0.05)
+        clients.append(client)
+        assert wait_for(lambda: client.connected)
+        return client
+
+    yield handler, connect, calls
+    for client in clients:
+        client.close()
+    handler.stop()
+
+
+def test_workers_share_one_instrument_download(feed):
+    handler, connect, calls = feed
+    first, second = connect(), connect()
+    assert first.get_instruments(timeout=5)["instruments"][0]["instrumentId"]["symbol"] == "A"
+    assert second.get_instruments(timeout=5) == first.get_instruments(timeout=5)
+    assert len(calls) == 1
+
+
+def test_instrument_errors_reach_the_worker(feed):
+    handler, connect, calls = feed
+    handler.instruments = None
+    client = connect()
+    with pytest.raises(Exception, match="no instrument source"):
+        client.get_instruments(timeout=5)
+    # Md and subscription handling are unaffected
+    assert client.errors == []
@@ -0,0 +1,108 @@
+import json
+import time
+
+from conftest import wait_for
+from instrument_catalog import InstrumentCatalog
+
+
+def instruments(*symbols):
+    return {"status": "OK", "instruments": [
+        {"instrumentId": {"marketId": "ROFX", "symbol": symbol}, "segment": {"marketSegmentId": "DDF"}}
+        for symbol in symbols]}
+
+
+class Loader:
+    def __init__(self, *versions):
+        self.versions = list(versions)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.versions[min(self.calls, len(self.versions)) - 1]
+
+
+def test_stale_catalog_is_refreshed_on_lookup():
+    loader = Loader(instruments("A"), instruments("A", "B"))
+    catalog = InstrumentCatalog(loader, ttl=0.1)
+    assert catalog.symbols() == ["A"]
+    assert catalog.get("B") is None
+    time.sleep(0.15)
+    # The stale catalog is still served while the refresh runs
+    assert catalog.symbols() in (["A"], ["A", "B"])
+    assert wait_for(lambda: catalog.get("B") is not None)
+    assert loader.calls == 2
+
+
+def test_warm_start_snapshot_is_refreshed_once_stale(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"loaded_at": time.time() - 7200, "instruments": [["OLD"] + [None] * 13]}))
+    loader = Loader(instruments("NEW"))
+    catalog = InstrumentCatalog(loader, ttl=3600, snapshot_path=str(path))
+    assert catalog.symbols() == ["OLD"]
+    assert wait_for(lambda: catalog.symbols() == ["NEW"])
+    # Saved right after the new index is swapped in
+    assert wait_for(lambda: json.loads(path.read_text())["instruments"][0][0] == "NEW")
+
+
+def test_failed_refresh_keeps_serving_and_backs_off():
+    loader = Loader(instruments("A"), {"status": "ERROR"})
+    catalog = InstrumentCatalog(loader, ttl=0.05)
+    assert catalog.symbols() == ["A"]
+    time.sleep(0.1)
+    catalog.symbols()
+    assert wait_for(lambda: loader.calls == 2)
+    for _ in range(20):
+        assert catalog.symbols() == ["A"]
+    # Retried only after min(ttl, 60) seconds
+    assert loader.calls == 2
+    time.sleep(0.1)
+    catalog.symbols()
+    assert wait_for(lambda: loader.calls == 3)
+
+
+def test_first_load_uses_loader_and_refreshes_use_background_loader():
+    loader = Loader(instruments("A"))
+    background = Loader(instruments("A", "B"))
+    catalog = InstrumentCatalog(loader, ttl=0.05, background_loader=background)
+    assert catalog.symbols() == ["A"]
+    time.sleep(0.1)
+    catalog.symbols()
+    assert wait_for(lambda: catalog.get("B") is not None)
+    assert loader.calls == 1
+    assert background.calls >= 1
+
+
+SEARCH_SYMBOLS = (
+    "MERV - XMEV - GGAL - 24hs", "GGAL/DIC24", "GGALD/DIC24", "GGAL",
+    "MERV - XMEV - GGALD - CI", "DLR/DIC24 GGAL", "XGGAL/ENE25", "YPFD/DIC24",
+)
+
+
+def test_search_ranks_prefix_then_token_then_substring():
+    catalog = InstrumentCatalog(Loader(instruments(*SEARCH_SYMBOLS)))
+    symbols, total = catalog.search("ggal", limit=20)
+    assert symbols == [
+        # Prefix matches, shorter first
+        "GGAL", "GGAL/DIC24", "GGALD/DIC24",
+        # Token prefix matches
+        "DLR/DIC24 GGAL", "MERV - XMEV - GGALD - CI", "MERV - XMEV - GGAL - 24hs",
+        # Any other substring match
+        "XGGAL/ENE25",
+    ]
+    assert total == 7
+
+
+def test_search_pages_across_tiers():
+    catalog = InstrumentCatalog(Loader(instruments(*SEARCH_SYMBOLS)))
+    everything, total = catalog.search("GGAL", limit=20)
+    pages = [catalog.search("GGAL", limit=2, offset=offset) for offset in range(0, 8, 2)]
+    assert [s for page, _ in pages for s in page] == everything
+    assert {page_total for _, page_total in pages} == {total}
+    assert catalog.search("GGAL", limit=2, offset=2) == (["GGALD/DIC24", "DLR/DIC24 GGAL"], 7)
+
+
+def test_search_short_and_missing_queries():
+    catalog = InstrumentCatalog(Loader(instruments(*SEARCH_SYMBOLS)))
+    assert catalog.search("/", limit=3) == (["GGAL/DIC24", "YPFD/DIC24", "GGALD/DIC24"], 5)
+    assert catalog.search("zzz") == ([], 0)
+    assert catalog.search("   ") == ([], 0)
@@ -0,0 +1,141 @@
+import socket
+import time
+
+import pytest
+
+from conftest import wait_for
+from fake_matriz_server import FakeMatrizServer
+from market_data_client import CONNECTED, DISCONNECTED, RECONNECTING, MarketDataClient
+
+
+@pytest.fixture
+def server():
+    server = FakeMatrizServer(port=0, symbols=5, tick_rate=50).start()
+    server.tokens.add("token")
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    client = MarketDataClient(access_token="token", ws_url=server.ws_url,
+                              reconnect_base_delay=0.05, reconnect_max_delay=0.2)
+    yield client
+    client.close()
+
+
+def test_throwing_callback_keeps_a_single_connection(server, client):
+    symbol = server.symbols[0]
+    received = []
+
+    def callback(data):
+        received.append(data)
+        if len(received) == 1:
+            raise RuntimeError("bug in user code")
+
+    client.subscribe([symbol], callback=callback)
+    assert wait_for(lambda: len(received) >= 20)
+    assert client.callback_errors == 1
+    assert client.reconnects == 0
+    assert client.state == CONNECTED
+    assert len(server.sockets) == 1
+
+
+def test_reconnect_replaces_the_socket_without_duplicates(server, client):
+    symbol = server.symbols[0]
+    received = []
+    client.subscribe([symbol], callback=received.append, entries=["BI", "LA"])
+    assert wait_for(lambda: received)
+
+    server.drop_connections()
+    assert wait_for(lambda: client.reconnects == 1 and client.state == CONNECTED)
+    assert wait_for(lambda: len(server.sockets) == 1)
+
+    sent, count = server.frames_sent, len(received)
+    time.sleep(0.5)
+    delivered = len(received) - count
+    assert 0 < delivered <= server.frames_sent - sent
+    # Replayed with the subscription's own entries
+    assert set(received[-1]["marketData"]) == {"BI", "LA"}
+    assert symbol in client.gaps
+
+
+def test_unsubscribe_while_reconnecting_is_not_replayed(server):
+    client = MarketDataClient(access_token="token", ws_url=server.ws_url,
+                              reconnect_base_delay=0.5, reconnect_max_delay=1.0)
+    try:
+        kept, dropped = server.symbols[0], server.symbols[1]
+        received = {kept: [], dropped: []}
+        client.subscribe([kept, dropped], callback=lambda data: received[data["instrumentId"]["symbol"]].append(data))
+        assert wait_for(lambda: received[kept] and received[dropped])
+
+        server.drop_connections()
+        assert wait_for(lambda: client.state == RECONNECTING)
+        client.unsubscribe([dropped])
+        assert dropped not in client.subscriptions and dropped not in client.callbacks
+
+        assert wait_for(lambda: client.reconnects == 1 and client.state == CONNECTED)
+        count = len(received[kept])
+        received[dropped].clear()
+        time.sleep(0.5)
+        assert len(received[kept]) > count
+        assert received[dropped] == []
+        assert list(client.subscriptions) == [kept]
+    finally:
+        client.close()
+
+
+def test_subscription_changes_during_the_replay_reach_upstream(server, client):
+    first, late, dropped = server.symbols[:3]
+    received = {symbol: [] for symbol in server.symbols}
+
+    def callback(data):
+        received[data["instrumentId"]["symbol"]].append(data)
+
+    client.subscribe([first, dropped], callback=callback)
+    assert wait_for(lambda: received[first] and received[dropped])
+
+    replay = client._resubscribe
+
+    def racing_replay():
+        replayed = replay()
+        # Land after the stored subscriptions were read but before the client is CONNECTED
+        client.subscribe([late], callback=callback)
+        client.unsubscribe([dropped])
+        return replayed
+
+    client._resubscribe = racing_replay
+    server.drop_connections()
+    assert wait_for(lambda: client.reconnects == 1 and client.state == CONNECTED)
+    assert wait_for(lambda: received[late])
+    # No frames for the dropped symbol once the server has seen its unsubscribe
+    time.sleep(0.2)
+    received[dropped].clear()
+    time.sleep(0.3)
+    assert received[dropped] == []
+    assert sorted(client.subscriptions) == sorted([first, late])
+
+
+def test_failed_attempt_does_not_wait_for_the_connect_timeout():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    client = MarketDataClient(access_token="token", ws_url=f"ws://127.0.0.1:{port}/", connect_timeout=10)
+    started = time.monotonic()
+    with pytest.raises(Exception):
+        client._connect_websocket()
+    assert time.monotonic() - started < 2
+    assert client.state == DISCONNECTED
+    assert client.ws is None
+
+
+def test_replayed_frames_are_delivered(client):
+    received = []
+    client.subscriptions["DLR/DIC25"] = 1
+    client.callbacks["DLR/DIC25"] = received.append
+    client.ws = object()
+    frame = '{"type":"Md","instrumentId":{"marketId":"ROFX","symbol":"DLR/DIC25"},"marketData":{}}'
+    client._on_ws_message(None, frame)
+    client._on_ws_message(object(), frame)
+    client.ws = None
+    assert len(received) == 1
@@ -0,0 +1,14 @@
+from message_buffer import MessageStore
+
+
+def test_forget_drops_symbol_history_and_keeps_cursor():
+    store = MessageStore(capacity_per_symbol=10)
+    store.append("A", {"n": 1})
+    store.append("B", {"n": 2})
+    store.forget(["A", "unknown"])
+    messages, cursor = store.since()
+    assert [m["symbol"] for m in messages] == ["B"]
+    assert cursor == 2
+    assert store.since("A") == ([], 2)
+    # Sequence numbers keep growing after a forget
+    assert store.append("A", {"n": 3}) == 3
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from onboarding import Checkpoint, OnboardingPipeline, record_key, valid_cuit, validate_payload
+from primary_trading_client import APIError, RateLimitError
+
+
+def make_payload(num_doc, **extra):
+    payload = {
+        "restApiPath": "insert-cuenta-comitente",
+        "restApiMethod": "POST",
+        "fechaApertura": "2025-01-02",
+        "denominacion": f"Cuenta {num_doc}",
+        "codTpContribIVA": "CF",
+        "codTpComitente": "F",
+        "titulares": [{"apellido": "Perez", "nombre": "Ana", "tpDoc": "DNI", "numDoc": str(num_doc)}],
+    }
+    payload.update(extra)
+    return payload
+
+
+class FakeLimiter:
+    def configure(self, group, rate, burst=None):
+        pass
+
+
+class FakeClient:
+    """Answers submit_payload from a per-account script of outcomes (an exception or a response)."""
+
+    def __init__(self, script=None):
+        self.rate_limiter = FakeLimiter()
+        self.script = script or {}
+        self.calls = []
+
+    def submit_payload(self, payload, endpoint_prefix="/rest/", priority=None):
+        name = payload["denominacion"]
+        self.calls.append(name)
+        outcomes = self.script.get(name)
+        outcome = outcomes.pop(0) if outcomes else {"status": "OK"}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def refused():
+    return requests.ConnectionError(MaxRetryError(None, "/rest/insert-cuenta-comitente",
+                                                  NewConnectionError(None, "Connection refused")))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(OnboardingPipeline, "_backoff", staticmethod(lambda attempt: 0))
+
+
+def write_jsonl(path, payloads):
+    path.write_text("".join(json.dumps(p) + "\n" for p in payloads), encoding="utf-8")
+    return str(path)
+
+
+def test_validation():
+    assert validate_payload(make_payload(1)) == []
+    assert valid_cuit("20123456786")
+    assert not valid_cuit("20123456780")
+    errors = validate_payload(make_payload(1, fechaApertura="02/01/2025", esFisico="si"))
+    assert "fechaApertura must be an ISO date" in errors
+    assert "esFisico must be true or false" in errors
+
+
+def test_record_key_is_the_account_identity():
+    assert record_key(make_payload(1)) == record_key(make_payload(1, denominacion="Renamed"))
+    assert record_key(make_payload(1)) == "doc:DNI-1"
+    assert record_key(make_payload(1, juridicos={"cuit": "20123456786"})) == "cuit:20123456786"
+    assert record_key({"a": 1}).startswith("sha256:")
+
+
+@pytest.mark.parametrize("error", [RateLimitError(1.0), refused(), requests.ConnectTimeout()])
+def test_retries_only_when_nothing_was_sent(tmp_path, error):
+    client = FakeClient({"Cuenta 1": [error, {"status": "OK"}]})
+    pipeline = OnboardingPipeline(client, str(tmp_path / "cp.jsonl"))
+    counts = pipeline.run(write_jsonl(tmp_path / "in.jsonl", [make_payload(1)]))
+    assert counts["ok"] == 1
+    assert client.calls == ["Cuenta 1", "Cuenta 1"]
+
+
+@pytest.mark.parametrize("error", [APIError("boom", 503), requests.ReadTimeout(),
+                                   requests.ConnectionError("Connection aborted")])
+def test_possibly_applied_failures_go_to_review(tmp_path, error):
+    client = FakeClient({"Cuenta 1": [error]})
+    checkpoint = str(tmp_path / "cp.jsonl")
+    source = write_jsonl(tmp_path / "in.jsonl", [make_payload(1)])
+    assert OnboardingPipeline(client, checkpoint).run(source)["review"] == 1
+    assert client.calls == ["Cuenta 1"]
+
+    # Not resent on resume, even when failed records are retried
+    assert OnboardingPipeline(client, checkpoint, retry_failed=True).run(source)["skipped"] == 1
+    assert client.calls == ["Cuenta 1"]
+    assert OnboardingPipeline(client, checkpoint, retry_review=True).run(source)["ok"] == 1
+
+
+def test_client_errors_are_not_retried(tmp_path):
+    client = FakeClient({"Cuenta 1": [APIError("bad request", 400)]})
+    counts = OnboardingPipeline(client, str(tmp_path / "cp.jsonl")).run(
+        write_jsonl(tmp_path / "in.jsonl", [make_payload(1)]))
+    assert counts["error"] == 1
+    assert client.calls == ["Cuenta 1"]
+
+
+def test_resume_survives_reordering_and_edits(tmp_path):
+    checkpoint = str(tmp_path / "cp.jsonl")
+    payloads = [make_payload(i) for i in range(5)]
+    client = FakeClient({"Cuenta 3": [APIError("bad request", 400)]})
+    assert OnboardingPipeline(client, checkpoint).run(write_jsonl(tmp_path / "a.jsonl", payloads))["ok"] == 4
+
+    # Re-sorted, with a new record inserted at the top
+    edited = [make_payload(9)] + payloads[::-1]
+    client.calls.clear()
+    counts = OnboardingPipeline(client, checkpoint).run(write_jsonl(tmp_path / "b.jsonl", edited))
+    assert counts == {"skipped": 4, "duplicate": 0, "ok": 2}
+    assert sorted(client.calls) == ["Cuenta 3", "Cuenta 9"]
+    assert Checkpoint(checkpoint).results["doc:DNI-9"]["source"] == "b.jsonl:1"
+
+
+def test_duplicates_in_one_run_are_sent_once(tmp_path):
+    client = FakeClient()
+    source = write_jsonl(tmp_path / "in.jsonl", [make_payload(1), make_payload(1, denominacion="Again")])
+    counts = OnboardingPipeline(client, str(tmp_path / "cp.jsonl")).run(source)
+    assert counts["ok"] == 1 and counts["duplicate"] == 1
+    assert client.calls == ["Cuenta 1"]
+
+
+def test_dry_run_sends_nothing(tmp_path):
+    client = FakeClient()
+    counts = OnboardingPipeline(client, str(tmp_path / "cp.jsonl"), dry_run=True).run(
+        write_jsonl(tmp_path / "in.jsonl", [make_payload(1), {"denominacion": "x"}]))
+    assert counts["valid"] == 1 and counts["invalid"] == 1
+    assert client.calls == []
+    assert not (tmp_path / "cp.jsonl").exists()
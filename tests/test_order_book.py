@@ -0,0 +1,44 @@
+from conftest import md
+from order_book import OrderBookEngine
+
+
+def test_books_follow_the_latest_md_per_symbol():
+    engine = OrderBookEngine(depth=2)
+    engine.apply(md("A", 1, BI=[{"price": 99.0, "size": 5}, {"price": 98.0, "size": 1}],
+                    OF=[{"price": 101.0, "size": 3}], LA={"price": 100.0, "size": 2}, TV=10, OP=97.5))
+    top = engine.top_of_book("A")
+    assert (top.bid, top.bid_size, top.offer, top.offer_size) == (99.0, 5, 101.0, 3)
+    assert top.to_dict()["last"] == 100.0 and top.volume == 10 and top.timestamp == 1
+
+    # Entries that are not sent keep their value; an empty side clears it
+    engine.apply(md("A", 2, BI=[], LA=None))
+    book = engine.book("A")
+    assert book["bids"] == [] and book["offers"] == [(101.0, 3.0)]
+    assert book["last"] == {"price": None, "size": None}
+    assert book["volume"] == 10 and book["other"] == {"OP": 97.5} and book["timestamp"] == 2
+    assert engine.top_of_book("A").bid is None
+    assert engine.top_of_book("B") is None and engine.book("B") is None
+
+
+def test_sides_grow_past_the_preallocated_depth_and_skip_levels_without_price():
+    engine = OrderBookEngine(depth=1)
+    levels = [{"price": 10.0 - i, "size": i + 1} for i in range(3)] + [{"size": 9}]
+    engine.apply(md("A", OF=levels))
+    assert engine.book("A", depth=5)["offers"] == [(10.0, 1.0), (9.0, 2.0), (8.0, 3.0)]
+    assert engine.book("A")["offers"] == [(10.0, 1.0)]
+
+
+def test_top_of_book_is_replaced_not_mutated():
+    engine = OrderBookEngine()
+    engine.apply(md("A", BI=[{"price": 1.0, "size": 1}]))
+    before = engine.top_of_book("A")
+    engine.apply(md("A", BI=[{"price": 2.0, "size": 1}]))
+    assert before.bid == 1.0 and engine.top_of_book("A").bid == 2.0
+
+
+def test_messages_without_symbol_are_ignored_and_remove_drops_the_book():
+    engine = OrderBookEngine()
+    assert engine.apply({"type": "Md", "marketData": {}}) is None
+    engine.apply(md("A", LA={"price": 1.0, "size": 1}))
+    engine.remove("A")
+    assert engine.book("A") is None
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter, TokenBucket, endpoint_group, parse_limits
+
+
+def test_parse_limits_and_endpoint_groups():
+    assert parse_limits("marketdata=20, accounts=5:1,") == {"marketdata": (20.0, None), "accounts": (5.0, 1.0)}
+    assert parse_limits(None) == {}
+    assert endpoint_group("/rest/marketdata/DLR/DIC23") == "marketdata"
+    assert endpoint_group("/rest/instruments/details") == "instruments"
+    assert endpoint_group("/rest/insert-cuenta-comitente") == "accounts"
+    assert endpoint_group("/auth/getToken") == "auth"
+    assert endpoint_group("/rest/order/all") == "default"
+
+
+def test_token_bucket_spends_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated
+    for _ in range(2):
+        assert bucket.wait_time(now) == 0
+        bucket.take(now)
+    assert abs(bucket.wait_time(now) - 0.1) < 1e-9
+    assert bucket.wait_time(now + 0.1 + 1e-9) == 0
+    # Never accumulates more than the burst
+    assert bucket.wait_time(now + 60) == 0 and bucket.tokens == 2
+
+
+def test_token_bucket_backs_off_on_429_and_recovers_below_the_ceiling():
+    bucket = TokenBucket(rate=10, probe_interval=3600)
+    now = bucket.updated
+    bucket.on_throttle(now, retry_after=2.0)
+    assert bucket.throttled == 1
+    assert abs(bucket.wait_time(now + 0.5) - 1.5) < 1e-9
+    assert bucket.ceiling == 9.5 and bucket.rate == 9.5 * 0.8
+    # A burst of throttled in-flight requests counts as one signal
+    bucket.on_throttle(now + 0.1, retry_after=None)
+    assert bucket.ceiling == 9.5 and bucket.throttled == 2
+    for i in range(200):
+        bucket.on_success(now + 3 + i)
+    assert 9.4 < bucket.rate <= bucket.ceiling == 9.5
+
+
+def test_unlimited_bucket_learns_a_rate_from_its_first_429():
+    bucket = TokenBucket()
+    now = bucket.updated
+    for _ in range(20):
+        assert bucket.wait_time(now) == 0
+        bucket.take(now)
+    bucket.on_throttle(now + 0.5, retry_after=0)
+    assert bucket.rate is not None and bucket.rate < bucket.ceiling <= 20
+
+
+def test_concurrency_limit_and_interactive_requests_first():
+    limiter = RateLimiter(max_concurrency=1)
+    limiter.acquire("default")
+    order = []
+
+    def request(priority):
+        limiter.acquire("default", priority)
+        order.append(priority)
+        limiter.release("default", 200)
+
+    background = threading.Thread(target=request, args=(BACKGROUND,))
+    background.start()
+    assert wait_for(lambda: limiter.stats()["waiting"] == 1)
+    interactive = threading.Thread(target=request, args=(INTERACTIVE,))
+    interactive.start()
+    assert wait_for(lambda: limiter.stats()["waiting"] == 2)
+    assert order == []
+
+    limiter.release("default", 200)
+    background.join(5)
+    interactive.join(5)
+    # The background request arrived first but the interactive one is served first
+    assert order == [INTERACTIVE, BACKGROUND]
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_errors_shrink_the_concurrency_limit_and_successes_grow_it_back():
+    limiter = RateLimiter(max_concurrency=8, min_concurrency=2)
+    limiter.acquire("marketdata")
+    limiter.release("marketdata", 429, retry_after=0)
+    assert limiter.concurrency == 6
+    # Backoffs are at most once a second; the throttled group's bucket does not hold up others
+    limiter.acquire("default")
+    limiter.release("default", 503)
+    assert limiter.concurrency == 6
+    assert limiter.stats()["groups"]["marketdata"]["throttled"] == 1
+    for _ in range(50):
+        limiter.acquire("default")
+        limiter.release("default", 200)
+    assert limiter.concurrency == 8
+
+
+def test_login_goes_through_the_auth_bucket():
+    from primary_trading_client import PrimaryTradingClient, RateLimitError
+
+    class Response:
+        def __init__(self, status_code, headers):
+            self.status_code = status_code
+            self.headers = headers
+            self.text = ""
+
+    class Session:
+        def __init__(self):
+            self.calls = []
+            self.responses = [Response(429, {"Retry-After": "30"}), Response(200, {"X-Auth-Token": "t"})]
+
+        def request(self, method, url, headers=None, **kwargs):
+            self.calls.append((method, url, headers["X-Username"]))
+            return self.responses.pop(0)
+
+    client = PrimaryTradingClient("user", "secret", base_url="http://matriz")
+    client.session = Session()
+    with pytest.raises(RateLimitError) as raised:
+        client._fetch_token()
+    assert raised.value.retry_after == 30
+    assert client.session.calls == [("POST", "http://matriz/auth/getToken", "user")]
+    bucket = client.rate_limiter.buckets["auth"]
+    assert bucket.throttled == 1 and bucket.stats(time.monotonic())["blocked_for"] > 20
+    assert client.rate_limiter.in_flight == 0
+
+    bucket.blocked_until = 0.0
+    assert client._get_access_token() == "t"
+    assert client.rate_limiter.in_flight == 0
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from response_cache import ResponseCache
+
+
+def test_values_are_served_until_their_ttl_expires():
+    cache = ResponseCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get("k", 0.1, loader) == 1
+    assert cache.get("k", 0.1, loader) == 1
+    time.sleep(0.15)
+    assert cache.get("k", 0.1, loader) == 2
+    # ttl 0 never stores the value
+    assert cache.get("nocache", 0, loader) == 3
+    assert cache.get("nocache", 0, loader) == 4
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.get("a", 60, lambda: "a")
+    cache.get("b", 60, lambda: "b")
+    # Touching "a" makes "b" the least recently used
+    cache.get("a", 60, lambda: "reloaded")
+    cache.get("c", 60, lambda: "c")
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("a", 60, lambda: "reloaded") == "a"
+    assert cache.get("b", 60, lambda: "reloaded") == "reloaded"
+    cache.invalidate("b")
+    assert cache.get("b", 60, lambda: "again") == "again"
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {"status": "OK"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", 60, loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    assert wait_for(lambda: cache.stats()["coalesced"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = ResponseCache()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def lookup():
+        try:
+            cache.get("k", 60, failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert wait_for(lambda: cache.stats()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 3
+    assert cache.get("k", 60, lambda: "recovered") == "recovered"
+    with pytest.raises(KeyError):
+        cache.get("other", 60, lambda: {}["missing"])
@@ -0,0 +1,129 @@
+import itertools
+import json
+import threading
+
+import pytest
+
+from subscription_router import SubscriptionRouter
+
+_ids = itertools.count(1)
+
+
+class Client:
+    def __init__(self):
+        self.id = next(_ids)
+        self.encoder = None
+        self.messages = []
+
+    def put(self, payload, key=None):
+        self.messages.append(payload)
+
+
+class Upstream:
+    """Records upstream subscriptions; subscribe() can be held until release() to simulate a slow network."""
+
+    def __init__(self):
+        self.subscribed = set()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.fail = False
+
+    def subscribe(self, symbols, callback=None):
+        self.entered.set()
+        self.gate.wait(5)
+        if self.fail:
+            raise Exception("upstream down")
+        self.subscribed.update(symbols)
+
+    def unsubscribe(self, symbols):
+        self.subscribed.difference_update(symbols)
+
+
+def test_slow_upstream_subscribe_does_not_block_other_connections():
+    upstream = Upstream()
+    router = SubscriptionRouter(upstream=upstream)
+    a, b = Client(), Client()
+    upstream.gate.clear()
+    slow = threading.Thread(target=router.subscribe, args=(a, ["X"]))
+    slow.start()
+    assert upstream.entered.wait(5)
+
+    # Joining a symbol already on its way upstream and leaving one need no upstream call
+    assert router.subscribe(b, ["X"]) == []
+    assert router.unsubscribe(b, ["X"]) == []
+    assert router.symbols_for(b) == []
+
+    upstream.gate.set()
+    slow.join(5)
+    assert upstream.subscribed == {"X"}
+    assert router.symbols_for(a) == ["X"]
+
+
+def test_unsubscribe_while_subscribe_is_in_flight_leaves_nothing_upstream():
+    upstream = Upstream()
+    router = SubscriptionRouter(upstream=upstream)
+    a = Client()
+    upstream.gate.clear()
+    slow = threading.Thread(target=router.subscribe, args=(a, ["X", "Y"]))
+    slow.start()
+    assert upstream.entered.wait(5)
+    # Waits for the in-flight subscribe, then unsubscribes what is no longer watched
+    leave = threading.Thread(target=router.unsubscribe, args=(a, ["X"]))
+    leave.start()
+    upstream.gate.set()
+    slow.join(5)
+    leave.join(5)
+    assert upstream.subscribed == {"Y"}
+    assert router.topics.keys() == {"Y"}
+
+
+def test_failed_upstream_subscribe_rolls_back_the_watch_list():
+    upstream = Upstream()
+    upstream.fail = True
+    router = SubscriptionRouter(upstream=upstream)
+    a = Client()
+    with pytest.raises(Exception, match="upstream down"):
+        router.subscribe(a, ["X"])
+    assert router.symbols_for(a) == []
+    assert router.topics == {}
+
+
+def test_failed_upstream_subscribe_releases_every_waiting_connection():
+    upstream = Upstream()
+    upstream.fail = True
+    router = SubscriptionRouter(upstream=upstream)
+    a, b = Client(), Client()
+    upstream.gate.clear()
+    errors = []
+
+    def subscribe_a():
+        try:
+            router.subscribe(a, ["X"])
+        except Exception as e:
+            errors.append(e)
+
+    slow = threading.Thread(target=subscribe_a)
+    slow.start()
+    assert upstream.entered.wait(5)
+    # b joins while the upstream call is in flight and needs no call of its own
+    assert router.subscribe(b, ["X"]) == []
+    upstream.gate.set()
+    slow.join(5)
+
+    assert len(errors) == 1
+    assert router.topics == {}
+    assert router.symbols_for(a) == [] and router.symbols_for(b) == []
+    notice = json.loads(b.messages[-1])
+    assert notice["type"] == "error" and notice["symbols"] == ["X"]
+    assert a.messages == []
+
+
+def test_routes_to_watching_clients_only():
+    router = SubscriptionRouter(upstream=Upstream())
+    a, b = Client(), Client()
+    router.subscribe(a, ["X"])
+    router.subscribe(b, ["Y"])
+    router.route({"type": "Md", "instrumentId": {"symbol": "X"}})
+    assert len(a.messages) == 1 and b.messages == []
+    assert router.remove_client(a) == ["X"]
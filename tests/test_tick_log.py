@@ -0,0 +1,70 @@
+import json
+import os
+import time
+
+import pytest
+
+from conftest import md
+from market_data_client import MarketDataClient
+from tick_log import MAGIC, TickRecorder, TickReplayer
+
+
+def test_frames_round_trip_across_segments(tmp_path):
+    recorder = TickRecorder(str(tmp_path), segment_size=64)
+    frames = [json.dumps(md("A", i, LA={"price": float(i)})) for i in range(10)]
+    for i, frame in enumerate(frames):
+        recorder.record(frame if i % 2 else frame.encode("utf-8"), received_at=1000.0 + i)
+    recorder.close()
+
+    assert recorder.records == 10
+    replayer = TickReplayer(str(tmp_path))
+    assert len(replayer.segments) > 1
+    assert [(ts, bytes(payload).decode("utf-8")) for ts, payload in replayer.frames()] == \
+        [(1000.0 + i, frame) for i, frame in enumerate(frames)]
+
+
+def test_truncated_last_record_is_skipped_and_foreign_files_rejected(tmp_path):
+    recorder = TickRecorder(str(tmp_path))
+    recorder.record("first", received_at=1.0)
+    recorder.record("second", received_at=2.0)
+    recorder.close()
+    (segment,) = TickReplayer(str(tmp_path)).segments
+    # Cut the last record in half, as if the recorder was killed mid-write
+    os.truncate(segment, os.path.getsize(segment) - 3)
+    assert [bytes(payload) for _, payload in TickReplayer(segment).frames()] == [b"first"]
+
+    other = tmp_path / "other.log"
+    other.write_bytes(b"not a tick log at all")
+    with pytest.raises(ValueError):
+        list(TickReplayer(str(other)).frames())
+    empty = tmp_path / "empty.log"
+    empty.write_bytes(MAGIC)
+    assert list(TickReplayer(str(empty)).frames()) == []
+
+
+def test_replay_keeps_the_captured_pacing_scaled_by_speed(tmp_path):
+    recorder = TickRecorder(str(tmp_path))
+    recorder.record("a", received_at=100.0)
+    recorder.record("b", received_at=100.4)
+    recorder.close()
+    replayer = TickReplayer(str(tmp_path))
+
+    received = []
+    started = time.monotonic()
+    assert replayer.replay(received.append, speed=2.0) == 2
+    assert time.monotonic() - started >= 0.19
+    assert received == ["a", "b"]
+
+    started = time.monotonic()
+    replayer.replay(received.append)
+    assert time.monotonic() - started < 0.1
+
+
+def test_replay_into_drives_a_market_data_client(tmp_path):
+    recorder = TickRecorder(str(tmp_path))
+    recorder.record(json.dumps(md("A", 1, BI=[{"price": 99.0, "size": 5}])))
+    recorder.record(json.dumps(md("A", 2, BI=[{"price": 98.0, "size": 1}])))
+    recorder.close()
+    client = MarketDataClient(access_token="replay", maintain_books=True)
+    assert TickReplayer(str(tmp_path)).replay_into(client) == 2
+    assert client.books.top_of_book("A").bid == 98.0
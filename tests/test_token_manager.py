@@ -0,0 +1,61 @@
+import json
+import threading
+import time
+
+from token_manager import TokenManager
+
+
+def test_concurrent_callers_share_one_refresh():
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return f"token-{len(calls)}"
+
+    manager = TokenManager(fetch)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert tokens == ["token-1"] * 8
+    assert manager.refresh_count == 1
+
+
+def test_refreshes_ahead_of_expiry():
+    tokens = iter(["a", "b"])
+    manager = TokenManager(lambda: next(tokens), ttl=100, refresh_margin=10)
+    assert manager.get_token() == "a"
+    assert manager.get_token() == "a"
+    manager.expires_at = time.time() + 5
+    assert not manager.is_fresh()
+    assert manager.get_token() == "b"
+
+
+def test_invalidate_ignores_a_token_that_was_already_replaced():
+    tokens = iter(["a", "b"])
+    manager = TokenManager(lambda: next(tokens))
+    stale = manager.get_token()
+    manager.invalidate(stale)
+    assert manager.get_token() == "b"
+    # A request that was sent with "a" and got 401 late must not expire "b"
+    manager.invalidate(stale)
+    assert manager.is_fresh()
+
+
+def test_token_is_cached_per_account(tmp_path):
+    path = tmp_path / "token.json"
+    TokenManager(lambda: "cached", cache_path=str(path), cache_key="server|alice").get_token()
+    assert json.loads(path.read_text())["token"] == "cached"
+
+    def no_login():
+        raise AssertionError("should not log in")
+
+    assert TokenManager(no_login, cache_path=str(path), cache_key="server|alice").get_token() == "cached"
+    assert TokenManager(lambda: "other", cache_path=str(path), cache_key="server|bob").get_token() == "other"
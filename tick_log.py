@@ -0,0 +1,149 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Tuple, Union
+
+# Every segment starts with MAGIC; each record is a header (receive time, payload length) plus the raw frame
+MAGIC = b"MDTICK1\n"
+RECORD_HEADER = struct.Struct("<dI")
+
+class TickRecorder:
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, prefix: str = "ticks"):
+        """
+        Append raw WebSocket frames to length-prefixed, rotating segment files.
+
+        Args:
+            directory: Directory where segments are written
+            segment_size: Size in bytes after which a new segment is started
+            prefix: File name prefix of the segments
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.prefix = prefix
+        self.records = 0
+        self._file = None
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self) -> None:
+        name = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}.log"
+        self._file = open(os.path.join(self.directory, name), "ab", buffering=1024 * 1024)
+        self._file.write(MAGIC)
+        self._written = len(MAGIC)
+
+    def record(self, message: Union[str, bytes], received_at: Optional[float] = None) -> None:
+        """
+        Append one frame.
+
+        Args:
+            message: Raw frame as received from the WebSocket
+            received_at: Receive timestamp (defaults to now)
+        """
+        payload = message.encode("utf-8") if isinstance(message, str) else message
+        header = RECORD_HEADER.pack(received_at if received_at is not None else time.time(), len(payload))
+        with self._lock:
+            if self._file is None or self._written >= self.segment_size:
+                self._rotate()
+            self._file.write(header)
+            self._file.write(payload)
+            self._written += len(header) + len(payload)
+            self.records += 1
+
+    def _rotate(self) -> None:
+        if self._file:
+            self._file.close()
+        self._open_segment()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class TickReplayer:
+    def __init__(self, path: str, prefix: str = "ticks"):
+        """
+        Read frames captured by TickRecorder.
+
+        Args:
+            path: A segment file or a directory of segments
+            prefix: File name prefix of the segments when path is a directory
+        """
+        if os.path.isdir(path):
+            self.segments = sorted(glob.glob(os.path.join(path, f"{prefix}-*.log")))
+        else:
+            self.segments = [path]
+
+    def frames(self) -> Iterator[Tuple[float, bytes]]:
+        """Yield (receive timestamp, raw frame) for every record, in capture order."""
+        for segment in self.segments:
+            with open(segment, "rb") as f:
+                if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data[:len(MAGIC)] != MAGIC:
+                        raise ValueError(f"Not a tick log segment: {segment}")
+                    offset = len(MAGIC)
+                    end = len(data)
+                    while offset + RECORD_HEADER.size <= end:
+                        received_at, length = RECORD_HEADER.unpack_from(data, offset)
+                        offset += RECORD_HEADER.size
+                        if offset + length > end:
+                            # Truncated last record, e.g. the recorder was killed mid-write
+                            break
+                        yield received_at, data[offset:offset + length]
+                        offset += length
+
+    def replay(self, callback: Callable[[str], Any], speed: float = 0.0) -> int:
+        """
+        Feed every frame to callback.
+
+        Args:
+            callback: Function called with each frame decoded as text
+            speed: 1.0 replays in real time, N replays N times faster,
+                0 replays as fast as possible
+
+        Returns:
+            Number of frames replayed
+        """
+        count = 0
+        start_wall = time.monotonic()
+        first_ts = None
+        for received_at, payload in self.frames():
+            if speed > 0:
+                if first_ts is None:
+                    first_ts = received_at
+                due = start_wall + (received_at - first_ts) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            callback(payload.decode("utf-8"))
+            count += 1
+        return count
+
+    def replay_into(self, client: Any, speed: float = 0.0) -> int:
+        """Drive a MarketDataClient's message handler with the captured frames."""
+        return self.replay(lambda message: client._on_ws_message(None, message), speed=speed)
+
+
+# Example usage: replay a capture as fast as possible and report the rate
+if __name__ == "__main__":
+    import sys
+    from market_data_client import MarketDataClient
+
+    replayer = TickReplayer(sys.argv[1])
+    client = MarketDataClient(access_token="replay", maintain_books=True)
+    start = time.perf_counter()
+    count = replayer.replay_into(client)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {count} frames in {elapsed:.3f}s ({count / elapsed if elapsed else 0:.0f} msg/s)")
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import metrics
+
+class TokenManager:
+    def __init__(self, fetch_token: Optional[Callable[[], str]], ttl: float = 8 * 3600, refresh_margin: float = 300,
+                 cache_path: Optional[str] = None, cache_key: str = ""):
+        """
+        Keep a Matriz access token fresh, refreshing it ahead of its expiry.
+
+        Args:
+            fetch_token: Function that logs in and returns a new token (None if tokens are set with set_token)
+            ttl: Seconds a token is considered valid after it was issued
+            refresh_margin: Seconds before expiry at which the token is refreshed
+            cache_path: Optional file used to share the token across restarts
+            cache_key: Identifies the account/server the cached token belongs to
+        """
+        self.fetch_token = fetch_token
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.cache_path = cache_path
+        self.cache_key = cache_key
+        self.token = None
+        self.expires_at = 0.0
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+
+        if self.cache_path:
+            self._load_cache()
+
+    @property
+    def expiry(self) -> Optional[datetime]:
+        """Expiry of the current token, or None if there is no token."""
+        if not self.token:
+            return None
+        return datetime.fromtimestamp(self.expires_at)
+
+    def is_fresh(self) -> bool:
+        """True if there is a token that does not need refreshing yet."""
+        return self.token is not None and time.time() < self.expires_at - self.refresh_margin
+
+    def get_token(self) -> str:
+        """
+        Get a valid token, refreshing it if it is missing or about to expire.
+
+        Only one thread performs the refresh; concurrent callers wait for it
+        and reuse its result.
+
+        Returns:
+            str: The access token
+        """
+        if self.is_fresh():
+            return self.token
+
+        with self._lock:
+            # Another thread may have refreshed while we were waiting
+            if self.is_fresh():
+                return self.token
+            return self._refresh()
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Mark the token as expired, e.g. after the server answered 401.
+
+        Args:
+            token: The token that was rejected. If the token has already been
+                replaced by another thread it is left untouched.
+        """
+        with self._lock:
+            if token is None or token == self.token:
+                self.expires_at = 0.0
+
+    def _refresh(self) -> str:
+        return self.set_token(self.fetch_token())
+
+    def set_token(self, token: str) -> str:
+        """
+        Record a newly issued token, e.g. one obtained by an async login.
+
+        Returns:
+            str: The token
+        """
+        self.token = token
+        self.expires_at = time.time() + self.ttl
+        self.refresh_count += 1
+        metrics.token_refreshes_total.inc()
+        if self.cache_path:
+            self._save_cache()
+        return token
+
+    def _load_cache(self) -> None:
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if cached.get("key") == self.cache_key and cached.get("token"):
+            self.token = cached["token"]
+            self.expires_at = float(cached.get("expires_at", 0))
+
+    def _save_cache(self) -> None:
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"key": self.cache_key, "token": self.token, "expires_at": self.expires_at}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # The cache is only an optimization; a failed write just means the next start logs in again
+            pass